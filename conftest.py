@@ -0,0 +1,24 @@
+import pytest
+from datetime import datetime
+
+
+@pytest.fixture
+def plan():
+    # Inputs of a two-person plan for the batched engine, close to the app's defaults
+    current_year = datetime.now().year
+    return dict(
+        current_age=55, partner_current_age=50, life_expectancy=92, initial_savings=2000000,
+        annual_earnings=200000, partner_earnings=200000, self_yearly_increase=0.03, partner_yearly_increase=0.03,
+        annual_pension=10000, partner_pension=0, self_pension_yearly_increase=0.01, partner_pension_yearly_increase=0.0,
+        rental_start=current_year + 2, rental_end=current_year + 10, rental_amt=12000, rental_yearly_increase=0.04,
+        annual_expense=150000, mortgage_payment=36000, mortgage_years_remaining=25, retirement_age=60, partner_retirement_age=58,
+        annual_social_security=36000, withdrawal_start_age=67, partner_social_security=18000, partner_withdrawal_start_age=65,
+        self_healthcare_cost=5000, self_healthcare_start_age=60, partner_healthcare_start_age=58, partner_healthcare_cost=5000,
+        stock_percentage=60, bond_percentage=40, stock_return_mean=0.07, bond_return_mean=0.035, stock_return_std=0.16,
+        bond_return_std=0.045, simulations=500, tax_rate=0.15, cola_rate=0.015, inflation_mean=0.025, inflation_std=0.01,
+        annual_expense_decrease=0.005, years_until_downsize=5, residual_amount=100000,
+        adjust_expense_years=[current_year + 3], adjust_expense_amounts=[5000],
+        one_time_years=[current_year + 4], one_time_amounts=[10000],
+        windfall_years=[current_year + 6], windfall_amounts=[50000],
+        simulation_type="Normal Distribution"
+    )
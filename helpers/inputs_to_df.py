@@ -23,7 +23,12 @@ def create_parameters_dataframe(
     windfall_year_1, windfall_amount_1,
     windfall_year_2, windfall_amount_2,
     windfall_year_3, windfall_amount_3,
-    simulation_type
+    simulation_type, withdrawal_strategy="Fixed (Inflation Adjusted)",
+    tax_method="Flat Rate", filing_status="Married Filing Jointly",
+    track_accounts=False, tax_deferred_share=0.5, roth_share=0.1, withdrawal_order="Taxable, Tax-Deferred, Roth",
+    stochastic_lifespan=False, self_sex="Male", partner_sex="Female", survivor_expense_ratio=0.7,
+    time_step="Annual", shock_events=(), parameter_uncertainty=False,
+    ensemble_models=(), t_degrees_of_freedom=5.0
 ):
     # Create a DataFrame with all input fields
     params_df = pd.DataFrame({
@@ -88,7 +93,23 @@ def create_parameters_dataframe(
         "windfall_amount_2": [windfall_amount_2],
         "windfall_year_3": [windfall_year_3],
         "windfall_amount_3": [windfall_amount_3],
-        "simulation_type" : [simulation_type]
+        "simulation_type" : [simulation_type],
+        "withdrawal_strategy": [withdrawal_strategy],
+        "tax_method": [tax_method],
+        "filing_status": [filing_status],
+        "track_accounts": [track_accounts],
+        "tax_deferred_share": [tax_deferred_share],
+        "roth_share": [roth_share],
+        "withdrawal_order": [withdrawal_order],
+        "stochastic_lifespan": [stochastic_lifespan],
+        "self_sex": [self_sex],
+        "partner_sex": [partner_sex],
+        "survivor_expense_ratio": [survivor_expense_ratio],
+        "time_step": [time_step],
+        "shock_events": [", ".join(shock_events)],
+        "parameter_uncertainty": [parameter_uncertainty],
+        "ensemble_models": [", ".join(ensemble_models)],
+        "t_degrees_of_freedom": [t_degrees_of_freedom]
     })
     
     return params_df
\ No newline at end of file
@@ -16,7 +16,26 @@ from helpers.styling import download_button_style_css
 from helpers.styling import remove_top_white_space
 from helpers.styling import file_uploader_style_css
 
-from simulations.simulation_mc import monte_carlo_simulation
+from simulations.simulation_batch import batch_monte_carlo_simulation, percentile_simulation_ids, build_cash_flows, ensemble_return_models, stress_test_rows
+from simulations.withdrawal_strategies import withdrawal_strategies
+from simulations.taxes import tax_tables
+from simulations.accounts import withdrawal_orders
+from simulations.multilevel import multilevel_success_probability
+from simulations.markov_chain import markov_chain_success
+from simulations.policy_solver import policy_objectives, solve_policy, policy_strategy, policy_allocation
+from simulations.goal_seek import goal_seek_goals, goal_seek
+from simulations.sweeps import sweep_inputs, grid_sweep, default_sweep_range
+from simulations.sensitivity import tornado_analysis
+from simulations.social_security import claiming_age_search
+from simulations.glide_path import glide_path_objectives, optimize_glide_path
+from simulations.optimal_stopping import timing_decisions, least_squares_timing
+from simulations.importance_sampling import rare_event_failure
+from simulations.historical_returns import stress_sequences
+from simulations.shocks import shock_events
+from simulations.calibration import calibrate_return_models, calibrated_presets
+from simulations.failure_drivers import failure_drivers
+from simulations.path_clusters import scenario_clusters
+from simulations.mortality import load_life_table
 
 
 # Set Streamlit to use full-width layout
@@ -34,6 +53,11 @@ current_year = datetime.now().year
 # Streamlit Display
 st.write("#### Retirement Analysis with Monte Carlo Simulation")
 
+# Fits of the return models to the historical series, computed once per session process
+@st.cache_data
+def load_return_calibration():
+    return calibrate_return_models()
+
 # Function to load parameters from a CSV file
 def load_parameters_from_csv(uploaded_file):
     try:
@@ -199,7 +223,23 @@ def load_parameters_from_csv(uploaded_file):
             "windfall_amount_2": windfall_amount_2,
             "windfall_year_3": windfall_year_3,
             "windfall_amount_3": windfall_amount_3,
-            "simulation_type" : simulation_type
+            "simulation_type" : simulation_type,
+            "withdrawal_strategy": params_df["withdrawal_strategy"].iloc[0] if "withdrawal_strategy" in params_df.columns else "Fixed (Inflation Adjusted)",
+            "tax_method": params_df["tax_method"].iloc[0] if "tax_method" in params_df.columns else "Flat Rate",
+            "filing_status": params_df["filing_status"].iloc[0] if "filing_status" in params_df.columns else "Married Filing Jointly",
+            "track_accounts": bool(params_df["track_accounts"].iloc[0]) if "track_accounts" in params_df.columns else False,
+            "tax_deferred_share": params_df["tax_deferred_share"].iloc[0] if "tax_deferred_share" in params_df.columns else 0.5,
+            "roth_share": params_df["roth_share"].iloc[0] if "roth_share" in params_df.columns else 0.1,
+            "withdrawal_order": params_df["withdrawal_order"].iloc[0] if "withdrawal_order" in params_df.columns else "Taxable, Tax-Deferred, Roth",
+            "stochastic_lifespan": bool(params_df["stochastic_lifespan"].iloc[0]) if "stochastic_lifespan" in params_df.columns else False,
+            "self_sex": params_df["self_sex"].iloc[0] if "self_sex" in params_df.columns else "Male",
+            "partner_sex": params_df["partner_sex"].iloc[0] if "partner_sex" in params_df.columns else "Female",
+            "survivor_expense_ratio": params_df["survivor_expense_ratio"].iloc[0] if "survivor_expense_ratio" in params_df.columns else 0.7,
+            "time_step": params_df["time_step"].iloc[0] if "time_step" in params_df.columns else "Annual",
+            "parameter_uncertainty": bool(params_df["parameter_uncertainty"].iloc[0]) if "parameter_uncertainty" in params_df.columns else False,
+            "t_degrees_of_freedom": float(params_df["t_degrees_of_freedom"].iloc[0]) if "t_degrees_of_freedom" in params_df.columns else 5.0,
+            "ensemble_models": [name for name in str(params_df["ensemble_models"].iloc[0]).split(", ") if name in ensemble_return_models] if "ensemble_models" in params_df.columns else ["Normal Distribution", "Students-T Distribution", "Empirical Distribution"],
+            "shock_events": [name for name in str(params_df["shock_events"].iloc[0]).split(", ") if name in shock_events] if "shock_events" in params_df.columns else []
         }
 
     except Exception as e:
@@ -220,7 +260,7 @@ with st.container(height=260, border=None):
     st.markdown(tab_style_css, unsafe_allow_html=True)
 
     # Create tabs for different sections
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10, tab11, tab12 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10, tab11, tab12, tab13 = st.tabs([
             ":material/group: Profile", 
             ":material/savings: Savings", 
             ":material/paid: Income", 
@@ -232,7 +272,8 @@ with st.container(height=260, border=None):
             ":material/house: Downsize", 
             ":material/tune: Adjust Exp.", 
             ":material/checkbook: One Time", 
-            ":material/money_bag: Windfall"])  
+            ":material/money_bag: Windfall", 
+            ":material/rule: Withdrawal"])  
 
     # Tab 1: Personal Details
     with tab1:
@@ -245,6 +286,21 @@ with st.container(height=260, border=None):
             partner_retirement_age = st.number_input("Partner's Retirement Age", value=parameters["partner_retirement_age"] if parameters else 58)
         with col3:
             life_expectancy = st.number_input("Life Expectancy", value=parameters["life_expectancy"] if parameters else 92)
+            stochastic_lifespan = st.checkbox("Sample Lifespans from Life Table", value=parameters.get("stochastic_lifespan", False) if parameters else False)
+            life_table_file = st.file_uploader("Custom Life Table", type=["csv"], disabled=not stochastic_lifespan,
+                                               help="CSV with 'age', 'male' and 'female' columns of one-year death probabilities; "
+                                                    "the built-in US period table is used otherwise")
+            life_table = None
+            if stochastic_lifespan and life_table_file is not None:
+                try:
+                    life_table = load_life_table(life_table_file)
+                except ValueError as error:
+                    st.warning(f"{error} Using the built-in life table.")
+        with col4:
+            sexes = ["Male", "Female"]
+            self_sex = st.selectbox("Sex (Life Table)", sexes, index=sexes.index(parameters.get("self_sex", "Male")) if parameters else 0)
+            partner_sex = st.selectbox("Partner's Sex (Life Table)", sexes, index=sexes.index(parameters.get("partner_sex", "Female")) if parameters else 1)
+            survivor_expense_ratio = st.number_input("Survivor Expense (% of Couple)", value=parameters.get("survivor_expense_ratio", 0.7) * 100 if parameters else 70.0, step=5.0) / 100  # Convert to decimal
 
         # Calculate the range of valid years based on current age and life expectancy
         start_year = current_year 
@@ -257,9 +313,24 @@ with st.container(height=260, border=None):
         col1, col2, col3, col4 = st.columns([3,1,3,4])
         with col1:
             initial_savings = st.number_input("Current Total Portfolio", value=parameters["initial_savings"] if parameters else 500000, step=100000)
+            tax_deferred_share = st.number_input("Tax-Deferred Share (%)", min_value=0.0, max_value=100.0, value=parameters.get("tax_deferred_share", 0.5) * 100 if parameters else 50.0, step=5.0) / 100  # Convert to decimal
+            roth_share = st.number_input("Roth Share (%)", min_value=0.0, max_value=100.0, value=parameters.get("roth_share", 0.1) * 100 if parameters else 10.0, step=5.0) / 100  # Convert to decimal
         with col3:
             stock_percentage = st.slider("Percentage of Stock Investment (%)", min_value=0, max_value=100, value=parameters["stock_percentage"] if parameters else 60)
             bond_percentage = 100 - stock_percentage  # Calculate bond percentage
+        with col4:
+            track_accounts = st.checkbox("Track Taxable / Tax-Deferred / Roth Separately", value=parameters.get("track_accounts", False) if parameters else False)
+            order_names = list(withdrawal_orders.keys())
+            default_order = parameters.get("withdrawal_order", order_names[0]) if parameters else order_names[0]
+            withdrawal_order = st.selectbox("Withdrawal Order", order_names, index=order_names.index(default_order) if default_order in order_names else 0)
+
+        # Split the portfolio across accounts, the taxable account holds the rest
+        if track_accounts:
+            tax_deferred_share = min(tax_deferred_share, 1.0)
+            roth_share = min(roth_share, 1.0 - tax_deferred_share)
+            account_balances = [initial_savings * (1 - tax_deferred_share - roth_share), initial_savings * tax_deferred_share, initial_savings * roth_share]
+        else:
+            account_balances = None
 
     # Tab 3: Income
     with tab3:
@@ -293,6 +364,14 @@ with st.container(height=260, border=None):
         col1, col2, col3, col4 = st.columns([3,1,3,4])
         with col1:
             tax_rate = st.number_input("Tax Rate (%)", value=parameters["tax_rate"] * 100 if parameters else 10.0, step=1.0) / 100  # Convert to decimal
+        with col3:
+            tax_methods = ["Flat Rate", "Progressive Brackets"]
+            default_tax_method = parameters.get("tax_method", tax_methods[0]) if parameters else tax_methods[0]
+            tax_method = st.radio("Tax Method", options=tax_methods, index=tax_methods.index(default_tax_method) if default_tax_method in tax_methods else 0)
+        with col4:
+            filing_statuses = list(tax_tables.keys())
+            default_filing_status = parameters.get("filing_status", filing_statuses[0]) if parameters else filing_statuses[0]
+            filing_status = st.radio("Filing Status (Progressive)", options=filing_statuses, index=filing_statuses.index(default_filing_status) if default_filing_status in filing_statuses else 0)
  
     # Tab 5: Expense
     with tab5:
@@ -309,6 +388,8 @@ with st.container(height=260, border=None):
         with col4:
             st.markdown("<br>", unsafe_allow_html=True)
             st.write ('###### * Smile : Research shows household expenses decrease about 1% year over year in retirement and then can increase towards end of life due to healthcare cost')
+        selected_shock_events = st.multiselect("Random Shock Events", options=list(shock_events), default=parameters.get("shock_events", []) if parameters else [],
+                                               help="Sample long-term care costs, job losses and major repairs at random in each path")
 
     # Tab 6: Social Security 
     with tab6:
@@ -337,14 +418,39 @@ with st.container(height=260, border=None):
     # Tab 8: Market Returns
     with tab8:
         col1, col2, col3, col4 = st.columns([1,1,1,1])
+        # Fits of the return models to the historical series, read from the on-disk cache
+        calibration = load_return_calibration()
+        return_presets = calibrated_presets(calibration)
         with col1:
-            stock_return_mean = st.number_input("Stock Return Mean (%)", value=parameters["stock_return_mean"] * 100 if parameters else 7.00, step=0.25) / 100  # Convert to decimal
-            bond_return_mean = st.number_input("Bond Return Mean (%)", value=parameters["bond_return_mean"] * 100 if parameters else 3.5, step=0.25) / 100  # Convert to decimal
+            preset_names = {"Entered Values": None, "Calibrated Normal": "Normal Distribution",
+                            "Calibrated Students-T": "Students-T Distribution", "Calibrated Lognormal": "Lognormal Distribution"}
+            return_preset = return_presets.get(preset_names[st.selectbox("Return Assumptions", options=list(preset_names))])
+            stock_return_mean = st.number_input("Stock Return Mean (%)", value=round(return_preset["stock_return_mean"] * 100, 2) if return_preset else parameters["stock_return_mean"] * 100 if parameters else 7.00, step=0.25) / 100  # Convert to decimal
+            bond_return_mean = st.number_input("Bond Return Mean (%)", value=round(return_preset["bond_return_mean"] * 100, 2) if return_preset else parameters["bond_return_mean"] * 100 if parameters else 3.5, step=0.25) / 100  # Convert to decimal
+            if return_preset:
+                st.caption(f"Fitted to {calibration['first_year']}-{calibration['last_year']}. Calibrated inflation: mean {return_preset['inflation_mean'] * 100:.2f}%, "
+                           f"std dev {return_preset['inflation_std'] * 100:.2f}% (set in the Expense tab).")
         with col2:
-            stock_return_std = st.number_input("Stock Return Std Dev (%)", value=parameters["stock_return_std"] * 100 if parameters else 16.00, step=0.25) / 100  # Convert to decimal
-            bond_return_std = st.number_input("Bond Return Std Dev (%)", value=parameters["bond_return_std"] * 100 if parameters else 4.5, step=0.05) / 100  # Convert to decimal
+            stock_return_std = st.number_input("Stock Return Std Dev (%)", value=round(return_preset["stock_return_std"] * 100, 2) if return_preset else parameters["stock_return_std"] * 100 if parameters else 16.00, step=0.25) / 100  # Convert to decimal
+            bond_return_std = st.number_input("Bond Return Std Dev (%)", value=round(return_preset["bond_return_std"] * 100, 2) if return_preset else parameters["bond_return_std"] * 100 if parameters else 4.5, step=0.05) / 100  # Convert to decimal
+            default_degrees = return_preset.get("t_degrees_of_freedom", 5.0) if return_preset else parameters.get("t_degrees_of_freedom", 5.0) if parameters else 5.0
+            t_degrees_of_freedom = st.number_input("Students-T Degrees of Freedom", value=round(float(default_degrees), 1), min_value=2.1, step=1.0,
+                                                   help="Lower values give fatter tails; the calibrated fit of annual returns is close to normal")
         with col3: 
             simulations = st.number_input("Number of Simulations", value=parameters["simulations"] if parameters else 1000, step=1000)
+            time_steps = ["Annual", "Monthly"]
+            default_time_step = parameters.get("time_step", "Annual") if parameters else "Annual"
+            time_step = st.radio("Time Step", options=time_steps, index=time_steps.index(default_time_step) if default_time_step in time_steps else 0, horizontal=True)
+            multilevel_estimate = st.checkbox("Multilevel Monthly Estimate", value=False, disabled=(time_step != "Monthly"))
+            target_standard_error = st.number_input("Multilevel Target Std Error (%)", value=0.5, min_value=0.05, step=0.1,
+                                                    disabled=(time_step != "Monthly" or not multilevel_estimate),
+                                                    help="Sets the paths of both levels from a pilot run, in place of the Number of Simulations") / 100
+            grid_estimate = st.checkbox("Exact Wealth-Grid Estimate", value=False, disabled=(time_step != "Annual"),
+                                        help="Noise-free success rate for annual plans with fixed spending, one balance and a fixed life expectancy (expenses grow with mean inflation)")
+            rare_event_estimate = st.checkbox("Rare-Event Failure Estimate", value=False,
+                                              help="Importance-sampled failure rate for plans that rarely fail, tilting the draws toward bad sequences")
+            stress_tests = st.checkbox("Historical Stress Tests", value=False,
+                                       help=f"Replay historical crises from the retirement year on {stress_test_rows} paths per sequence")
         with col4: 
             # Check if parameters is None and set default simulation type
             if parameters is None:
@@ -353,15 +459,58 @@ with st.container(height=260, border=None):
                 default_simulation_type = parameters.get("simulation_type", "Normal Distribution")  # Default to "Normal Distribution" if not found
                 
                 # Ensure the default is valid
-                if default_simulation_type not in ["Normal Distribution", "Students-T Distribution", "Empirical Distribution"]:
+                if default_simulation_type not in ["Normal Distribution", "Lognormal Distribution", "Students-T Distribution", "Empirical Distribution", "Historical Sequence", "Ensemble"]:
                     default_simulation_type = "Normal Distribution"
             
             # Add radio buttons for Simulation Type
             simulation_type = st.radio(
                 "Simulation Type", 
-                options=["Normal Distribution", "Students-T Distribution", "Empirical Distribution"], 
-                index=["Normal Distribution", "Students-T Distribution",  "Empirical Distribution"].index(default_simulation_type)
+                options=["Normal Distribution", "Lognormal Distribution", "Students-T Distribution", "Empirical Distribution", "Historical Sequence", "Ensemble"], 
+                index=["Normal Distribution", "Lognormal Distribution", "Students-T Distribution", "Empirical Distribution", "Historical Sequence", "Ensemble"].index(default_simulation_type),
+                help="Historical Sequence runs the plan once for every start year since 1927 with the actual returns and inflation that followed. "
+                     "Ensemble runs several return models in one batch and weighs their results"
             )
+            ensemble_models = st.multiselect("Ensemble Models", options=ensemble_return_models, disabled=(simulation_type != "Ensemble"),
+                                             default=parameters.get("ensemble_models", ["Normal Distribution", "Students-T Distribution", "Empirical Distribution"]) if parameters else ["Normal Distribution", "Students-T Distribution", "Empirical Distribution"])
+            ensemble_weights = [st.number_input(f"Weight: {model}", value=1.0, min_value=0.0, step=0.25) for model in ensemble_models] if simulation_type == "Ensemble" else []
+            if simulation_type == "Ensemble" and (not ensemble_models or sum(ensemble_weights) <= 0):
+                st.warning("Select at least one model with a positive weight; the ensemble runs all models with equal weights otherwise.")
+                ensemble_models, ensemble_weights = [], []
+            parametric_returns = simulation_type in ("Normal Distribution", "Lognormal Distribution", "Students-T Distribution", "Ensemble")
+            parameter_uncertainty = st.checkbox("Uncertain Return Assumptions", value=parameters.get("parameter_uncertainty", False) if parameters else False,
+                                                disabled=not parametric_returns,
+                                                help="Draw each path's own stock and bond mean and volatility around the entered values, with the uncertainty of estimates from the historical record") and parametric_returns
+
+        with st.expander("Calibration Details"):
+            st.write(f"Maximum-likelihood fits to {calibration['observations']} years of returns and inflation "
+                     f"({calibration['first_year']}-{calibration['last_year']}).")
+            students_t = calibration['students_t']
+            st.dataframe(pd.DataFrame([
+                {"Model": "Normal", "Stock Mean / Location": f"{calibration['normal']['stock']['mean'] * 100:.2f}%",
+                 "Stock Std Dev / Scale": f"{calibration['normal']['stock']['std'] * 100:.2f}%",
+                 "Bond Mean / Location": f"{calibration['normal']['bond']['mean'] * 100:.2f}%",
+                 "Bond Std Dev / Scale": f"{calibration['normal']['bond']['std'] * 100:.2f}%", "Degrees of Freedom": "",
+                 "Log-Likelihood": f"{calibration['normal']['stock']['log_likelihood'] + calibration['normal']['bond']['log_likelihood']:.1f}"},
+                {"Model": "Students-T", "Stock Mean / Location": f"{students_t['stock']['location'] * 100:.2f}%",
+                 "Stock Std Dev / Scale": f"{students_t['stock']['scale'] * 100:.2f}%",
+                 "Bond Mean / Location": f"{students_t['bond']['location'] * 100:.2f}%",
+                 "Bond Std Dev / Scale": f"{students_t['bond']['scale'] * 100:.2f}%", "Degrees of Freedom": f"{students_t['degrees_of_freedom']:.1f}",
+                 "Log-Likelihood": f"{students_t['stock']['log_likelihood'] + students_t['bond']['log_likelihood']:.1f}"},
+                {"Model": "Lognormal", "Stock Mean / Location": f"{calibration['lognormal']['stock']['mean'] * 100:.2f}%",
+                 "Stock Std Dev / Scale": f"{calibration['lognormal']['stock']['std'] * 100:.2f}%",
+                 "Bond Mean / Location": f"{calibration['lognormal']['bond']['mean'] * 100:.2f}%",
+                 "Bond Std Dev / Scale": f"{calibration['lognormal']['bond']['std'] * 100:.2f}%", "Degrees of Freedom": "",
+                 "Log-Likelihood": f"{calibration['lognormal']['stock']['log_likelihood'] + calibration['lognormal']['bond']['log_likelihood']:.1f}"}
+            ]), hide_index=True, use_container_width=True)
+            st.write("Two-regime fit of stocks, bonds and inflation together (not used by the simulation):")
+            st.dataframe(pd.DataFrame([{
+                "Regime": index + 1,
+                "Long-Run Share": f"{regime['long_run_share'] * 100:.0f}%",
+                "Mean Duration (Years)": f"{regime['mean_duration']:.1f}",
+                "Stock Mean": f"{regime['stock_mean'] * 100:.2f}%", "Stock Std Dev": f"{regime['stock_std'] * 100:.2f}%",
+                "Bond Mean": f"{regime['bond_mean'] * 100:.2f}%", "Bond Std Dev": f"{regime['bond_std'] * 100:.2f}%",
+                "Inflation Mean": f"{regime['inflation_mean'] * 100:.2f}%", "Inflation Std Dev": f"{regime['inflation_std'] * 100:.2f}%"
+            } for index, regime in enumerate(calibration['regime']['regimes'])]), hide_index=True, use_container_width=True)
 
     # Tab 9: Downsize
     with tab9:
@@ -418,6 +567,42 @@ with st.container(height=260, border=None):
             windfall_year_3 = st.selectbox("Year of Windfall 3", years, index=0 if parameters is None else years.index(parameters["windfall_year_3"]))
             windfall_amount_3 = st.number_input("Windfall Amount 3 ", value=parameters["windfall_amount_3"] if parameters else 0, step=20000)
 
+    # Tab 13: Withdrawal Strategy
+    with tab13:
+        col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+        with col1:
+            strategy_names = list(withdrawal_strategies.keys()) + ["Optimal Policy (Dynamic Programming)"]
+            default_strategy = parameters.get("withdrawal_strategy", strategy_names[0]) if parameters else strategy_names[0]
+            if default_strategy not in strategy_names:
+                default_strategy = strategy_names[0]
+            withdrawal_strategy_name = st.radio("Withdrawal Strategy", options=strategy_names, index=strategy_names.index(default_strategy))
+            policy_objective = st.radio("Policy Objective", options=policy_objectives, horizontal=True, 
+                                        disabled=(withdrawal_strategy_name != "Optimal Policy (Dynamic Programming)"))
+        with col2:
+            withdrawal_rate = st.number_input("Withdrawal Rate (%)", value=4.0, step=0.25) / 100  # Convert to decimal
+            expected_real_return = st.number_input("VPW Expected Real Return (%)", value=3.0, step=0.25) / 100  # Convert to decimal
+        with col3:
+            guardrail_band = st.number_input("Guardrail Band (%)", value=20.0, step=5.0) / 100  # Convert to decimal
+            guardrail_adjustment = st.number_input("Guardrail Adjustment (%)", value=10.0, step=1.0) / 100  # Convert to decimal
+        with col4:
+            spending_floor = st.number_input("Spending Floor (% of Expense)", value=85.0, step=5.0) / 100  # Convert to decimal
+            spending_ceiling = st.number_input("Spending Ceiling (% of Expense)", value=125.0, step=5.0) / 100  # Convert to decimal
+
+        # Build the selected strategy with its parameters
+        if withdrawal_strategy_name == "Constant Percentage":
+            withdrawal_strategy = withdrawal_strategies[withdrawal_strategy_name](withdrawal_rate)
+        elif withdrawal_strategy_name == "Guyton-Klinger Guardrails":
+            withdrawal_strategy = withdrawal_strategies[withdrawal_strategy_name](guardrail_band, guardrail_band, guardrail_adjustment)
+        elif withdrawal_strategy_name == "Variable Percentage (VPW)":
+            withdrawal_strategy = withdrawal_strategies[withdrawal_strategy_name](expected_real_return)
+        elif withdrawal_strategy_name == "Floor and Ceiling":
+            withdrawal_strategy = withdrawal_strategies[withdrawal_strategy_name](withdrawal_rate, spending_floor, spending_ceiling)
+        elif withdrawal_strategy_name == "Optimal Policy (Dynamic Programming)":
+            # Solved from the full plan when the simulation runs
+            withdrawal_strategy = None
+        else:
+            withdrawal_strategy = withdrawal_strategies[withdrawal_strategy_name]()
+
 
 # Create download parameters feature 
 params_df = create_parameters_dataframe(
@@ -443,7 +628,10 @@ params_df = create_parameters_dataframe(
     windfall_year_1, windfall_amount_1,
     windfall_year_2, windfall_amount_2,
     windfall_year_3, windfall_amount_3,
-    simulation_type
+    simulation_type, withdrawal_strategy_name, tax_method, filing_status,
+    track_accounts, tax_deferred_share, roth_share, withdrawal_order,
+    stochastic_lifespan, self_sex, partner_sex, survivor_expense_ratio, time_step,
+    selected_shock_events, parameter_uncertainty, ensemble_models, t_degrees_of_freedom
 )
 
 # Convert DataFrame to CSV format
@@ -496,74 +684,115 @@ one_time_amounts = [one_time_amount_1, one_time_amount_2, one_time_amount_3]
 windfall_years = [windfall_year_1, windfall_year_2, windfall_year_3]
 windfall_amounts = [windfall_amount_1, windfall_amount_2, windfall_amount_3]
 
+# Collect the simulation inputs 
+simulation_parameters = dict(
+    current_age=current_age, partner_current_age=partner_current_age, life_expectancy=life_expectancy, initial_savings=initial_savings, 
+    annual_earnings=annual_earnings, partner_earnings=partner_earnings, self_yearly_increase=self_yearly_increase, partner_yearly_increase=partner_yearly_increase,
+    annual_pension=annual_pension, partner_pension=partner_pension, self_pension_yearly_increase=self_pension_yearly_increase, partner_pension_yearly_increase=partner_pension_yearly_increase,
+    rental_start=rental_start, rental_end=rental_end, rental_amt=rental_amt, rental_yearly_increase=rental_yearly_increase, 
+    annual_expense=annual_expense, mortgage_payment=mortgage_payment,
+    mortgage_years_remaining=mortgage_years_remaining, retirement_age=retirement_age, partner_retirement_age=partner_retirement_age, 
+    annual_social_security=annual_social_security, withdrawal_start_age=withdrawal_start_age, partner_social_security=partner_social_security, 
+    partner_withdrawal_start_age=partner_withdrawal_start_age, self_healthcare_cost=self_healthcare_cost, self_healthcare_start_age=self_healthcare_start_age, 
+    partner_healthcare_start_age=partner_healthcare_start_age, partner_healthcare_cost=partner_healthcare_cost, stock_percentage=stock_percentage, 
+    bond_percentage=bond_percentage, stock_return_mean=stock_return_mean, bond_return_mean=bond_return_mean, stock_return_std=stock_return_std, 
+    bond_return_std=bond_return_std, simulations=simulations, tax_rate=tax_rate, cola_rate=cola_rate, inflation_mean=inflation_mean, 
+    inflation_std=inflation_std, annual_expense_decrease=annual_expense_decrease, years_until_downsize=years_until_downsize, residual_amount=residual_amount, 
+    adjust_expense_years=adjust_expense_years, adjust_expense_amounts=adjust_expense_amounts,  
+    one_time_years=one_time_years, one_time_amounts=one_time_amounts,             
+    windfall_years=windfall_years, windfall_amounts=windfall_amounts, 
+    simulation_type=simulation_type, 
+    tax_method=tax_method, filing_status=filing_status, 
+    account_balances=account_balances, withdrawal_order=withdrawal_order, 
+    stochastic_lifespan=stochastic_lifespan, self_sex=self_sex, partner_sex=partner_sex, 
+    survivor_expense_ratio=survivor_expense_ratio, life_table=life_table, time_step=time_step,
+    shock_events=selected_shock_events, parameter_uncertainty=parameter_uncertainty,
+    ensemble_models=ensemble_models or None, ensemble_weights=ensemble_weights or None, t_degrees_of_freedom=t_degrees_of_freedom
+)
+
 # Initialize variables to store results
 if 'simulation_results' not in st.session_state:
-    st.session_state.simulation_results = {
-        'success_count': 0,
-        'failure_count': 0,
-        'sorted_cash_flows': []
-    }
+    st.session_state.simulation_results = None
+    st.session_state.multilevel_results = None
+    st.session_state.grid_results = None
+    st.session_state.rare_event_results = None
+    st.session_state.plan_rules = (None, None)
+    st.session_state.goal_seek_results = None
+    st.session_state.sweep_results = None
+    st.session_state.tornado_results = None
+    st.session_state.claiming_results = None
+    st.session_state.glide_path_results = None
+    st.session_state.timing_results = None
     # Set a flag to indicate if the simulation has been run
     st.session_state.simulation_initialized = False
 
 
 # Run the simulation only when the button is pressed
 if (not st.session_state.simulation_initialized) or auto_run_simulation or run_simulation:
-    # Run the simulation
-    success_count, failure_count, sorted_cash_flows = monte_carlo_simulation(
-        current_age, partner_current_age, life_expectancy, initial_savings, 
-        annual_earnings, partner_earnings, self_yearly_increase, partner_yearly_increase,
-        annual_pension, partner_pension, self_pension_yearly_increase, partner_pension_yearly_increase,
-        rental_start, rental_end, rental_amt, rental_yearly_increase, 
-        annual_expense, mortgage_payment,
-        mortgage_years_remaining, retirement_age, partner_retirement_age, 
-        annual_social_security, withdrawal_start_age, partner_social_security, 
-        partner_withdrawal_start_age, self_healthcare_cost, self_healthcare_start_age, partner_healthcare_start_age,
-        partner_healthcare_cost, stock_percentage, bond_percentage, 
-        stock_return_mean, bond_return_mean, stock_return_std, bond_return_std, 
-        simulations, tax_rate, cola_rate, inflation_mean, inflation_std, annual_expense_decrease, 
-        years_until_downsize, residual_amount, 
-        adjust_expense_years, adjust_expense_amounts,  
-        one_time_years, one_time_amounts,             
-        windfall_years, windfall_amounts, 
-        simulation_type        
-    )
+    allocation_rule = None
+    if withdrawal_strategy_name == "Optimal Policy (Dynamic Programming)":
+        # Solve the spending and allocation tables on annual steps, then simulate the paths with them
+        try:
+            policy = solve_policy(dict(simulation_parameters, time_step="Annual"), policy_objective, spending_floor=spending_floor)
+            withdrawal_strategy, allocation_rule = policy_strategy(policy), policy_allocation(policy)
+        except ValueError as error:
+            st.warning(f"{error} Running with fixed spending instead.")
+
+    # Plans the return model cannot cover (e.g. longer than the historical record) stop with a warning
+    try:
+        if time_step == "Monthly" and multilevel_estimate:
+            # Many annual paths plus a few coupled monthly paths - the annual paths are shown below
+            multilevel_results = multilevel_success_probability(
+                simulation_parameters, withdrawal_strategy=withdrawal_strategy, allocation_rule=allocation_rule,
+                target_standard_error=target_standard_error
+            )
+            st.session_state.simulation_results = multilevel_results['coarse_result']
+            st.session_state.multilevel_results = multilevel_results
+        else:
+            # Run all simulation paths as one batch, with local sensitivities from the same pass
+            # when spending is fixed and taxes are flat
+            gradients_supported = (withdrawal_strategy_name == "Fixed (Inflation Adjusted)" and allocation_rule is None 
+                                   and account_balances is None and time_step == "Annual" and tax_method == "Flat Rate")
+            st.session_state.simulation_results = batch_monte_carlo_simulation(
+                **simulation_parameters, 
+                withdrawal_strategy=None if gradients_supported else withdrawal_strategy, allocation_rule=allocation_rule,
+                gradients=gradients_supported, stress_tests=list(stress_sequences) if stress_tests else None
+            )
+            st.session_state.multilevel_results = None
+    except ValueError as error:
+        st.warning(str(error))
+        st.stop()
+
+    # Wealth-grid engine for plans whose cash flows do not depend on the portfolio
+    grid_supported = (withdrawal_strategy_name == "Fixed (Inflation Adjusted)" and account_balances is None 
+                      and not stochastic_lifespan and time_step == "Annual" and simulation_type not in ("Historical Sequence", "Ensemble")
+                      and not selected_shock_events and not parameter_uncertainty)
+    st.session_state.grid_results = markov_chain_success(simulation_parameters) if grid_estimate and grid_supported else None
+
+    # Importance-sampled failure rate for plans that rarely fail
+    rare_event_supported = simulation_type not in ("Historical Sequence", "Ensemble")
+    st.session_state.rare_event_results = rare_event_failure(simulation_parameters, withdrawal_strategy=withdrawal_strategy, 
+                                                             allocation_rule=allocation_rule) if rare_event_estimate and rare_event_supported else None
 
-        # Store the results in session state
-    st.session_state.simulation_results = {
-        'success_count': success_count,
-        'failure_count': failure_count,
-        'sorted_cash_flows': sorted_cash_flows
-    }
+    # Keep the rules of this run for the plan analysis tools
+    st.session_state.plan_rules = (withdrawal_strategy, allocation_rule)
 
     # Set a flag to indicate if the simulation has been run
     st.session_state.simulation_initialized = True
 
 # Extract results from session state for display
-success_count = st.session_state.simulation_results['success_count']
-failure_count = st.session_state.simulation_results['failure_count']
-sorted_cash_flows = st.session_state.simulation_results['sorted_cash_flows']
+simulation_results = st.session_state.simulation_results
+success_count = simulation_results['success_count']
+failure_count = simulation_results['failure_count']
 
-# Calculate the indices for the percentiles
-n = len(sorted_cash_flows)
-tenth_index = int(0.1 * n)
-twentyfifth_index = int(0.25 * n)
-fiftieth_index = int(0.5 * n)
-seventyfifth_index = int(0.75 * n)
+# Get the simulation IDs for the 10th, 25th, 50th, and 75th percentiles
+simulation_id_10th, simulation_id_25th, simulation_id_50th, simulation_id_75th = percentile_simulation_ids(simulation_results, [10, 25, 50, 75])
 
-# Get the simulation IDs for the 10th, 50th, and 90th percentiles
-simulation_id_10th = sorted_cash_flows[tenth_index - 1][-1]['Simulation ID']  # Last simulation in the 10th percentile
-simulation_id_25th = sorted_cash_flows[twentyfifth_index - 1][-1]['Simulation ID']  # Last simulation in the 10th percentile
-simulation_id_50th = sorted_cash_flows[fiftieth_index - 1][-1]['Simulation ID']  # Last simulation in the 50th percentile
-simulation_id_75th = sorted_cash_flows[seventyfifth_index - 1][-1]['Simulation ID']  # Last simulation in the 90th percentile
-
-
-
-# Filter all cash flows based on the identified simulation IDs
-df_cashflow_10th = pd.DataFrame([entry for simulation in sorted_cash_flows if simulation[0]['Simulation ID'] == simulation_id_10th for entry in simulation])
-df_cashflow_25th = pd.DataFrame([entry for simulation in sorted_cash_flows if simulation[0]['Simulation ID'] == simulation_id_25th for entry in simulation])
-df_cashflow_50th = pd.DataFrame([entry for simulation in sorted_cash_flows if simulation[0]['Simulation ID'] == simulation_id_50th for entry in simulation])
-df_cashflow_75th = pd.DataFrame([entry for simulation in sorted_cash_flows if simulation[0]['Simulation ID'] == simulation_id_75th for entry in simulation])
+# Build the cash flows of the identified simulations
+df_cashflow_10th = pd.DataFrame(build_cash_flows(simulation_results, simulation_id_10th))
+df_cashflow_25th = pd.DataFrame(build_cash_flows(simulation_results, simulation_id_25th))
+df_cashflow_50th = pd.DataFrame(build_cash_flows(simulation_results, simulation_id_50th))
+df_cashflow_75th = pd.DataFrame(build_cash_flows(simulation_results, simulation_id_75th))
 
 # Function to format the DataFrame
 def format_cashflow_dataframe(df):
@@ -610,6 +839,18 @@ total_simulations = success_count + failure_count
 success_rate = (success_count / total_simulations) * 100 if total_simulations > 0 else 0
 failure_rate = (failure_count / total_simulations) * 100 if total_simulations > 0 else 0
 
+# An ensemble reports the weighted mixture of its return models
+model_results = simulation_results.get('model_results')
+if model_results is not None:
+    success_rate = model_results['mixture']['success_probability'] * 100
+    failure_rate = 100 - success_rate
+
+# Use the bias-corrected monthly estimate when the multilevel option was run
+multilevel_results = st.session_state.multilevel_results
+if multilevel_results is not None:
+    success_rate = multilevel_results['success_probability'] * 100
+    failure_rate = 100 - success_rate
+
 # Extract the end-of-period balances for the 10th, 50th, and 90th percentiles
 end_balance_10th = df_cashflow_10th['Ending Portfolio Value'].iloc[-1]  # Last entry for 10th percentile
 end_balance_25th = df_cashflow_25th['Ending Portfolio Value'].iloc[-1]  # Last entry for 10th percentile
@@ -625,28 +866,78 @@ end_balance_75th_millions = float(end_balance_75th.replace(',', '')) / 1_000_000
 
 # Display linear metrics indicator
 st.markdown(create_linear_indicator(math.floor(success_rate), "Success Rate: "), unsafe_allow_html=True)
-
-# Calculate the length of the plan
-years = life_expectancy - current_age + 1
+if multilevel_results is not None:
+    st.caption(f"Multilevel monthly estimate {success_rate:.1f}% ± {multilevel_results['standard_error'] * 100:.1f}% "
+               f"(annual paths {multilevel_results['coarse_success_probability'] * 100:.1f}%, monthly correction {multilevel_results['correction'] * 100:+.1f}%). "
+               f"{multilevel_results['simulation_counts'][0]:,} annual paths and {multilevel_results['simulation_counts'][1]:,} monthly pairs, "
+               "sized from a pilot run. Scenarios below are annual paths.")
+grid_results = st.session_state.grid_results
+if grid_results is not None:
+    st.caption(f"Exact wealth-grid success rate {grid_results['success_probability'] * 100:.2f}% with inflation at its mean "
+               f"(median final balance {grid_results['terminal_percentiles'][50] / 1_000_000:,.2f}M).")
+rare_event_results = st.session_state.rare_event_results
+if rare_event_results is not None:
+    if rare_event_results['tilted']:
+        st.caption(f"Importance-sampled failure rate {rare_event_results['failure_probability'] * 100:.3f}% ± {rare_event_results['standard_error'] * 100:.3f}% "
+                   f"(as precise as about {rare_event_results['variance_reduction']:,.0f}× as many plain paths).")
+    else:
+        st.caption(f"Failure rate {rare_event_results['failure_probability'] * 100:.3f}% ± {rare_event_results['standard_error'] * 100:.3f}% "
+                   "(tilting the draws did not help for this plan, so plain sampling was used).")
+
+# Outcome of every historical start year
+if simulation_results.get('start_years') is not None:
+    start_years = simulation_results['start_years']
+    st.caption(f"Historical sequences: {len(start_years)} start years from {start_years[0]} to {start_years[-1]}, "
+               f"{failure_count} ran out of money (fixed life expectancy).")
+    start_year_df = pd.DataFrame({
+        'Start Year': start_years,
+        'Final Savings': simulation_results['final_savings'],
+        'Outcome': np.where(simulation_results['success'], "Success", "Failure")
+    })
+    st.altair_chart(alt.Chart(start_year_df).mark_bar().encode(
+        x=alt.X('Start Year:O'),
+        y=alt.Y('Final Savings:Q', axis=alt.Axis(format='$,.2s')),
+        color=alt.Color('Outcome:N', scale=alt.Scale(domain=["Success", "Failure"], range=["#55AA55", "#DD5050"])),
+        tooltip=['Start Year', alt.Tooltip('Final Savings:Q', format='$,.0f')]
+    ).properties(title='Final Savings by Historical Start Year'), use_container_width=True)
+
+# Side-by-side outcome of each return model of an ensemble
+if model_results is not None:
+    st.caption("Return models run in one batch on the same plan schedules; the success rate above is their weighted mixture "
+               "and the scenarios below pool the paths of all models, with rows in proportion to the weights.")
+    st.dataframe(pd.DataFrame([{
+        "Return Model": model['model'],
+        "Weight": f"{model['weight'] * 100:.0f}%",
+        "Success Rate": f"{model['success_probability'] * 100:.1f}%",
+        "10th Percentile Final Savings": f"${model['final_savings_percentiles'][10]:,.0f}",
+        "Median Final Savings": f"${model['final_savings_percentiles'][50]:,.0f}",
+        "90th Percentile Final Savings": f"${model['final_savings_percentiles'][90]:,.0f}"
+    } for model in model_results['models'] + [model_results['mixture']]]), hide_index=True, use_container_width=True)
+
+# Each percentile path ends at its own horizon (sampled lifespans end paths at different ages),
+# so its end balance is deflated over that path's years
+deflator_10th, deflator_25th, deflator_50th, deflator_75th = [
+    (1 + inflation_mean) ** int(simulation_results['horizons'][simulation_id])
+    for simulation_id in (simulation_id_10th, simulation_id_25th, simulation_id_50th, simulation_id_75th)]
 
 # Prepare the data for the grid
 data = {
     "Ending Balance": ["Future Currency Value", "Today's Currency Value"],
     "Worst Case": [
         f"{end_balance_10th_millions:,.2f}M",
-        f"{end_balance_10th_millions / ((1 + inflation_mean) ** years):,.2f}M"
+        f"{end_balance_10th_millions / deflator_10th:,.2f}M"
     ],
     "Below Market": [  # New label for 25th percentile
         f"{end_balance_25th_millions:,.2f}M",  # Assuming you have this variable defined
-        f"{end_balance_25th_millions / ((1 + inflation_mean) ** years):,.2f}M"
+        f"{end_balance_25th_millions / deflator_25th:,.2f}M"
     ],
     "Most Likely": [
         f"{end_balance_50th_millions:,.2f}M",
-        f"{end_balance_50th_millions / ((1 + inflation_mean) ** years):,.2f}M"
+        f"{end_balance_50th_millions / deflator_50th:,.2f}M"
     ],
     "Best Case": [
         f"{end_balance_75th_millions:,.2f}M",
-        f"{end_balance_75th_millions / ((1 + inflation_mean) ** years):,.2f}M"
+        f"{end_balance_75th_millions / deflator_75th:,.2f}M"
     ]
 }
 
@@ -818,11 +1109,15 @@ def create_cash_flow_tab(df_cashflow, df_cashflow_value, title):
 
 
 # Create tabs for the cash flow summaries
-tab_10th, tab_25th, tab_50th, tab_75th = st.tabs([
+tab_10th, tab_25th, tab_50th, tab_75th, tab_scenarios, tab_stress, tab_analytics, tab_drivers = st.tabs([
             ":material/sentiment_dissatisfied: Worst Case ", 
             ":material/avg_pace: Below Average", 
             ":material/speed: Most Likely ", 
-            ":material/diamond: Best Case "])
+            ":material/diamond: Best Case ",
+            ":material/hub: Typical Scenarios ",
+            ":material/thunderstorm: Stress Tests ",
+            ":material/query_stats: Path Analytics ",
+            ":material/troubleshoot: Failure Drivers "])
 
 # Tab for 10th Percentile
 with tab_10th:
@@ -840,6 +1135,129 @@ with tab_50th:
 with tab_75th:
     create_cash_flow_tab(df_cashflow_75th, df_cashflow_75th_value, "75th Percentile")
 
+# Tab for the archetype scenarios found by clustering all balance paths
+with tab_scenarios:
+    scenario_count = st.slider("Number of Scenarios", min_value=2, max_value=8, value=5)
+    scenarios = scenario_clusters(simulation_results, clusters=scenario_count)
+    st.write("All simulated paths grouped by the shape of their balance over time. Each scenario is shown by its most typical path, "
+             "with the share of paths it stands for.")
+    scenario_ages = np.broadcast_to(simulation_results['schedules']['self_age'], simulation_results['ending_balances'].shape)
+    scenario_names = [f"Scenario {index + 1} ({scenario['probability'] * 100:.0f}%)" for index, scenario in enumerate(scenarios['clusters'])]
+    scenario_df = pd.concat([pd.DataFrame({
+        'Age': scenario_ages[scenario['representative_id']],
+        'Ending Portfolio Value': simulation_results['ending_balances'][scenario['representative_id']],
+        'Scenario': name
+    }) for name, scenario in zip(scenario_names, scenarios['clusters'])])
+    st.altair_chart(alt.Chart(scenario_df).mark_line().encode(
+        x=alt.X('Age:Q', scale=alt.Scale(zero=False)),
+        y=alt.Y('Ending Portfolio Value:Q', axis=alt.Axis(format='$,.2s')),
+        color=alt.Color('Scenario:N', sort=scenario_names),
+        tooltip=['Scenario', 'Age', alt.Tooltip('Ending Portfolio Value:Q', format='$,.0f')]
+    ).properties(title='Typical Path of Each Scenario'), use_container_width=True)
+    st.dataframe(pd.DataFrame([{
+        "Scenario": name,
+        "Share of Paths": f"{scenario['probability'] * 100:.1f}%",
+        "Success Rate": f"{scenario['success_probability'] * 100:.1f}%",
+        "Median Final Savings": f"${scenario['median_final_savings']:,.0f}",
+        "Median Depletion Age": f"{scenario['median_depletion_age']:.0f}" if scenario['median_depletion_age'] is not None else "-",
+        "Typical Path Final Savings": f"${simulation_results['final_savings'][scenario['representative_id']]:,.0f}"
+    } for name, scenario in zip(scenario_names, scenarios['clusters'])]), hide_index=True, use_container_width=True)
+    st.caption(f"The scenarios account for {scenarios['explained_variance'] * 100:.0f}% of the variation between paths.")
+
+# Tab for the historical stress sequences run alongside the simulation
+with tab_stress:
+    stress_results = simulation_results.get('stress_results')
+    if stress_results is None:
+        st.info("Turn on Historical Stress Tests in the Market Returns tab to replay historical crises "
+                "(single-batch simulation only, not the multilevel monthly estimate).")
+    else:
+        st.write("Each sequence replays historical returns and inflation from the retirement year on a share of the simulated paths; "
+                 "later years keep their random draws. Success is compared with the same paths unstressed.")
+        st.dataframe(pd.DataFrame([{
+            "Stress Sequence": stress['name'],
+            "Paths": stress['paths'],
+            "Success Rate": f"{stress['success'] * 100:.1f}% ± {stress['success_standard_error'] * 100:.1f}%",
+            "Without Stress": f"{stress['baseline_success'] * 100:.1f}%",
+            "Median Final Savings": f"${stress['median_final_savings']:,.0f}",
+            "Without Stress ": f"${stress['baseline_median_final_savings']:,.0f}"
+        } for stress in stress_results]), hide_index=True, use_container_width=True)
+
+        plan_ages = np.arange(current_age, current_age + len(stress_results[0]['median_balances']))
+        stress_df = pd.concat([pd.DataFrame({'Age': plan_ages, 'Median Balance': stress['median_balances'], 'Sequence': stress['name']})
+                               for stress in stress_results] +
+                              [pd.DataFrame({'Age': plan_ages, 'Median Balance': stress_results[0]['baseline_median_balances'], 'Sequence': "No Stress"})])
+        st.altair_chart(alt.Chart(stress_df).mark_line().encode(
+            x=alt.X('Age:Q', scale=alt.Scale(zero=False)),
+            y=alt.Y('Median Balance:Q', axis=alt.Axis(format='$,.2s')),
+            color=alt.Color('Sequence:N'),
+            tooltip=['Sequence', 'Age', alt.Tooltip('Median Balance:Q', format='$,.0f')]
+        ).properties(title='Median Portfolio Balance by Stress Sequence'), use_container_width=True)
+
+with tab_analytics:
+    # Reducers the engine tracked across all paths during the run
+    analytics = simulation_results['path_analytics']
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Ran Out of Money", f"{analytics['depletion_probability'] * 100:.1f}%")
+    col2.metric("Median Depletion Age", f"{analytics['median_depletion_age']:.0f}" if analytics['median_depletion_age'] is not None else "Never")
+    col3.metric("Median Max Drawdown", f"{analytics['median_max_drawdown'] * 100:.0f}%")
+    col4.metric("Average Shortfall Years", f"{analytics['mean_shortfall_years']:.1f}")
+    col5.metric(f"Final Savings CVaR {analytics['cvar_level'] * 100:.0f}%", f"{analytics['terminal_cvar'] / 1_000_000:,.2f}M",
+                help=f"Average final savings in the worst {analytics['cvar_level'] * 100:.0f}% of paths")
+    min_real_percentiles = np.percentile(analytics['min_real_balance'], [10, 50])
+    st.caption(f"Lowest balance in today's dollars along the path: {min_real_percentiles[0] / 1_000_000:,.2f}M or less on 10% of paths, "
+               f"{min_real_percentiles[1] / 1_000_000:,.2f}M at the median.")
+
+    survival_df = pd.DataFrame({'Age': analytics['survival_ages'], 'Money Lasts': analytics['survival_curve']})
+    st.altair_chart(alt.Chart(survival_df).mark_line(color="#55AA55").encode(
+        x=alt.X('Age:Q', scale=alt.Scale(zero=False)),
+        y=alt.Y('Money Lasts:Q', axis=alt.Axis(format='%'), scale=alt.Scale(domain=[0, 1])),
+        tooltip=['Age', alt.Tooltip('Money Lasts:Q', format='.1%')]
+    ).properties(title='Share of Paths with Money Left by Age'), use_container_width=True)
+
+    depletion_ages = analytics['depletion_age'][~np.isnan(analytics['depletion_age'])]
+    if len(depletion_ages):
+        ages, counts = np.unique(depletion_ages, return_counts=True)
+        st.altair_chart(alt.Chart(pd.DataFrame({'Age': ages, 'Share of Paths': counts / len(analytics['depletion_age'])})).mark_bar(color="#DD5050").encode(
+            x=alt.X('Age:O'),
+            y=alt.Y('Share of Paths:Q', axis=alt.Axis(format='%')),
+            tooltip=['Age', alt.Tooltip('Share of Paths:Q', format='.2%')]
+        ).properties(title='Age When the Money Ran Out'), use_container_width=True)
+
+with tab_drivers:
+    # Which years' returns and inflation decide success, across all paths of the run
+    drivers = failure_drivers(simulation_results)
+    if drivers['failure_rate'] in (0.0, 1.0):
+        st.info("Failure drivers need both successful and failed paths in the run.")
+    else:
+        st.write("Risk contribution of each year: how much of the difference between failed and successful paths its portfolio return "
+                 "and inflation explain, with all other years held fixed.")
+        contribution_df = pd.concat([
+            pd.DataFrame({'Age': drivers['ages'], 'Risk Contribution': drivers['return_contribution'], 'Driver': "Portfolio Return"}),
+            pd.DataFrame({'Age': drivers['ages'], 'Risk Contribution': drivers['inflation_contribution'], 'Driver': "Inflation"})
+        ])
+        st.altair_chart(alt.Chart(contribution_df).mark_bar().encode(
+            x=alt.X('Age:O'),
+            y=alt.Y('Risk Contribution:Q', axis=alt.Axis(format='%')),
+            color=alt.Color('Driver:N', scale=alt.Scale(domain=["Portfolio Return", "Inflation"], range=["#5070DD", "#DD9050"])),
+            tooltip=['Driver', 'Age', alt.Tooltip('Risk Contribution:Q', format='.2%')]
+        ).properties(title='Risk Contribution by Year'), use_container_width=True)
+        shock_text = (f" Shock event costs add {drivers['shock_contribution'] * 100:.1f}%."
+                      if drivers['shock_contribution'] is not None else "")
+        st.caption(f"Together the years explain {drivers['r_squared'] * 100:.0f}% of the variation in outcomes.{shock_text}")
+
+        window_df = pd.concat([
+            pd.DataFrame({'Age': drivers['window_start_ages'], 'Failure Rate': drivers['return_bin_failure_rates'][:, 0], 'Paths': "Worst Returns"}),
+            pd.DataFrame({'Age': drivers['window_start_ages'], 'Failure Rate': drivers['return_bin_failure_rates'][:, -1], 'Paths': "Best Returns"}),
+            pd.DataFrame({'Age': drivers['window_start_ages'], 'Failure Rate': drivers['inflation_bin_failure_rates'][:, 0], 'Paths': "Highest Inflation"})
+        ])
+        st.altair_chart(alt.Chart(window_df).mark_line().encode(
+            x=alt.X('Age:Q', scale=alt.Scale(zero=False)),
+            y=alt.Y('Failure Rate:Q', axis=alt.Axis(format='%')),
+            color=alt.Color('Paths:N'),
+            tooltip=['Paths', 'Age', alt.Tooltip('Failure Rate:Q', format='.1%')]
+        ).properties(title=f"Failure Rate of the Worst and Best Fifth of Paths over {drivers['window']} Years from Each Age"),
+            use_container_width=True)
+
 
 
 
@@ -847,3 +1265,261 @@ st.markdown("<br><br><br>", unsafe_allow_html=True)
 
     ######################################
 
+
+####################################
+# Plan analysis tools run on the same plan and spending rules as the last simulation
+st.markdown("<br>", unsafe_allow_html=True)
+st.write("#### Plan Analysis ")
+
+plan_withdrawal_strategy, plan_allocation_rule = st.session_state.plan_rules
+tab_goal_seek, tab_sweep, tab_tornado, tab_claiming, tab_glide_path, tab_timing = st.tabs([
+            ":material/target: Goal Seek", 
+            ":material/grid_on: Grid Sweep", 
+            ":material/tornado: Sensitivity",
+            ":material/elderly: Social Security Claiming",
+            ":material/trending_down: Glide Path",
+            ":material/schedule: Decision Timing"])
+
+with tab_goal_seek:
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        goal = st.selectbox("Solve For", options=list(goal_seek_goals.keys()))
+    with col2:
+        target_success = st.number_input("Target Success Rate (%)", value=90.0, min_value=1.0, max_value=100.0, step=1.0) / 100  # Convert to decimal
+    with col3:
+        run_goal_seek = st.button("Run Goal Seek", type='primary', icon=":material/target:")
+
+    if run_goal_seek:
+        st.session_state.goal_seek_results = goal_seek(simulation_parameters, goal, target_success, 
+                                                       withdrawal_strategy=plan_withdrawal_strategy, allocation_rule=plan_allocation_rule)
+
+    goal_seek_results = st.session_state.goal_seek_results
+    if goal_seek_results is not None:
+        if goal_seek_results['achievable']:
+            st.metric(goal_seek_results['goal'], f"{goal_seek_results['value']:,.0f}", 
+                      help=f"Success rate {goal_seek_results['success_probability'] * 100:.1f}% at this value")
+        else:
+            st.warning(f"No value in the search range reaches {goal_seek_results['target_success'] * 100:.0f}% success. "
+                       f"Closest: {goal_seek_results['closest_value']:,.0f} at {goal_seek_results['success_probability'] * 100:.1f}%.")
+        evaluations_df = pd.DataFrame(goal_seek_results['evaluations'], columns=["Value", "Success Rate"])
+        st.altair_chart(alt.Chart(evaluations_df).mark_line(point=True).encode(
+            x=alt.X('Value:Q', title=goal_seek_results['goal']),
+            y=alt.Y('Success Rate:Q', axis=alt.Axis(format='%'))
+        ).properties(title='Success Rate at Evaluated Values'), use_container_width=True)
+
+with tab_sweep:
+    sweep_names = list(sweep_inputs.keys())
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+    with col1:
+        x_name = st.selectbox("Horizontal Axis", options=sweep_names, index=0)
+        x_parameter = sweep_inputs[x_name]
+        x_default_low, x_default_high = default_sweep_range(simulation_parameters, x_parameter)
+        x_low = st.number_input("From ", value=float(x_default_low), key=f"sweep_x_low_{x_parameter}")
+        x_high = st.number_input("To ", value=float(x_default_high), key=f"sweep_x_high_{x_parameter}")
+    with col2:
+        y_name = st.selectbox("Vertical Axis", options=sweep_names, index=1)
+        y_parameter = sweep_inputs[y_name]
+        y_default_low, y_default_high = default_sweep_range(simulation_parameters, y_parameter)
+        y_low = st.number_input("From  ", value=float(y_default_low), key=f"sweep_y_low_{y_parameter}")
+        y_high = st.number_input("To  ", value=float(y_default_high), key=f"sweep_y_high_{y_parameter}")
+    with col3:
+        sweep_steps = st.slider("Steps per Axis", min_value=3, max_value=15, value=10)
+    with col4:
+        run_sweep = st.button("Run Grid Sweep", type='primary', icon=":material/grid_on:", disabled=(x_parameter == y_parameter))
+
+    if run_sweep:
+        st.session_state.sweep_results = grid_sweep(simulation_parameters, 
+                                                    x_parameter, np.linspace(x_low, x_high, sweep_steps), 
+                                                    y_parameter, np.linspace(y_low, y_high, sweep_steps), 
+                                                    withdrawal_strategy=plan_withdrawal_strategy, allocation_rule=plan_allocation_rule)
+        st.session_state.sweep_results['x_name'], st.session_state.sweep_results['y_name'] = x_name, y_name
+
+    sweep_results = st.session_state.sweep_results
+    if sweep_results is not None:
+        x_labels = [f"{value:,.3g}" for value in sweep_results['x_values']]
+        y_labels = [f"{value:,.3g}" for value in sweep_results['y_values']]
+        sweep_df = pd.DataFrame([
+            {'x': x_labels[i], 'y': y_labels[j], 'Success Rate': sweep_results['success'][j, i]}
+            for j in range(len(y_labels)) for i in range(len(x_labels))])
+
+        heatmap = alt.Chart(sweep_df).mark_rect().encode(
+            x=alt.X('x:O', title=sweep_results['x_name'], sort=x_labels),
+            y=alt.Y('y:O', title=sweep_results['y_name'], sort=y_labels[::-1]),
+            color=alt.Color('Success Rate:Q', scale=alt.Scale(scheme='redyellowgreen', domain=[0, 1]), legend=alt.Legend(format='%'))
+        )
+        labels = heatmap.mark_text(fontSize=10).encode(
+            text=alt.Text('Success Rate:Q', format='.0%'),
+            color=alt.value('black')
+        )
+        st.altair_chart((heatmap + labels).properties(title='Success Rate by Combination'), use_container_width=True)
+        if 'withdrawal_start_age' in (sweep_results['x_parameter'], sweep_results['y_parameter']):
+            st.caption("The entered Social Security benefit is taken as the full-retirement-age amount and adjusted for early or delayed claiming.")
+
+with tab_tornado:
+    st.write("Each input moves down and up by its step with the others unchanged; all variants share the same market scenarios. "
+             "A Social Security start age takes the entered benefit as the full-retirement-age amount, adjusted for early or delayed claiming.")
+    run_tornado = st.button("Run Sensitivity Analysis", type='primary', icon=":material/tornado:")
+
+    if run_tornado:
+        st.session_state.tornado_results = tornado_analysis(simulation_parameters, withdrawal_strategy=plan_withdrawal_strategy, 
+                                                            allocation_rule=plan_allocation_rule)
+
+    tornado_results = st.session_state.tornado_results
+    if tornado_results is not None:
+        base_success = tornado_results['base_success']
+        input_order = [row['input'] for row in tornado_results['inputs']]
+        tornado_df = pd.DataFrame(
+            [{'Input': row['input'], 'Change': "Decrease", 'Value': f"{row['low_value']:,.4g}", 'Success Rate': row['low_success'], 'Base': base_success}
+             for row in tornado_results['inputs']] +
+            [{'Input': row['input'], 'Change': "Increase", 'Value': f"{row['high_value']:,.4g}", 'Success Rate': row['high_success'], 'Base': base_success}
+             for row in tornado_results['inputs']])
+
+        tornado = alt.Chart(tornado_df).mark_bar().encode(
+            y=alt.Y('Input:N', sort=input_order, title=None),
+            x=alt.X('Success Rate:Q', axis=alt.Axis(format='%'), scale=alt.Scale(zero=False)),
+            x2='Base:Q',
+            color=alt.Color('Change:N', scale=alt.Scale(domain=["Decrease", "Increase"], range=["#DD5050", "#55AA55"])),
+            tooltip=['Input', 'Change', 'Value', alt.Tooltip('Success Rate:Q', format='.1%')]
+        )
+        base_rule = alt.Chart(pd.DataFrame({'Base': [base_success]})).mark_rule(color='black').encode(x='Base:Q')
+        st.altair_chart((tornado + base_rule).properties(title=f"Success Rate Swing Around the Plan ({base_success:.1%})"), 
+                        use_container_width=True)
+
+    # Derivatives carried through the main simulation run
+    gradient_results = simulation_results.get('gradients')
+    if gradient_results is not None:
+        st.subheader("Local Sensitivities")
+        st.caption("Change per unit of each input at the plan's values, from the main run (pathwise estimates; "
+                   "likelihood-ratio estimates where the input shifts the random draws).")
+        gradient_units = {
+            'stock_return_mean': ("Stock Return Mean", 0.01, "+1 pt"),
+            'annual_expense': ("Annual Expense", 1000, "+$1,000"),
+            'stock_percentage': ("Stock Percentage", 1, "+1 pt"),
+            'inflation_mean': ("Inflation Mean", 0.01, "+1 pt")
+        }
+        gradient_rows = []
+        for parameter, (name, unit, label) in gradient_units.items():
+            pathwise = gradient_results['pathwise'][parameter]
+            wealth_change = pathwise['terminal_wealth'] * unit
+            likelihood_ratio = gradient_results['likelihood_ratio'].get(parameter)
+            gradient_rows.append({
+                "Input": name,
+                "Change": label,
+                "Success Rate": f"{pathwise['success'] * unit * 100:+.2f}%",
+                "Success Rate (Likelihood Ratio)": f"{likelihood_ratio['success'] * unit * 100:+.2f}%" if likelihood_ratio else "",
+                "Mean Final Savings": f"{'+' if wealth_change >= 0 else '-'}${abs(wealth_change):,.0f}"
+            })
+        st.dataframe(pd.DataFrame(gradient_rows), hide_index=True, use_container_width=True)
+
+with tab_claiming:
+    st.write("Every pair of claiming ages from 62 to 70 on the same market scenarios. "
+             "The entered benefits are taken as the full-retirement-age amounts and adjusted for early or delayed claiming.")
+    run_claiming = st.button("Run Claiming Search", type='primary', icon=":material/elderly:")
+
+    if run_claiming:
+        st.session_state.claiming_results = claiming_age_search(simulation_parameters, withdrawal_strategy=plan_withdrawal_strategy, 
+                                                                allocation_rule=plan_allocation_rule)
+
+    claiming_results = st.session_state.claiming_results
+    if claiming_results is not None:
+        best_success, best_wealth = claiming_results['best_success'], claiming_results['best_wealth']
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            st.metric("Highest Success Rate", f"{best_success['success'] * 100:.1f}%", 
+                      help=f"Median final savings ${best_success['median_final_savings']:,.0f}")
+            st.write(f"Claim at **{best_success['self_age']}** (self) and **{best_success['partner_age']}** (partner)")
+        with col2:
+            st.metric("Highest Median Final Savings", f"${best_wealth['median_final_savings']:,.0f}", 
+                      help=f"Success rate {best_wealth['success'] * 100:.1f}%")
+            st.write(f"Claim at **{best_wealth['self_age']}** (self) and **{best_wealth['partner_age']}** (partner)")
+
+        claiming_df = pd.DataFrame([
+            {'Self': str(self_age), 'Partner': str(partner_age), 'Success Rate': claiming_results['success'][j, i]}
+            for j, partner_age in enumerate(claiming_results['partner_ages']) 
+            for i, self_age in enumerate(claiming_results['self_ages'])])
+        heatmap = alt.Chart(claiming_df).mark_rect().encode(
+            x=alt.X('Self:O', title='Self Claiming Age'),
+            y=alt.Y('Partner:O', title='Partner Claiming Age', sort='descending'),
+            color=alt.Color('Success Rate:Q', scale=alt.Scale(scheme='redyellowgreen', zero=False), legend=alt.Legend(format='%'))
+        )
+        labels = heatmap.mark_text(fontSize=10).encode(
+            text=alt.Text('Success Rate:Q', format='.1%'),
+            color=alt.value('black')
+        )
+        st.altair_chart((heatmap + labels).properties(title='Success Rate by Claiming Ages'), use_container_width=True)
+
+with tab_glide_path:
+    st.write("Searches glide paths that move the stock share from a start to an end value over the plan, "
+             "scoring every candidate on the same market scenarios and checking the best one on fresh scenarios.")
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        glide_path_objective = st.radio("Glide Path Objective", options=glide_path_objectives, horizontal=True)
+    with col2:
+        run_glide_path = st.button("Run Glide Path Search", type='primary', icon=":material/trending_down:")
+
+    if run_glide_path:
+        st.session_state.glide_path_results = optimize_glide_path(simulation_parameters, glide_path_objective, 
+                                                                  withdrawal_strategy=plan_withdrawal_strategy)
+
+    glide_path_results = st.session_state.glide_path_results
+    if glide_path_results is not None:
+        col1, col2, col3 = st.columns([1, 1, 1])
+        col1.metric("Starting Stock Share", f"{glide_path_results['start_stock_share'] * 100:.0f}%")
+        col2.metric("Ending Stock Share", f"{glide_path_results['end_stock_share'] * 100:.0f}%")
+        if glide_path_results['objective'] == "Success Probability":
+            col3.metric("Success Rate (Fresh Scenarios)", f"{glide_path_results['check_score'] * 100:.1f}%", 
+                        delta=f"{(glide_path_results['check_score'] - glide_path_results['check_constant_allocation_score']) * 100:+.1f}% vs. constant allocation")
+        else:
+            col3.metric("Utility (Fresh Scenarios)", f"{glide_path_results['check_score']:.3f}", 
+                        delta=f"{glide_path_results['check_score'] - glide_path_results['check_constant_allocation_score']:+.3f} vs. constant allocation")
+
+        plan_ages = np.arange(current_age, life_expectancy + 1)
+        progress = np.arange(len(plan_ages)) / max(len(plan_ages) - 1, 1)
+        glide_path_df = pd.DataFrame({
+            'Age': plan_ages,
+            'Stock Share': glide_path_results['start_stock_share'] + (glide_path_results['end_stock_share'] - glide_path_results['start_stock_share']) 
+                           * progress ** glide_path_results['shape']
+        })
+        st.altair_chart(alt.Chart(glide_path_df).mark_line().encode(
+            x=alt.X('Age:Q', scale=alt.Scale(zero=False)),
+            y=alt.Y('Stock Share:Q', axis=alt.Axis(format='%'), scale=alt.Scale(domain=[0, 1]))
+        ).properties(title='Stock Share by Age'), use_container_width=True)
+
+with tab_timing:
+    st.write("Times a decision by the portfolio balance at each candidate age (least-squares Monte Carlo): "
+             "a path decides at the first age where deciding is estimated to do at least as well as waiting. "
+             "The rule is fitted on one scenario set and checked on fresh scenarios against deciding at one age on every path.")
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        timing_decision = st.radio("Decision", options=list(timing_decisions), horizontal=True)
+    with col2:
+        timing_cost = st.number_input("Value of Deciding a Year Earlier (% success)", min_value=0.0, step=0.5,
+                                      value=2.0 if timing_decision == "Retirement Age" else 0.0,
+                                      help="Success rate you would give up to decide one year sooner, e.g. to retire a year earlier") / 100
+    with col3:
+        run_timing = st.button("Run Decision Timing", type='primary', icon=":material/schedule:")
+
+    if run_timing:
+        st.session_state.timing_results = least_squares_timing(simulation_parameters, timing_decision, cost_per_year=timing_cost, 
+                                                               withdrawal_strategy=plan_withdrawal_strategy)
+
+    timing_results = st.session_state.timing_results
+    if timing_results is not None:
+        col1, col2 = st.columns([1, 1])
+        col1.metric("Balance-Based Rule (Fresh Scenarios)", f"{timing_results['policy_value'] * 100:.1f}%",
+                    delta=f"{timing_results['improvement'] * 100:+.2f}% vs. age {timing_results['best_fixed_age']} for everyone",
+                    help=f"Success rate less the value of the years waited; success alone {timing_results['policy_success'] * 100:.1f}%")
+        col2.metric(f"Best Single Age: {timing_results['best_fixed_age']}", f"{timing_results['fixed_age_values'].max() * 100:.1f}%")
+        if timing_results['beats_fixed_age']:
+            st.caption(f"The balance-based rule beats deciding at {timing_results['best_fixed_age']} on every path by "
+                       f"{timing_results['improvement'] * 100:.2f}% ± {timing_results['improvement_standard_error'] * 100:.2f}%.")
+        else:
+            st.caption(f"The balance-based rule does not clearly beat deciding at {timing_results['best_fixed_age']} on every path "
+                       f"({timing_results['improvement'] * 100:+.2f}% ± {timing_results['improvement_standard_error'] * 100:.2f}%), "
+                       "so the single age is the simpler choice.")
+        st.dataframe(pd.DataFrame({
+            "Age": timing_results['candidate_ages'],
+            "Share Deciding": [f"{share * 100:.1f}%" for share in timing_results['age_probabilities']],
+            "Median Balance When Deciding": [f"${balance:,.0f}" if np.isfinite(balance) else "" for balance in timing_results['median_decision_balances']],
+            "Value if Everyone Decides Here": [f"{value * 100:.1f}%" for value in timing_results['fixed_age_values']]
+        }), hide_index=True, use_container_width=True)
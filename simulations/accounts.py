@@ -0,0 +1,83 @@
+import numpy as np
+
+
+# Account types tracked by the multi-account model, in column order of the balance array
+account_names = ["Taxable", "Tax-Deferred", "Roth"]
+TAXABLE, TAX_DEFERRED, ROTH = 0, 1, 2
+
+# Withdrawal orders by display name - account columns drained first to last
+withdrawal_orders = {
+    "Taxable, Tax-Deferred, Roth": [TAXABLE, TAX_DEFERRED, ROTH],
+    "Tax-Deferred, Taxable, Roth": [TAX_DEFERRED, TAXABLE, ROTH],
+    "Taxable, Roth, Tax-Deferred": [TAXABLE, ROTH, TAX_DEFERRED]
+}
+
+# IRS Uniform Lifetime Table (2022 onward) - distribution period by age
+rmd_start_age = 73
+uniform_lifetime_table = {
+    72: 27.4, 73: 26.5, 74: 25.5, 75: 24.6, 76: 23.7, 77: 22.9, 78: 22.0, 79: 21.1,
+    80: 20.2, 81: 19.4, 82: 18.5, 83: 17.7, 84: 16.8, 85: 16.0, 86: 15.2, 87: 14.4,
+    88: 13.7, 89: 12.9, 90: 12.2, 91: 11.5, 92: 10.8, 93: 10.1, 94: 9.5, 95: 8.9,
+    96: 8.4, 97: 7.8, 98: 7.3, 99: 6.8, 100: 6.4, 101: 6.0, 102: 5.6, 103: 5.2,
+    104: 4.9, 105: 4.6, 106: 4.3, 107: 4.1, 108: 3.9, 109: 3.7, 110: 3.5, 111: 3.4,
+    112: 3.3, 113: 3.1, 114: 3.0, 115: 2.9, 116: 2.8, 117: 2.7, 118: 2.5, 119: 2.3,
+    120: 2.0
+}
+
+# Divisor indexed directly by age; no distribution is required before the start age
+_rmd_divisors = np.full(max(uniform_lifetime_table) + 1, np.inf)
+for _age, _divisor in uniform_lifetime_table.items():
+    if _age >= rmd_start_age:
+        _rmd_divisors[_age] = _divisor
+
+
+def required_minimum_distribution(deferred_balances, ages):
+    # RMD of each path's tax-deferred balance at the owner's age
+    ages = np.clip(np.asarray(ages, dtype=int), 0, len(_rmd_divisors) - 1)
+    return np.maximum(deferred_balances, 0.0) / _rmd_divisors[ages]
+
+
+def drain_accounts(balances, amounts, order):
+    # Withdraw each path's amount from its accounts in the given order.
+    # A cumulative sum over the ordered balances tells how much of each account is used,
+    # so every path is handled in the same array operation.
+    ordered = np.maximum(balances[:, order], 0.0)
+    drawn_before = np.cumsum(ordered, axis=1) - ordered
+    ordered_withdrawals = np.clip(amounts[:, None] - drawn_before, 0.0, ordered)
+
+    withdrawals = np.zeros_like(balances)
+    withdrawals[:, order] = ordered_withdrawals
+    return withdrawals
+
+
+def multi_account_draw(total_expense, gross_income, balances, rmd, order, deferred_tax,
+                       tolerance=0.01, max_iterations=50):
+    # Withdrawals per account that cover expenses after tax.
+    #   deferred_tax(deferred_withdrawal) -> total tax of the year for each path
+    # Only tax-deferred withdrawals add taxable income, so the amount needed depends on
+    # how much is drawn from that account; iterate until the tax stops changing.
+    available = balances.copy()
+    available[:, TAX_DEFERRED] -= rmd
+
+    total_tax = deferred_tax(rmd)
+    withdrawals = np.zeros_like(balances)
+    for _ in range(max_iterations):
+        required = np.maximum(total_expense - gross_income + total_tax - rmd, 0.0)
+        withdrawals = drain_accounts(available, required, order)
+        next_tax = deferred_tax(rmd + withdrawals[:, TAX_DEFERRED])
+        converged = np.max(np.abs(next_tax - total_tax), initial=0.0) < tolerance
+        total_tax = next_tax
+        if converged:
+            break
+
+    withdrawals[:, TAX_DEFERRED] += rmd
+    total_tax = deferred_tax(withdrawals[:, TAX_DEFERRED])
+
+    # Anything the accounts cannot cover is borrowed against the first account in the order,
+    # and surplus income (including unspent RMDs) is saved in the taxable account
+    net_cash = gross_income + withdrawals.sum(axis=1) - total_tax - total_expense
+    deposits = np.zeros_like(balances)
+    deposits[:, order[0]] = np.minimum(net_cash, 0.0)
+    deposits[:, TAXABLE] += np.maximum(net_cash, 0.0)
+
+    return withdrawals, deposits, total_tax
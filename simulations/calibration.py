@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy.special import gammaln
+
+from simulations.simulation_batch import historical_sequence_arrays
+
+
+# Return models fitted by calibrate_return_models
+calibration_models = ["Normal Distribution", "Students-T Distribution", "Lognormal Distribution", "Regime Switching"]
+
+# Fits are cached here, one file per version of the historical data
+calibration_cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".calibration_cache")
+_data_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "historical_returns.py")
+
+
+# Calibration of the return models to the historical series
+#
+# Every model is fitted by maximum likelihood to the yearly equity, bond and inflation rates,
+# all series (and for Students-T all candidate degrees of freedom) at once as arrays:
+#   - Normal: sample mean and standard deviation
+#   - Lognormal: normal fit of log(1 + rate), reported as the mean and standard deviation of
+#     the rate, which is how the engine's lognormal model is parameterized
+#   - Students-T: location and scale by the EM (iteratively reweighted) updates for a grid of
+#     degrees of freedom, keeping the best.  The engine draws stocks and bonds with one degrees
+#     of freedom, so that value maximizes their joint likelihood.
+#   - Regime Switching: a two-state hidden Markov model of the three rates with their own
+#     means and standard deviations per state, fitted by Baum-Welch.  The engine has no regime
+#     model; the fit describes the data and its states are reported.
+# Fitting takes well under a second, and the result is kept on disk keyed by the hash of the
+# historical data file so it is only redone when the data changes.
+
+def calibrate_return_models(cache_dir=None, refresh=False):
+    cache_dir = calibration_cache_dir if cache_dir is None else cache_dir
+    with open(_data_file, 'rb') as data:
+        data_hash = hashlib.sha256(data.read()).hexdigest()
+    cache_file = os.path.join(cache_dir, f"{data_hash}.json")
+    if not refresh and os.path.exists(cache_file):
+        with open(cache_file) as cached:
+            return json.load(cached)
+
+    historical_years, equity_returns, bond_returns, inflation_rates = historical_sequence_arrays()
+    series = np.stack([equity_returns, bond_returns, inflation_rates])
+    calibration = {
+        'data_hash': data_hash,
+        'first_year': int(historical_years[0]),
+        'last_year': int(historical_years[-1]),
+        'observations': len(historical_years),
+        'normal': _named(_fit_normal(series)),
+        'lognormal': _named(_fit_lognormal(series)),
+        'students_t': _fit_students_t(series),
+        'regime': _fit_regimes(series.T)
+    }
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_file, 'w') as cached:
+        json.dump(calibration, cached, indent=2)
+    return calibration
+
+
+def calibrated_presets(calibration):
+    # Engine inputs of each calibrated model the engine can run, by simulation type.
+    # Inflation is always drawn from a normal distribution.
+    normal, lognormal, students_t = calibration['normal'], calibration['lognormal'], calibration['students_t']
+    inflation = {'inflation_mean': normal['inflation']['mean'], 'inflation_std': normal['inflation']['std']}
+    return {
+        "Normal Distribution": {
+            'stock_return_mean': normal['stock']['mean'], 'stock_return_std': normal['stock']['std'],
+            'bond_return_mean': normal['bond']['mean'], 'bond_return_std': normal['bond']['std'], **inflation
+        },
+        "Students-T Distribution": {
+            'stock_return_mean': students_t['stock']['location'], 'stock_return_std': students_t['stock']['scale'],
+            'bond_return_mean': students_t['bond']['location'], 'bond_return_std': students_t['bond']['scale'],
+            't_degrees_of_freedom': students_t['degrees_of_freedom'], **inflation
+        },
+        "Lognormal Distribution": {
+            'stock_return_mean': lognormal['stock']['mean'], 'stock_return_std': lognormal['stock']['std'],
+            'bond_return_mean': lognormal['bond']['mean'], 'bond_return_std': lognormal['bond']['std'], **inflation
+        }
+    }
+
+
+def _fit_normal(series):
+    mean = series.mean(axis=1)
+    std = series.std(axis=1)
+    return [{'mean': float(mean[index]), 'std': float(std[index]),
+             'log_likelihood': float(_normal_log_density(series[index], mean[index], std[index]).sum())}
+            for index in range(len(series))]
+
+
+def _fit_lognormal(series):
+    log_series = np.log1p(series)
+    log_mean = log_series.mean(axis=1)
+    log_std = log_series.std(axis=1)
+    mean = np.exp(log_mean + log_std ** 2 / 2) - 1
+    std = np.sqrt(np.expm1(log_std ** 2)) * (1 + mean)
+    return [{'mean': float(mean[index]), 'std': float(std[index]), 'log_mean': float(log_mean[index]), 'log_std': float(log_std[index]),
+             'log_likelihood': float((_normal_log_density(log_series[index], log_mean[index], log_std[index]) - log_series[index]).sum())}
+            for index in range(len(series))]
+
+
+def _fit_students_t(series, iterations=500):
+    # EM for location and scale with the degrees of freedom fixed, for every series and every
+    # candidate degrees of freedom at once: arrays are (series, candidates, years)
+    degrees = np.exp(np.linspace(np.log(2.5), np.log(200.0), 160))
+    values = series[:, None, :]
+    location = np.broadcast_to(np.median(series, axis=1)[:, None], (len(series), len(degrees))).copy()
+    scale = np.broadcast_to(series.std(axis=1)[:, None], (len(series), len(degrees))).copy()
+    for _ in range(iterations):
+        squared = ((values - location[..., None]) / scale[..., None]) ** 2
+        weights = (degrees[:, None] + 1) / (degrees[:, None] + squared)
+        location = (weights * values).sum(axis=2) / weights.sum(axis=2)
+        scale = np.sqrt((weights * (values - location[..., None]) ** 2).mean(axis=2))
+
+    log_likelihood = _t_log_density(values, location[..., None], scale[..., None], degrees[:, None]).sum(axis=2)
+
+    # Stocks and bonds share the engine's degrees of freedom
+    shared = int(np.argmax(log_likelihood[0] + log_likelihood[1]))
+    fits = {'degrees_of_freedom': float(degrees[shared])}
+    for index, name in enumerate(('stock', 'bond', 'inflation')):
+        best = int(np.argmax(log_likelihood[index]))
+        fits[name] = {
+            'location': float(location[index, shared]),
+            'scale': float(scale[index, shared]),
+            'log_likelihood': float(log_likelihood[index, shared]),
+            'own_degrees_of_freedom': float(degrees[best]),
+            'own_log_likelihood': float(log_likelihood[index, best])
+        }
+    return fits
+
+
+def _fit_regimes(observations, states=2, iterations=500, tolerance=1e-9):
+    # Baum-Welch for a Gaussian hidden Markov model with diagonal covariances.
+    # observations is (years, series); states start from a split at the median stock return.
+    years, series = observations.shape
+    high = observations[:, 0] >= np.median(observations[:, 0])
+    responsibilities = np.stack([high, ~high], axis=1).astype(float)
+    transition = np.full((states, states), 1.0 / states)
+    initial = np.full(states, 1.0 / states)
+    previous_log_likelihood = -np.inf
+
+    for _ in range(iterations):
+        # M step from the current state probabilities
+        totals = responsibilities.sum(axis=0)
+        means = responsibilities.T @ observations / totals[:, None]
+        stds = np.sqrt(np.maximum(responsibilities.T @ observations ** 2 / totals[:, None] - means ** 2, 1e-10))
+
+        # E step - scaled forward-backward pass
+        densities = np.exp(_normal_log_density(observations[:, None, :], means, stds).sum(axis=2))
+        forward = np.empty((years, states))
+        scaling = np.empty(years)
+        forward[0] = initial * densities[0]
+        scaling[0] = forward[0].sum()
+        forward[0] /= scaling[0]
+        for year in range(1, years):
+            forward[year] = (forward[year - 1] @ transition) * densities[year]
+            scaling[year] = forward[year].sum()
+            forward[year] /= scaling[year]
+        backward = np.ones((years, states))
+        for year in range(years - 2, -1, -1):
+            backward[year] = transition @ (densities[year + 1] * backward[year + 1]) / scaling[year + 1]
+
+        responsibilities = forward * backward
+        pair_probabilities = (forward[:-1, :, None] * transition[None] * (densities[1:] * backward[1:])[:, None, :]
+                              / scaling[1:, None, None])
+        transition = pair_probabilities.sum(axis=0) / pair_probabilities.sum(axis=(0, 2))[:, None]
+        initial = responsibilities[0]
+
+        log_likelihood = np.log(scaling).sum()
+        if log_likelihood - previous_log_likelihood < tolerance:
+            break
+        previous_log_likelihood = log_likelihood
+
+    # Long-run share of each state, with the higher stock return first
+    eigenvalues, eigenvectors = np.linalg.eig(transition.T)
+    stationary = np.real(eigenvectors[:, np.argmin(np.abs(eigenvalues - 1))])
+    stationary = stationary / stationary.sum()
+    order = np.argsort(-means[:, 0])
+    return {
+        'regimes': [{
+            'long_run_share': float(stationary[state]),
+            'mean_duration': float(1 / max(1 - transition[state, state], 1e-12)),
+            **{f'{name}_mean': float(means[state, index]) for index, name in enumerate(('stock', 'bond', 'inflation'))},
+            **{f'{name}_std': float(stds[state, index]) for index, name in enumerate(('stock', 'bond', 'inflation'))}
+        } for state in order],
+        'transition': transition[np.ix_(order, order)].tolist(),
+        'log_likelihood': float(log_likelihood)
+    }
+
+
+def _named(fits):
+    return dict(zip(('stock', 'bond', 'inflation'), fits))
+
+
+def _normal_log_density(values, mean, std):
+    return -0.5 * np.log(2 * np.pi) - np.log(std) - 0.5 * ((values - mean) / std) ** 2
+
+
+def _t_log_density(values, location, scale, degrees):
+    squared = ((values - location) / scale) ** 2
+    return (gammaln((degrees + 1) / 2) - gammaln(degrees / 2) - 0.5 * np.log(degrees * np.pi) - np.log(scale)
+            - (degrees + 1) / 2 * np.log1p(squared / degrees))
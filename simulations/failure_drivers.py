@@ -0,0 +1,90 @@
+import numpy as np
+
+
+# Failure drivers (sequence-of-returns attribution)
+#
+# Which years' market outcomes decide whether a plan fails, read across all paths of a run
+# from the stored (paths, years) return and inflation matrices:
+#   - Binning: for each window of `window` years, paths are split into `bins` equal groups by
+#     their realized portfolio growth (and separately by inflation) over the window, and the
+#     failure rate of each group is taken.  A wide gap between the worst and best groups
+#     means the outcome hinges on that window.
+#   - Regression: a linear probability model of failure on every year's standardized
+#     portfolio return and inflation together (plus the paths' shock-event costs when the run
+#     had them), with a small ridge term so short runs stay solvable.  A year's sensitivity is
+#     the change in failure probability for a one-standard-deviation worse year, all other
+#     years held fixed; its risk contribution is its share of the variance of failure:
+#       contribution = coefficient * cov(value, failed) / var(failed)
+#     which add up to the model's R squared.
+# Years after a path's sampled horizon carry no information and are set to the average.
+
+def failure_drivers(result, window=5, bins=5, ridge=1e-3):
+    failed = ~np.asarray(result['success'])
+    portfolio_returns = np.asarray(result['portfolio_returns'])
+    paths, years_in_simulation = portfolio_returns.shape
+    inflation_rates = np.broadcast_to(result['inflation_rates'], (paths, years_in_simulation))
+    in_plan = np.arange(years_in_simulation) < np.asarray(result['horizons'])[:, None]
+    window = int(min(window, years_in_simulation))
+    ages = np.broadcast_to(result['schedules']['self_age'], (paths, years_in_simulation))[0]
+
+    # Windowed growth and average inflation from cumulative sums along the year axis
+    log_growth = np.log1p(np.maximum(portfolio_returns, -0.99)) * in_plan
+    window_growth = _window_sums(log_growth, window)
+    window_inflation = _window_sums(inflation_rates * in_plan, window) / window
+
+    # Failure rate by window and group, worst growth (and highest inflation) in group 0
+    return_bins = _failure_rates_by_bin(window_growth, failed, bins)
+    inflation_bins = _failure_rates_by_bin(-window_inflation, failed, bins)
+
+    # Regression on every year at once
+    drivers = [_standardized(-portfolio_returns, in_plan), _standardized(inflation_rates, in_plan)]
+    shock_costs = result.get('shock_costs')
+    if shock_costs is not None:
+        drivers.append(_standardized(np.asarray(shock_costs)[:, None], np.ones((paths, 1), dtype=bool)))
+    design = np.concatenate(drivers, axis=1)
+    centered_failed = failed - failed.mean()
+    covariance = design.T @ centered_failed / paths
+    coefficients = np.linalg.solve(design.T @ design / paths + ridge * np.eye(design.shape[1]), covariance)
+    failure_variance = max(centered_failed.var(), 1e-12)
+    contributions = coefficients * covariance / failure_variance
+
+    return {
+        'ages': ages,
+        'window': window,
+        'window_start_ages': ages[:years_in_simulation - window + 1],
+        'return_bin_failure_rates': return_bins,
+        'inflation_bin_failure_rates': inflation_bins,
+        'return_sensitivity': coefficients[:years_in_simulation],
+        'inflation_sensitivity': coefficients[years_in_simulation:2 * years_in_simulation],
+        'return_contribution': contributions[:years_in_simulation],
+        'inflation_contribution': contributions[years_in_simulation:2 * years_in_simulation],
+        'shock_sensitivity': float(coefficients[-1]) if shock_costs is not None else None,
+        'shock_contribution': float(contributions[-1]) if shock_costs is not None else None,
+        'r_squared': float(contributions.sum()),
+        'failure_rate': float(failed.mean())
+    }
+
+
+def _window_sums(values, window):
+    # Sum over each run of window years: (paths, years - window + 1)
+    cumulative = np.concatenate([np.zeros((len(values), 1)), np.cumsum(values, axis=1)], axis=1)
+    return cumulative[:, window:] - cumulative[:, :-window]
+
+
+def _failure_rates_by_bin(values, failed, bins):
+    # Failure rate of each equal-count group of paths, per column: (columns, bins)
+    paths, columns = values.shape
+    ranks = np.argsort(np.argsort(values, axis=0, kind='stable'), axis=0, kind='stable')
+    groups = ranks * bins // paths + bins * np.arange(columns)
+    counts = np.bincount(groups.ravel(), minlength=columns * bins)
+    failures = np.bincount(groups.ravel(), weights=np.repeat(failed[:, None], columns, axis=1).ravel(), minlength=columns * bins)
+    return (failures / np.maximum(counts, 1)).reshape(columns, bins)
+
+
+def _standardized(values, in_plan):
+    # Columns scaled to mean 0 and standard deviation 1 over the paths in the plan that year;
+    # constant columns and years out of the plan become 0
+    counts = np.maximum(in_plan.sum(axis=0), 1)
+    centered = (values - (values * in_plan).sum(axis=0) / counts) * in_plan
+    std = np.sqrt((centered ** 2).sum(axis=0) / counts)
+    return centered / np.where(std > 0, std, np.inf)
@@ -0,0 +1,108 @@
+import numpy as np
+
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch, tile_scenarios
+
+
+# Objectives of the glide-path optimizer
+glide_path_objectives = ["Success Probability", "Terminal Wealth Utility"]
+
+
+def glide_path_rule(start, end, shape):
+    # Allocation rule moving the stock share from start to end over the plan:
+    #   share = start + (end - start) * (year / last year) ** shape
+    # shape 1 is a straight line, below 1 moves early and above 1 moves late.
+    # Each value can be a scalar or one value per path.
+    def rule(year, balances, context):
+        progress = year / max(context['years_in_simulation'] - 1, 1)
+        return start + (end - start) * progress ** shape
+    return rule
+
+
+# Glide-path search (evolution strategy on common random numbers)
+#
+# A glide path is (start share, end share, shape).  Candidates live in an unbounded space -
+# logits of the two shares and the log of the shape - and each generation samples a
+# population around the current mean with a per-coordinate step size.  The whole population
+# runs as one batch: the scenario set is tiled once per candidate and the glide-path values
+# are set per row, so every candidate sees the same market paths and the ranking reflects
+# the glide paths alone.  The best half, weighted by rank, moves the mean; the step sizes
+# follow the spread of the selected candidates (a diagonal CMA-style update).
+#
+# Terminal Wealth Utility scores each path by the CRRA utility of one plus its final balance
+# in years of planned expense, with failure_penalty subtracted when the plan ends below zero.
+
+def optimize_glide_path(params, objective="Success Probability", withdrawal_strategy=None, simulations=None, seed=None,
+                        population=12, generations=15, risk_aversion=3.0, failure_penalty=10.0):
+    if objective not in glide_path_objectives:
+        raise ValueError(f"Invalid objective. Choose one of {glide_path_objectives}.")
+    rng = np.random.default_rng(seed)
+    scenarios = draw_plan_scenarios(params, simulations, seed=rng)
+    paths = scenarios['stock_shocks'].shape[0]
+    tiled = tile_scenarios(scenarios, population)
+
+    def scores(candidates, scenario_set=scenarios):
+        # Objective of each candidate, all candidates in one batch
+        start, end, shape = _glide_path_values(candidates)
+        rule = glide_path_rule(np.repeat(start, paths), np.repeat(end, paths), np.repeat(shape, paths))
+        batch_scenarios = tiled if scenario_set is scenarios and len(candidates) == population else tile_scenarios(scenario_set, len(candidates))
+        result = simulate_batch(params, batch_scenarios, withdrawal_strategy, rule)
+        final_savings = result['final_savings'].reshape(len(candidates), paths)
+        if objective == "Success Probability":
+            return (final_savings >= 0).mean(axis=1)
+        wealth = 1 + np.maximum(final_savings, 0) / max(params['annual_expense'], 1.0)
+        if risk_aversion == 1:
+            utility = np.log(wealth)
+        else:
+            utility = (wealth ** (1 - risk_aversion) - 1) / (1 - risk_aversion)
+        return (utility - failure_penalty * (final_savings < 0)).mean(axis=1)
+
+    # Start from a constant allocation at the plan's stock percentage
+    share = np.clip(params['stock_percentage'] / 100, 0.02, 0.98)
+    mean = np.array([np.log(share / (1 - share))] * 2 + [0.0])
+    step = np.array([1.0, 1.0, 0.5])
+    selected = population // 2
+    weights = np.log(selected + 0.5) - np.log(np.arange(1, selected + 1))
+    weights = weights / weights.sum()
+
+    constant_candidate = mean
+    best_candidate, best_score = mean, scores(mean[None, :])[0]
+    plan_score = best_score
+    history = [best_score]
+    for _ in range(generations):
+        candidates = mean + step * rng.standard_normal((population, 3))
+        candidates[0] = mean
+        candidate_scores = scores(candidates)
+        order = np.argsort(-candidate_scores, kind='stable')[:selected]
+        if candidate_scores[order[0]] > best_score:
+            best_candidate, best_score = candidates[order[0]], candidate_scores[order[0]]
+        history.append(float(best_score))
+
+        new_mean = weights @ candidates[order]
+        spread = np.sqrt(weights @ ((candidates[order] - mean) / step) ** 2)
+        step = np.clip(step * np.exp(0.5 * (spread - 1)), 0.02, 2.0)
+        mean = new_mean
+
+    # The search favours candidates that did well on its own draws, so both paths are checked
+    # again on an independent scenario set
+    check_scores = scores(np.array([best_candidate, constant_candidate]), draw_plan_scenarios(params, simulations, seed=rng))
+
+    start, end, shape = _glide_path_values(best_candidate[None, :])
+    return {
+        'objective': objective,
+        'start_stock_share': float(start[0]),
+        'end_stock_share': float(end[0]),
+        'shape': float(shape[0]),
+        'score': float(best_score),
+        'constant_allocation_score': float(plan_score),
+        'check_score': float(check_scores[0]),
+        'check_constant_allocation_score': float(check_scores[1]),
+        'history': np.asarray(history),
+        'allocation_rule': glide_path_rule(float(start[0]), float(end[0]), float(shape[0]))
+    }
+
+
+def _glide_path_values(candidates):
+    # Start share, end share and shape from the unbounded search coordinates
+    candidates = np.asarray(candidates, dtype=float)
+    return (1 / (1 + np.exp(-candidates[:, 0])), 1 / (1 + np.exp(-candidates[:, 1])),
+            np.exp(np.clip(candidates[:, 2], -3, 3)))
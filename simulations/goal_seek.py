@@ -0,0 +1,124 @@
+import numpy as np
+
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch, tile_scenarios
+from simulations.sweeps import with_parameter_values
+
+
+# Goals by display name
+#   parameter - the input that is solved for
+#   seek      - 'max' finds the largest value meeting the target, 'min' the smallest
+#   integer   - whole-number inputs are searched in steps of one
+#   peaked    - success rises to a peak and falls again (the stock percentage usually peaks
+#               at a middle mix), so the search keeps to one side of the grid's best value:
+#               below it for 'min', above it for 'max'
+goal_seek_goals = {
+    "Maximum Annual Expense": {'parameter': 'annual_expense', 'seek': 'max', 'integer': False},
+    "Earliest Retirement Age": {'parameter': 'retirement_age', 'seek': 'min', 'integer': True},
+    "Minimum Initial Savings": {'parameter': 'initial_savings', 'seek': 'min', 'integer': False},
+    "Minimum Stock Percentage": {'parameter': 'stock_percentage', 'seek': 'min', 'integer': False, 'peaked': True},
+    "Maximum Stock Percentage": {'parameter': 'stock_percentage', 'seek': 'max', 'integer': False, 'peaked': True}
+}
+
+
+# Goal seek on the success probability
+#
+# The scenario set is drawn once and reused for every evaluation (common random numbers),
+# so the success rate changes only because of the input and each step is a re-evaluation.
+# A coarse grid of values runs first as one batch - one copy of the scenarios per value with
+# the input set per row - to bracket the boundary; regula falsi then narrows the bracket.
+# For a peaked input the bracket is taken on the chosen side of the grid's best value, where
+# the success rate moves one way.
+
+def goal_seek(params, goal, target_success, lower=None, upper=None, withdrawal_strategy=None, allocation_rule=None,
+              seed=None, grid_size=9, tolerance=None, max_iterations=30):
+    settings = goal_seek_goals[goal]
+    parameter = settings['parameter']
+    default_lower, default_upper = _default_bounds(params, parameter)
+    lower = default_lower if lower is None else lower
+    upper = default_upper if upper is None else upper
+    if tolerance is None:
+        tolerance = 1.0 if settings['integer'] else (upper - lower) * 1e-4
+
+    scenarios = draw_plan_scenarios(params, seed=seed)
+    history = []
+
+    def success_rates(values):
+        # Success rate of each value, evaluated together in one batch
+        values = np.asarray(values, dtype=float)
+        paths = scenarios['stock_shocks'].shape[0]
+        result = simulate_batch(with_parameter_values(params, {parameter: np.repeat(values, paths)}),
+                                tile_scenarios(scenarios, len(values)), withdrawal_strategy, allocation_rule)
+        rates = result['success'].reshape(len(values), paths).mean(axis=1)
+        history.extend(zip(values.tolist(), rates.tolist()))
+        return rates
+
+    grid = np.linspace(lower, upper, grid_size)
+    if settings['integer']:
+        grid = np.unique(np.round(grid))
+    rates = success_rates(grid)
+    if settings.get('peaked'):
+        peak = int(np.argmax(rates))
+        grid, rates = (grid[:peak + 1], rates[:peak + 1]) if settings['seek'] == 'min' else (grid[peak:], rates[peak:])
+    meets = rates >= target_success
+
+    if not meets.any():
+        best = int(np.argmax([rate for value, rate in history]))
+        return _goal_result(goal, parameter, target_success, None, history, achievable=False, best=history[best])
+
+    # Bracket with the feasible value first: [feasible, infeasible]
+    if settings['seek'] == 'min':
+        index = int(np.argmax(meets))
+        if index == 0:
+            return _goal_result(goal, parameter, target_success, grid[0], history)
+        feasible, infeasible = grid[index], grid[index - 1]
+    else:
+        index = len(meets) - 1 - int(np.argmax(meets[::-1]))
+        if index == len(grid) - 1:
+            return _goal_result(goal, parameter, target_success, grid[-1], history)
+        feasible, infeasible = grid[index], grid[index + 1]
+
+    feasible_gap = rates[list(grid).index(feasible)] - target_success
+    infeasible_gap = rates[list(grid).index(infeasible)] - target_success
+    for _ in range(max_iterations):
+        if abs(feasible - infeasible) <= tolerance:
+            break
+        # Regula falsi (Illinois) step, falling back to the midpoint for whole numbers
+        if settings['integer']:
+            candidate = np.floor((feasible + infeasible) / 2) if feasible > infeasible else np.ceil((feasible + infeasible) / 2)
+        else:
+            candidate = (feasible * infeasible_gap - infeasible * feasible_gap) / (infeasible_gap - feasible_gap)
+            candidate = np.clip(candidate, min(feasible, infeasible) + tolerance / 4, max(feasible, infeasible) - tolerance / 4)
+        gap = success_rates([candidate])[0] - target_success
+        if gap >= 0:
+            feasible, feasible_gap = candidate, gap
+            infeasible_gap /= 2
+        else:
+            infeasible, infeasible_gap = candidate, gap
+            feasible_gap /= 2
+
+    return _goal_result(goal, parameter, target_success, feasible, history)
+
+
+def _default_bounds(params, parameter):
+    if parameter == 'annual_expense':
+        return 0.0, 3.0 * max(params['annual_expense'], 1.0)
+    if parameter == 'retirement_age':
+        return params['current_age'], params['life_expectancy']
+    if parameter == 'stock_percentage':
+        return 0.0, 100.0
+    return 0.0, 5.0 * max(params['initial_savings'], 1_000_000)
+
+
+def _goal_result(goal, parameter, target_success, value, history, achievable=True, best=None):
+    # Success of the solution from the evaluations already made
+    success = dict(history).get(value) if value is not None else None
+    return {
+        'goal': goal,
+        'parameter': parameter,
+        'target_success': target_success,
+        'value': None if value is None else float(value),
+        'success_probability': success if best is None else best[1],
+        'achievable': achievable,
+        'closest_value': None if best is None else best[0],
+        'evaluations': sorted(history)
+    }
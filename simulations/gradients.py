@@ -0,0 +1,118 @@
+import numpy as np
+
+from simulations.parameter_uncertainty import path_return_parameters
+
+
+# Inputs the batched engine can differentiate with gradients=True
+gradient_parameters = ['stock_return_mean', 'annual_expense', 'stock_percentage', 'inflation_mean']
+
+# Inputs that only change the distribution of the draws get likelihood-ratio estimates too
+likelihood_ratio_parameters = ['stock_return_mean', 'inflation_mean']
+
+
+# Gradient estimators
+#
+# Pathwise (IPA): the engine carries d(balance)/d(input) of every path through the yearly
+# recursion in the same pass as the balances, so the derivative of expected terminal wealth
+# is the average of the paths' derivatives.  Success is an indicator with no pathwise
+# derivative, so it is smoothed with a logistic kernel of width bandwidth around zero.
+#
+# Likelihood ratio (score function): for an input that moves the mean of the random draws,
+#   d E[f] / d input = E[f * d log density / d input]
+# which works on the unsmoothed success indicator.  The mean is subtracted from f as a
+# control variate.  Inflation also indexes healthcare costs directly; that deterministic part
+# is added pathwise.
+
+def return_scores(scenarios, params):
+    # d log density of each path's draws / d mean, for the inputs that shift the draws' mean
+    # (the engine imports this module, so its helpers are imported here rather than at the top)
+    from simulations.simulation_batch import _column, _selected_rows
+    simulation_type = scenarios['simulation_type']
+    if simulation_type == "Historical Sequence":
+        # Nothing is random
+        return {}
+    # With parameter uncertainty the draws are spread around each path's own mean and std
+    stock_mean, stock_std = path_return_parameters(scenarios, 'stock', params['stock_return_mean'], params['stock_return_std'])
+    degrees = scenarios.get('t_degrees_of_freedom', 5)
+    scores = {}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if simulation_type == "Ensemble":
+            # Each row scored under its own model; sampled history has no stock score
+            models = scenarios['ensemble_models']
+            if "Empirical Distribution" not in models:
+                stock_scores = np.empty(len(scenarios['stock_shocks']))
+                for index, model in enumerate(models):
+                    selected = scenarios['model_index'] == index
+                    stock_scores[selected] = _stock_scores(model, scenarios['stock_shocks'][selected], _selected_rows(stock_mean, selected),
+                                                           _selected_rows(stock_std, selected), degrees)
+                scores['stock_return_mean'] = stock_scores
+        elif simulation_type != "Empirical Distribution":
+            scores['stock_return_mean'] = _stock_scores(simulation_type, scenarios['stock_shocks'], stock_mean, stock_std, degrees)
+
+        # Inflation of the first year is never applied, so its draw is left out
+        scores['inflation_mean'] = (scenarios['inflation_shocks'][:, 1:] / _column(params['inflation_std'])).sum(axis=1)
+
+    return {parameter: score for parameter, score in scores.items() if np.all(np.isfinite(score))}
+
+
+def _stock_scores(simulation_type, stock_shocks, stock_mean, stock_std, degrees):
+    # Score of each path's stock draws for one parametric return model
+    if simulation_type == "Normal Distribution":
+        year_scores = stock_shocks / stock_std
+    elif simulation_type == "Students-T Distribution":
+        year_scores = (degrees + 1) * stock_shocks / (degrees * stock_std * (1 + stock_shocks ** 2 / degrees))
+    else:
+        # log(1 + return) is normal with moment-matched mu and sigma
+        sigma_squared = np.log(1 + (stock_std / (1 + stock_mean)) ** 2)
+        sigma = np.sqrt(sigma_squared)
+        sigma_squared_derivative = -2 * stock_std ** 2 / (1 + stock_mean) ** 3 / (1 + (stock_std / (1 + stock_mean)) ** 2)
+        sigma_derivative = sigma_squared_derivative / (2 * sigma)
+        mu_derivative = 1 / (1 + stock_mean) - sigma_squared_derivative / 2
+        year_scores = stock_shocks / sigma * mu_derivative + (stock_shocks ** 2 - 1) / sigma * sigma_derivative
+    return year_scores.sum(axis=1)
+
+
+def gradient_summary(final_savings, savings_derivatives, scores, bandwidth=None):
+    # Pathwise and likelihood-ratio estimates with their standard errors
+    paths = len(final_savings)
+    success = (final_savings >= 0).astype(float)
+    if bandwidth is None:
+        # Silverman's rule with the robust scale, as the balances have a long right tail
+        quartiles = np.percentile(final_savings, [25, 75])
+        bandwidth = 0.9 * max(min(np.std(final_savings), (quartiles[1] - quartiles[0]) / 1.34), 1.0) * paths ** -0.2
+    smoothed = 0.5 * (1 + np.tanh(final_savings / (2 * bandwidth)))
+    kernel = smoothed * (1 - smoothed) / bandwidth
+
+    pathwise = {}
+    for parameter in gradient_parameters:
+        derivative = savings_derivatives[parameter]
+        pathwise[parameter] = _estimates(derivative, kernel * derivative)
+
+    likelihood_ratio = {}
+    for parameter in likelihood_ratio_parameters:
+        if parameter not in scores:
+            continue
+        wealth_samples = (final_savings - final_savings.mean()) * scores[parameter]
+        success_samples = (success - success.mean()) * scores[parameter]
+        if parameter == 'inflation_mean':
+            wealth_samples = wealth_samples + savings_derivatives['inflation_schedule']
+            success_samples = success_samples + kernel * savings_derivatives['inflation_schedule']
+        likelihood_ratio[parameter] = _estimates(wealth_samples, success_samples)
+
+    return {
+        'smoothed_success': float(smoothed.mean()),
+        'bandwidth': float(bandwidth),
+        'pathwise': pathwise,
+        'likelihood_ratio': likelihood_ratio
+    }
+
+
+def _estimates(wealth_samples, success_samples):
+    paths = len(wealth_samples)
+    return {
+        'terminal_wealth': float(wealth_samples.mean()),
+        'terminal_wealth_se': float(wealth_samples.std() / np.sqrt(paths)),
+        'success': float(success_samples.mean()),
+        'success_se': float(success_samples.std() / np.sqrt(paths))
+    }
@@ -100,6 +100,12 @@ historical_equity_returns = {
     2023: 26.29
 }
 
+# Equity years left out of the sampled returns above, needed for contiguous historical sequences
+historical_equity_gap_returns = {
+    1933: 53.99,
+    1954: 52.62
+}
+
 # Historical returns of US Bonds
 historical_bond_returns = {
     1927: 3.5,
@@ -199,4 +205,114 @@ historical_bond_returns = {
     2021: 6.3,
     2022: 6.2,
     2023: 6.6
-}
\ No newline at end of file
+}
+
+# US consumer price inflation (CPI-U, December to December)
+historical_inflation_rates = {
+    1927: -2.1,
+    1928: -1.0,
+    1929: 0.2,
+    1930: -6.0,
+    1931: -9.5,
+    1932: -10.3,
+    1933: 0.5,
+    1934: 2.0,
+    1935: 3.0,
+    1936: 1.2,
+    1937: 3.1,
+    1938: -2.8,
+    1939: -0.5,
+    1940: 1.0,
+    1941: 9.7,
+    1942: 9.3,
+    1943: 3.2,
+    1944: 2.1,
+    1945: 2.3,
+    1946: 18.1,
+    1947: 8.8,
+    1948: 3.0,
+    1949: -2.1,
+    1950: 5.9,
+    1951: 6.0,
+    1952: 0.8,
+    1953: 0.7,
+    1954: -0.7,
+    1955: 0.4,
+    1956: 3.0,
+    1957: 2.9,
+    1958: 1.8,
+    1959: 1.7,
+    1960: 1.4,
+    1961: 0.7,
+    1962: 1.3,
+    1963: 1.6,
+    1964: 1.0,
+    1965: 1.9,
+    1966: 3.5,
+    1967: 3.0,
+    1968: 4.7,
+    1969: 6.2,
+    1970: 5.6,
+    1971: 3.3,
+    1972: 3.4,
+    1973: 8.7,
+    1974: 12.3,
+    1975: 6.9,
+    1976: 4.9,
+    1977: 6.7,
+    1978: 9.0,
+    1979: 13.3,
+    1980: 12.5,
+    1981: 8.9,
+    1982: 3.8,
+    1983: 3.8,
+    1984: 3.9,
+    1985: 3.8,
+    1986: 1.1,
+    1987: 4.4,
+    1988: 4.4,
+    1989: 4.6,
+    1990: 6.1,
+    1991: 3.1,
+    1992: 2.9,
+    1993: 2.7,
+    1994: 2.7,
+    1995: 2.5,
+    1996: 3.3,
+    1997: 1.7,
+    1998: 1.6,
+    1999: 2.7,
+    2000: 3.4,
+    2001: 1.6,
+    2002: 2.4,
+    2003: 1.9,
+    2004: 3.3,
+    2005: 3.4,
+    2006: 2.5,
+    2007: 4.1,
+    2008: 0.1,
+    2009: 2.7,
+    2010: 1.5,
+    2011: 3.0,
+    2012: 1.7,
+    2013: 1.5,
+    2014: 0.8,
+    2015: 0.7,
+    2016: 2.1,
+    2017: 2.1,
+    2018: 1.9,
+    2019: 2.3,
+    2020: 1.4,
+    2021: 7.0,
+    2022: 6.5,
+    2023: 3.4
+}
+
+# Named stress sequences - historical years replayed from the start of retirement
+stress_sequences = {
+    "Great Depression (1929-1932)": (1929, 1932),
+    "Oil Shock Bear Market (1973-1974)": (1973, 1974),
+    "1970s Stagflation (1973-1981)": (1973, 1981),
+    "Dot-Com Bust (2000-2002)": (2000, 2002),
+    "Global Financial Crisis (2008)": (2008, 2008)
+}
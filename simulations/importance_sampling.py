@@ -0,0 +1,161 @@
+import numpy as np
+from scipy.stats import norm, t
+
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch, historical_return_arrays
+
+
+# Rare-event failure probability by importance sampling
+#
+# Well-funded plans fail on a handful of paths, so plain Monte Carlo needs very many paths to
+# pin the failure rate down.  Here the draws are tilted toward bad sequences and every path
+# is reweighted by its likelihood ratio (density of the plan's model over the tilted one):
+#   failure probability = mean(weight * failed)
+# which stays unbiased while most of the paths land near the failure boundary.
+#
+# The tilt is tuned by cross-entropy on pilot runs: each round keeps the worst elite_fraction
+# of paths (down to the failing ones once enough paths fail) and moves the tilt to their
+# weighted draws, smoothed with the previous tilt.
+#   - Normal, Lognormal and Students-T: a shift of the normal scores of each year's stock,
+#     bond and inflation shocks (Students-T shocks are mapped to normal scores and back
+#     through their distribution function)
+#   - Empirical: exponential tilting of which historical year is sampled in each plan year,
+#     probability proportional to exp(tilt * equity return), plus the inflation shift
+# A defensive share of the paths is drawn from the untilted model, which keeps every weight
+# below 1 / defensive_fraction.  A shift cannot aim at failures that come from one extreme year
+# at any point of the plan (heavy Students-T tails), so when a pilot run shows the tilt does
+# no better than plain sampling the estimate is made without it.  Sampled lifespans and the
+# monthly paths are not tilted.
+
+def rare_event_failure(params, simulations=None, withdrawal_strategy=None, allocation_rule=None, seed=None,
+                       pilot_paths=2000, elite_fraction=0.1, max_iterations=10, smoothing=0.7, defensive_fraction=0.1):
+    if params['simulation_type'] == "Historical Sequence":
+        raise ValueError("Importance sampling needs a random return model, not historical sequences.")
+    if params['simulation_type'] == "Ensemble":
+        raise ValueError("Importance sampling tilts one return model at a time.")
+    rng = np.random.default_rng(seed)
+    simulations = params['simulations'] if simulations is None else simulations
+
+    tilt = _initial_tilt(params)
+    for iteration in range(max_iterations):
+        scenarios, log_weights, draws = _tilted_scenarios(params, pilot_paths, tilt, defensive_fraction, rng)
+        final_savings = simulate_batch(params, scenarios, withdrawal_strategy, allocation_rule)['final_savings']
+        level = max(np.quantile(final_savings, elite_fraction), 0.0)
+        elite_weights = np.exp(log_weights) * (final_savings <= level)
+        tilt = _cross_entropy_update(tilt, draws, elite_weights, smoothing)
+        if level <= 0:
+            break
+
+    # Keep the tilt only if a pilot run with it beats plain sampling
+    scenarios, log_weights, _ = _tilted_scenarios(params, pilot_paths, tilt, defensive_fraction, rng)
+    pilot_samples = np.exp(log_weights) * (simulate_batch(params, scenarios, withdrawal_strategy, allocation_rule)['final_savings'] < 0)
+    tilted = pilot_samples.var() < pilot_samples.mean() * (1 - pilot_samples.mean())
+    if not tilted:
+        tilt = _initial_tilt(params)
+
+    # Estimate on fresh draws
+    scenarios, log_weights, _ = _tilted_scenarios(params, simulations, tilt, defensive_fraction, rng)
+    failed = simulate_batch(params, scenarios, withdrawal_strategy, allocation_rule)['final_savings'] < 0
+    weights = np.exp(log_weights)
+    samples = weights * failed
+    failure_probability = samples.mean()
+    standard_error = samples.std() / np.sqrt(simulations)
+
+    # Paths plain Monte Carlo would need for the same standard error, per path used here
+    variance = samples.var()
+    variance_reduction = failure_probability * (1 - failure_probability) / variance if variance > 0 else np.inf
+
+    return {
+        'failure_probability': float(failure_probability),
+        'standard_error': float(standard_error),
+        'success_probability': float(1 - failure_probability),
+        'failing_paths': int(failed.sum()),
+        'effective_sample_size': float(samples.sum() ** 2 / max((samples ** 2).sum(), 1e-300)),
+        'variance_reduction': float(variance_reduction),
+        'iterations': iteration + 1,
+        'tilted': bool(tilted),
+        'tilt': tilt
+    }
+
+
+def _initial_tilt(params):
+    # No tilt: zero shifts, and for sampled history every year equally likely
+    return {'stock': np.zeros(0), 'bond': np.zeros(0), 'inflation': np.zeros(0), 'history': np.zeros(0)}
+
+
+def _tilted_scenarios(params, paths, tilt, defensive_fraction, rng):
+    # Scenario set drawn from the mixture of the untilted and tilted models, with each path's
+    # log likelihood ratio (plan model over mixture) and the draws the tilt is fitted to
+    scenarios = draw_plan_scenarios(params, paths, seed=rng)
+    simulation_type = scenarios['simulation_type']
+    rows, years = scenarios['stock_shocks'].shape
+    tilted = rng.random(rows) >= defensive_fraction
+    log_ratio = np.zeros(rows)
+    draws = {}
+
+    shocks = ['inflation'] if simulation_type == "Empirical Distribution" else ['stock', 'bond', 'inflation']
+    for name in shocks:
+        shift = _fit_years(tilt[name], years)
+        t_shocks = name != 'inflation' and simulation_type == "Students-T Distribution"
+        if t_shocks:
+            degrees = scenarios['t_degrees_of_freedom']
+            scores = norm.isf(t.sf(scenarios[f'{name}_shocks'], degrees))
+        else:
+            scores = scenarios[f'{name}_shocks']
+        scores = scores + shift * tilted[:, None]
+        log_ratio += (shift ** 2 / 2 - shift * scores).sum(axis=1)
+        scenarios[f'{name}_shocks'] = t.isf(norm.sf(scores), degrees) if t_shocks else scores
+        draws[name] = scores
+
+    if simulation_type == "Empirical Distribution":
+        historical_years, equity_returns, bond_returns = historical_return_arrays()
+        history_tilt = _fit_years(tilt['history'], years)
+        probabilities = _history_probabilities(history_tilt, equity_returns)
+        cumulative = np.cumsum(probabilities, axis=1)
+        uniform = rng.random((rows, years))
+        selected_years = np.stack([np.searchsorted(cumulative[year], uniform[:, year] * cumulative[year, -1]) for year in range(years)], axis=1)
+        selected_years = np.where(tilted[:, None], np.minimum(selected_years, len(historical_years) - 1),
+                                  rng.integers(0, len(historical_years), size=(rows, years)))
+        scenarios['stock_shocks'] = equity_returns[selected_years]
+        scenarios['bond_shocks'] = bond_returns[selected_years]
+        log_ratio -= np.log(len(historical_years) * probabilities[np.arange(years), selected_years]).sum(axis=1)
+        draws['history'] = equity_returns[selected_years]
+
+    # Plan density over the mixture density
+    log_weights = -np.logaddexp(np.log(defensive_fraction), np.log1p(-defensive_fraction) - log_ratio)
+    return scenarios, log_weights, draws
+
+
+def _cross_entropy_update(tilt, draws, weights, smoothing):
+    # Move the tilt toward the weighted draws of the elite paths
+    total = weights.sum()
+    if total <= 0:
+        return tilt
+    updated = dict(tilt)
+    for name in ('stock', 'bond', 'inflation'):
+        if name in draws:
+            target = weights @ draws[name] / total
+            updated[name] = smoothing * target + (1 - smoothing) * _fit_years(tilt[name], len(target))
+    if 'history' in draws:
+        # Tilt whose mean equity return matches the elite paths' in each year (bisection)
+        target = weights @ draws['history'] / total
+        equity_returns = historical_return_arrays()[1]
+        low, high = np.full(len(target), -50.0), np.full(len(target), 50.0)
+        for _ in range(60):
+            middle = (low + high) / 2
+            above = _history_probabilities(middle, equity_returns) @ equity_returns > target
+            low, high = np.where(above, low, middle), np.where(above, middle, high)
+        updated['history'] = smoothing * (low + high) / 2 + (1 - smoothing) * _fit_years(tilt['history'], len(target))
+    return updated
+
+
+def _history_probabilities(history_tilt, equity_returns):
+    # Sampling probability of each historical year for each plan year, (years, historical years)
+    exponent = history_tilt[:, None] * equity_returns
+    probabilities = np.exp(exponent - exponent.max(axis=1, keepdims=True))
+    return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+def _fit_years(shift, years):
+    # Shift vector cut or padded with zeros to the number of simulated years
+    shift = np.asarray(shift, dtype=float)[:years]
+    return np.pad(shift, (0, years - len(shift)))
@@ -0,0 +1,44 @@
+# Period life table - probability of dying within one year (q_x) by age.
+# Approximate US values interpolated from recent Social Security period life tables;
+# a different table can be loaded from a CSV with simulations.mortality.load_life_table.
+# Every table ends at age 119 with q = 1.
+
+male_mortality_rates = {
+    20: 0.00140, 21: 0.00146, 22: 0.00151, 23: 0.00157, 24: 0.00164, 25: 0.00170,
+    26: 0.00177, 27: 0.00185, 28: 0.00193, 29: 0.00201, 30: 0.00210, 31: 0.00217,
+    32: 0.00225, 33: 0.00233, 34: 0.00241, 35: 0.00250, 36: 0.00258, 37: 0.00265,
+    38: 0.00273, 39: 0.00282, 40: 0.00290, 41: 0.00309, 42: 0.00330, 43: 0.00352,
+    44: 0.00375, 45: 0.00400, 46: 0.00429, 47: 0.00461, 48: 0.00495, 49: 0.00531,
+    50: 0.00570, 51: 0.00619, 52: 0.00672, 53: 0.00730, 54: 0.00792, 55: 0.00860,
+    56: 0.00925, 57: 0.00996, 58: 0.01071, 59: 0.01152, 60: 0.01240, 61: 0.01322,
+    62: 0.01410, 63: 0.01504, 64: 0.01604, 65: 0.01710, 66: 0.01841, 67: 0.01981,
+    68: 0.02132, 69: 0.02295, 70: 0.02470, 71: 0.02687, 72: 0.02922, 73: 0.03178,
+    74: 0.03457, 75: 0.03760, 76: 0.04123, 77: 0.04521, 78: 0.04957, 79: 0.05435,
+    80: 0.05960, 81: 0.06590, 82: 0.07287, 83: 0.08057, 84: 0.08908, 85: 0.09850,
+    86: 0.10907, 87: 0.12078, 88: 0.13375, 89: 0.14810, 90: 0.16400, 91: 0.17956,
+    92: 0.19659, 93: 0.21523, 94: 0.23565, 95: 0.25800, 96: 0.27547, 97: 0.29412,
+    98: 0.31403, 99: 0.33530, 100: 0.35800, 101: 0.37476, 102: 0.39230, 103: 0.41066,
+    104: 0.42988, 105: 0.45000, 106: 0.46843, 107: 0.48761, 108: 0.50758, 109: 0.52836,
+    110: 0.55000, 111: 0.56869, 112: 0.58801, 113: 0.60799, 114: 0.62864, 115: 0.65000,
+    116: 0.72391, 117: 0.80623, 118: 0.89790, 119: 1.00000
+}
+
+female_mortality_rates = {
+    20: 0.00050, 21: 0.00053, 22: 0.00057, 23: 0.00061, 24: 0.00065, 25: 0.00070,
+    26: 0.00075, 27: 0.00081, 28: 0.00087, 29: 0.00093, 30: 0.00100, 31: 0.00105,
+    32: 0.00111, 33: 0.00117, 34: 0.00123, 35: 0.00130, 36: 0.00136, 37: 0.00141,
+    38: 0.00147, 39: 0.00153, 40: 0.00160, 41: 0.00174, 42: 0.00188, 43: 0.00204,
+    44: 0.00221, 45: 0.00240, 46: 0.00259, 47: 0.00279, 48: 0.00301, 49: 0.00325,
+    50: 0.00350, 51: 0.00379, 52: 0.00410, 53: 0.00444, 54: 0.00480, 55: 0.00520,
+    56: 0.00558, 57: 0.00599, 58: 0.00643, 59: 0.00690, 60: 0.00740, 61: 0.00794,
+    62: 0.00851, 63: 0.00913, 64: 0.00979, 65: 0.01050, 66: 0.01142, 67: 0.01243,
+    68: 0.01352, 69: 0.01471, 70: 0.01600, 71: 0.01756, 72: 0.01928, 73: 0.02116,
+    74: 0.02323, 75: 0.02550, 76: 0.02814, 77: 0.03104, 78: 0.03425, 79: 0.03779,
+    80: 0.04170, 81: 0.04644, 82: 0.05171, 83: 0.05758, 84: 0.06412, 85: 0.07140,
+    86: 0.07999, 87: 0.08961, 88: 0.10039, 89: 0.11247, 90: 0.12600, 91: 0.13995,
+    92: 0.15544, 93: 0.17265, 94: 0.19177, 95: 0.21300, 96: 0.23004, 97: 0.24845,
+    98: 0.26834, 99: 0.28981, 100: 0.31300, 101: 0.33196, 102: 0.35207, 103: 0.37339,
+    104: 0.39601, 105: 0.42000, 106: 0.44000, 107: 0.46096, 108: 0.48291, 109: 0.50591,
+    110: 0.53000, 111: 0.55037, 112: 0.57153, 113: 0.59350, 114: 0.61631, 115: 0.64000,
+    116: 0.71554, 117: 0.80000, 118: 0.89443, 119: 1.00000
+}
@@ -0,0 +1,203 @@
+import numpy as np
+from scipy.stats import norm, t
+
+from simulations.simulation_batch import (simulate_batch, draw_plan_scenarios, historical_return_arrays,
+                                          scenario_returns)
+
+
+# Quantile nodes per asset used to build the parametric return distributions
+_shock_nodes = 4096
+
+# Lattice cells per return node when the stock and bond distributions are convolved
+_lattice_cells = 8
+
+
+# Wealth-grid (Markov chain) engine
+#
+# For a plan whose yearly cash flows do not depend on the portfolio (fixed spending, one
+# balance, annual steps, fixed lifespan), wealth follows W' = W * (1 + R) + F with a known
+# flow F each year and independent returns R.  Instead of sampling paths, the distribution
+# of W is carried year by year on a grid, giving noise-free success probabilities and
+# terminal percentiles.  Expenses grow with expected inflation.
+# The grid is fixed for the whole plan, so each year is one pass of multiply, index and
+# bincount over the occupied grid points x return nodes - no sorting.
+
+def markov_chain_success(params, grid_points=1500, return_nodes=64, t_degrees_of_freedom=None):
+    check_grid_supported(params)
+
+    flows = deterministic_flows(params)[0]
+    returns, weights = portfolio_return_distribution(params, return_nodes, t_degrees_of_freedom)
+
+    initial_savings = float(params['initial_savings'])
+    grid = _wealth_grid(initial_savings, flows, returns, grid_points)
+    values = grid['values']
+    probabilities = _project(np.array([initial_savings]), np.array([1.0]), grid)
+    yearly_success = []
+
+    for flow in flows:
+        next_values, mass = _transition(values, probabilities, returns, weights, flow)
+        probabilities = _project(next_values, mass, grid)
+        yearly_success.append(probabilities[values >= 0].sum())
+
+    # Each grid point's mass is spread over its neighbouring cells, so a point sits at the middle
+    # of its mass in the cumulative distribution
+    cumulative = np.cumsum(probabilities) - probabilities / 2
+    terminal_percentiles = {percentile: float(np.interp(percentile / 100, cumulative, values)) for percentile in (10, 25, 50, 75, 90)}
+
+    return {
+        'success_probability': float(probabilities[values >= 0].sum()),
+        'terminal_percentiles': terminal_percentiles,
+        'yearly_success': np.array(yearly_success),
+        'terminal_values': values,
+        'terminal_probabilities': probabilities
+    }
+
+
+def check_monte_carlo(params, simulations=None, seed=None, **markov_kwargs):
+    # Compare the batched Monte Carlo engine with the grid engine on the same plan.
+    # Monte Carlo runs with inflation at its mean so both answer the same question.
+    exact = markov_chain_success(params, **markov_kwargs)
+    mc_params = dict(params, inflation_std=0.0)
+    result = simulate_batch(mc_params, draw_plan_scenarios(mc_params, simulations, seed=seed))
+
+    rows = len(result['success'])
+    mc_probability = result['success'].mean()
+    standard_error = np.sqrt(max(mc_probability * (1 - mc_probability), 1.0 / rows) / rows)
+    mc_percentiles = {percentile: float(np.percentile(result['final_savings'], percentile)) for percentile in exact['terminal_percentiles']}
+
+    return {
+        'markov_chain_success': exact['success_probability'],
+        'monte_carlo_success': float(mc_probability),
+        'monte_carlo_standard_error': float(standard_error),
+        'z_score': float((mc_probability - exact['success_probability']) / standard_error),
+        'markov_chain_percentiles': exact['terminal_percentiles'],
+        'monte_carlo_percentiles': mc_percentiles
+    }
+
+
+def deterministic_flows(params, withdrawal_strategy=None, rows=1):
+    # Yearly net cash flow into the portfolio (income - expenses - taxes + windfalls and downsizing),
+    # taken from the batched engine with returns and inflation at their means - one row per path
+    # of the batch, so a strategy can give each row its own spending
+    flow_params = dict(params, inflation_std=0.0, simulation_type="Normal Distribution", time_step="Annual",
+                       parameter_uncertainty=False)
+    scenarios = draw_plan_scenarios(flow_params, rows, seed=0)
+    for key in ('stock_shocks', 'bond_shocks', 'inflation_shocks'):
+        scenarios[key] = np.zeros_like(scenarios[key])
+    result = simulate_batch(flow_params, scenarios, withdrawal_strategy)
+    additions = np.broadcast_to(result['schedules']['downsize_proceeds'] + result['schedules']['windfall_amount'],
+                                result['ending_balances'].shape)
+    return result['ending_balances'] - result['beginning_balances'] - result['investment_returns'] + additions
+
+
+def portfolio_return_distribution(params, return_nodes=64, t_degrees_of_freedom=None):
+    # Discrete distribution of the yearly portfolio return - exact for empirical returns,
+    # equal-width return bins for the parametric models
+    if t_degrees_of_freedom is None:
+        t_degrees_of_freedom = params.get('t_degrees_of_freedom', 5)
+    stock_share = params['stock_percentage'] / 100
+    bond_share = params['bond_percentage'] / 100
+    simulation_type = params['simulation_type']
+
+    if simulation_type == "Empirical Distribution":
+        historical_years, equity_returns, bond_returns = historical_return_arrays()
+        returns = stock_share * equity_returns + bond_share * bond_returns
+        return returns, np.full(len(returns), 1.0 / len(returns))
+
+    # Fine quantile nodes of the standardized shocks, mapped through the engine's return model
+    levels = (np.arange(_shock_nodes) + 0.5) / _shock_nodes
+    if simulation_type == "Students-T Distribution":
+        shocks = t.ppf(levels, t_degrees_of_freedom)
+    else:
+        shocks = norm.ppf(levels)
+    scenarios = {'simulation_type': simulation_type, 'stock_shocks': shocks, 'bond_shocks': shocks,
+                 'inflation_shocks': np.zeros_like(shocks)}
+    stock_returns, bond_returns, _ = scenario_returns(scenarios, params['stock_return_mean'], params['stock_return_std'],
+                                                      params['bond_return_mean'], params['bond_return_std'], 0.0, 0.0)
+    stock_parts, bond_parts = stock_share * stock_returns, bond_share * bond_returns
+    span = np.ptp(stock_parts) + np.ptp(bond_parts)
+    if span == 0:
+        return np.array([stock_parts[0] + bond_parts[0]]), np.array([1.0])
+
+    # Stock and bond shocks are independent, so the portfolio return is distributed as the
+    # convolution of the two weighted returns: each is binned on a shared lattice, keeping the
+    # probability and the probability-weighted return of every cell, and the cells of the sum
+    # are then collapsed into equal-width return bins represented by their conditional mean,
+    # so the expected return is kept exactly and the tails keep their reach
+    width = span / (return_nodes * _lattice_cells)
+    stock_mass, stock_moment = _lattice(stock_parts, width)
+    bond_mass, bond_moment = _lattice(bond_parts, width)
+    mass = np.convolve(stock_mass, bond_mass)
+    moment = np.convolve(stock_moment, bond_mass) + np.convolve(stock_mass, bond_moment)
+
+    bins = np.minimum(np.arange(len(mass)) * return_nodes // len(mass), return_nodes - 1)
+    weights = np.bincount(bins, mass, minlength=return_nodes)
+    sums = np.bincount(bins, moment, minlength=return_nodes)
+    occupied = weights > 0
+    return sums[occupied] / weights[occupied], weights[occupied]
+
+
+def _lattice(values, width):
+    # Probability and probability-weighted value of equally likely values in cells of the given width
+    cells = np.floor((values - values.min()) / width).astype(int)
+    return (np.bincount(cells, minlength=cells.max() + 1) / len(values),
+            np.bincount(cells, values, minlength=cells.max() + 1) / len(values))
+
+
+def _transition(values, probabilities, returns, weights, flow):
+    # Wealth reached from each occupied grid value through every return node, with its probability
+    occupied = probabilities > 1e-15
+    next_values = values[occupied, None] * (1 + returns[None, :]) + flow
+    mass = probabilities[occupied, None] * weights[None, :]
+    return next_values.ravel(), mass.ravel()
+
+
+def _wealth_grid(initial_savings, flows, returns, grid_points):
+    # Fixed grid over every wealth the plan can reach, evenly spaced in asinh(W / scale) with
+    # the scale at four times the largest yearly flow: close to even spacing within a few years'
+    # flows of zero, where success is decided, and to even relative spacing for large balances.
+    # Zero is a grid point when spanned, so success is counted exactly.
+    low = high = initial_savings
+    for flow in flows:
+        reached = np.array([low, high])[:, None] * (1 + np.array([returns.min(), returns.max()]))[None, :] + flow
+        low, high = min(low, reached.min()), max(high, reached.max())
+    scale = 4 * max(np.abs(flows).max(), 1.0)
+    start, end = np.arcsinh(low / scale), np.arcsinh(high / scale)
+    step = max(end - start, 1e-12) / (grid_points - 2)
+    if start < 0:
+        start = -np.ceil(-start / step) * step
+    values = scale * np.sinh(start + step * np.arange(grid_points))
+    if start < 0:
+        values[int(round(-start / step))] = 0.0
+    return {'values': values, 'scale': scale, 'start': start, 'step': step}
+
+
+def _project(next_values, mass, grid):
+    # Split each probability mass between the two neighbouring grid points, keeping the mean.
+    # The grid is even in asinh(W / scale), so the lower neighbour is found without a search.
+    values = grid['values']
+    lower = np.clip(((np.arcsinh(next_values / grid['scale']) - grid['start']) / grid['step']).astype(int), 0, len(values) - 2)
+    lower_values, upper_values = values[lower], values[lower + 1]
+    upper_share = np.clip((next_values - lower_values) / (upper_values - lower_values), 0.0, 1.0)
+
+    probabilities = np.bincount(lower, mass * (1 - upper_share), minlength=len(values))
+    probabilities += np.bincount(lower + 1, mass * upper_share, minlength=len(values))
+    return probabilities
+
+
+def check_grid_supported(params):
+    # The grid engines need cash flows that do not depend on the portfolio or on random lifespans
+    if params.get('account_balances') is not None:
+        raise ValueError("The wealth-grid engine supports a single portfolio balance only.")
+    if params.get('stochastic_lifespan', False):
+        raise ValueError("The wealth-grid engine needs a fixed life expectancy.")
+    if params.get('time_step', "Annual") != "Annual":
+        raise ValueError("The wealth-grid engine runs on annual steps only.")
+    if params.get('shock_events'):
+        raise ValueError("The wealth-grid engine needs cash flows without random shock events.")
+    if params['simulation_type'] == "Historical Sequence":
+        raise ValueError("The wealth-grid engine needs a return distribution, not historical sequences.")
+    if params['simulation_type'] == "Ensemble":
+        raise ValueError("The wealth-grid engine runs one return model at a time.")
+    if params.get('parameter_uncertainty', False):
+        raise ValueError("The wealth-grid engine needs the same return distribution on every path.")
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from simulations.life_tables import male_mortality_rates, female_mortality_rates
+
+
+# Default period life table by sex
+period_life_table = {
+    "Male": male_mortality_rates,
+    "Female": female_mortality_rates
+}
+
+
+def load_life_table(uploaded_file):
+    # Period life table from a CSV with 'age', 'male' and 'female' columns of one-year death probabilities
+    table_df = pd.read_csv(uploaded_file)
+    missing = [column for column in ("age", "male", "female") if column not in table_df.columns]
+    if missing:
+        raise ValueError(f"The life table needs 'age', 'male' and 'female' columns; missing {', '.join(missing)}.")
+    rates = table_df[["male", "female"]].astype(float)
+    if ((rates < 0) | (rates > 1)).any().any():
+        raise ValueError("The life table rates must be one-year death probabilities between 0 and 1.")
+    return {
+        "Male": dict(zip(table_df["age"].astype(int), table_df["male"].astype(float))),
+        "Female": dict(zip(table_df["age"].astype(int), table_df["female"].astype(float)))
+    }
+
+
+def sample_death_ages(current_age, sex, simulations, rng, life_table=None):
+    # Age at death for each path, drawn from the life table conditional on being alive today.
+    # The death age is the last age the person lives through.
+    mortality_rates = (life_table or period_life_table)[sex]
+    ages = np.arange(int(current_age), max(max(mortality_rates), int(current_age)) + 1)
+    missing = [int(age) for age in ages if age not in mortality_rates]
+    if missing:
+        raise ValueError(f"The {sex.lower()} life table has no rate for age {missing[0]}; "
+                         f"it must cover every age from the current age {int(current_age)} on.")
+    death_rates = np.array([mortality_rates[age] for age in ages])
+    death_rates[-1] = 1.0
+
+    # Probability of dying at each future age, then inverse-CDF sampling for all paths at once
+    survival_before = np.concatenate(([1.0], np.cumprod(1 - death_rates)[:-1]))
+    death_cdf = np.cumsum(survival_before * death_rates)
+    uniforms = rng.random(int(simulations)) * death_cdf[-1]
+    return ages[np.minimum(np.searchsorted(death_cdf, uniforms, side='right'), len(ages) - 1)]
+
+
+def draw_lifespans(current_age, partner_current_age, simulations, self_sex="Male", partner_sex="Female",
+                   seed=None, life_table=None):
+    # Death ages of both people and the number of plan years each path needs (until the last death)
+    rng = np.random.default_rng(seed)
+    self_death_age = sample_death_ages(current_age, self_sex, simulations, rng, life_table)
+    partner_death_age = sample_death_ages(partner_current_age, partner_sex, simulations, rng, life_table)
+    horizon = np.maximum(self_death_age - current_age, partner_death_age - partner_current_age) + 1
+
+    return {
+        'self_death_age': self_death_age,
+        'partner_death_age': partner_death_age,
+        'horizon': horizon
+    }
+
+
+def apply_lifespans(schedules, lifespans, survivor_expense_ratio):
+    # Mask the yearly schedules with each path's survival inside the fixed-size year array.
+    #   - earnings, pensions and healthcare of a person stop at their death
+    #   - the survivor keeps the larger of the two social security benefits
+    #   - living expenses step down to survivor_expense_ratio with one person left
+    #   - every flow stops after the last death (the path's horizon)
+    self_alive = schedules['self_age'] <= lifespans['self_death_age'][:, None]
+    partner_alive = schedules['partner_age'] <= lifespans['partner_death_age'][:, None]
+    in_plan = self_alive | partner_alive
+    both_alive = self_alive & partner_alive
+
+    masked = dict(schedules)
+    for key in ('self_earnings', 'self_pension', 'self_health_expense'):
+        masked[key] = schedules[key] * self_alive
+    for key in ('partner_earnings', 'partner_pension', 'partner_health_expense'):
+        masked[key] = schedules[key] * partner_alive
+    for key in ('rental_income', 'mortgage', 'yearly_expense_adjustment', 'one_time_expense', 'windfall_amount', 'downsize_proceeds'):
+        masked[key] = schedules[key] * in_plan
+
+    survivor_ss = np.maximum(schedules['self_ss'], schedules['partner_ss'])
+    masked['self_ss'] = np.where(both_alive, schedules['self_ss'], np.where(self_alive, survivor_ss, 0.0))
+    masked['partner_ss'] = np.where(both_alive, schedules['partner_ss'], np.where(partner_alive & ~self_alive, survivor_ss, 0.0))
+
+    masked['healthcare_costs'] = masked['self_health_expense'] + masked['partner_health_expense']
+    masked['gross_income'] = (masked['self_earnings'] + masked['partner_earnings'] + masked['self_ss'] + masked['partner_ss']
+                              + masked['self_pension'] + masked['partner_pension'] + masked['rental_income'])
+    masked['expense_factor'] = np.where(both_alive, 1.0, np.where(in_plan, survivor_expense_ratio, 0.0))
+    masked['in_plan'] = in_plan
+    masked['self_alive'] = self_alive
+    masked['partner_alive'] = partner_alive
+
+    return masked
@@ -0,0 +1,76 @@
+import time
+import numpy as np
+
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch
+
+
+# Multilevel Monte Carlo estimate of the monthly-resolution success probability
+#
+#   P(monthly success) = E[annual success] + E[monthly success - annual success]
+#
+# The first term uses many cheap annual paths. The correction uses a few coupled pairs:
+# the same scenarios run annually and monthly, and since the monthly paths compound back to
+# the same annual returns the two results rarely differ, so the correction has a small
+# variance and needs few of the expensive monthly paths.
+# Without path counts, a pilot run of pilot_simulations pairs measures the variance and cost
+# of each level and optimal_simulation_counts sizes the levels for target_standard_error.
+
+def multilevel_success_probability(params, coarse_simulations=None, fine_simulations=None, withdrawal_strategy=None, seed=None,
+                                   allocation_rule=None, target_standard_error=0.005, pilot_simulations=200, max_simulations=200000):
+    rng = np.random.default_rng(seed)
+    if coarse_simulations is None or fine_simulations is None:
+        pilot = _level_estimates(params, pilot_simulations, pilot_simulations, withdrawal_strategy, allocation_rule, rng)
+        # A pilot without a single differing path cannot tell a small variance from zero, so each
+        # variance is at least what one differing path of the pilot would give
+        variances = np.maximum(pilot['level_variances'], 1.0 / pilot_simulations)
+        counts = optimal_simulation_counts(variances, pilot['level_costs'], target_standard_error)
+        coarse_count, fine_count = [int(np.clip(count, pilot_simulations, max_simulations)) for count in counts]
+        coarse_simulations = coarse_count if coarse_simulations is None else coarse_simulations
+        fine_simulations = fine_count if fine_simulations is None else fine_simulations
+    return _level_estimates(params, coarse_simulations, fine_simulations, withdrawal_strategy, allocation_rule, rng)
+
+
+def _level_estimates(params, coarse_simulations, fine_simulations, withdrawal_strategy, allocation_rule, rng):
+    annual_params = dict(params, time_step="Annual")
+    monthly_params = dict(params, time_step="Monthly")
+
+    # Level 0 - annual paths
+    start = time.perf_counter()
+    coarse_scenarios = draw_plan_scenarios(params, coarse_simulations, seed=rng)
+    coarse_result = simulate_batch(annual_params, coarse_scenarios, withdrawal_strategy, allocation_rule)
+    coarse_time = time.perf_counter() - start
+    coarse_success = coarse_result['success'].astype(float)
+
+    # Level 1 - coupled annual / monthly pairs on shared scenarios
+    start = time.perf_counter()
+    fine_scenarios = draw_plan_scenarios(params, fine_simulations, seed=rng)
+    fine_annual = simulate_batch(annual_params, fine_scenarios, withdrawal_strategy, allocation_rule)
+    fine_monthly = simulate_batch(monthly_params, fine_scenarios, withdrawal_strategy, allocation_rule)
+    fine_time = time.perf_counter() - start
+    correction = fine_monthly['success'].astype(float) - fine_annual['success'].astype(float)
+
+    coarse_variance = coarse_success.var(ddof=1) if coarse_simulations > 1 else 0.0
+    correction_variance = correction.var(ddof=1) if fine_simulations > 1 else 0.0
+    estimate = coarse_success.mean() + correction.mean()
+    standard_error = np.sqrt(coarse_variance / coarse_simulations + correction_variance / fine_simulations)
+
+    return {
+        'success_probability': float(np.clip(estimate, 0.0, 1.0)),
+        'standard_error': float(standard_error),
+        'coarse_success_probability': float(coarse_success.mean()),
+        'correction': float(correction.mean()),
+        'simulation_counts': (int(coarse_simulations), int(fine_simulations)),
+        'level_variances': (float(coarse_variance), float(correction_variance)),
+        'level_costs': (coarse_time / coarse_simulations, fine_time / fine_simulations),
+        'coarse_result': coarse_result,
+        'fine_result': fine_monthly
+    }
+
+
+def optimal_simulation_counts(level_variances, level_costs, target_standard_error):
+    # Paths per level that reach the target standard error at the lowest cost:
+    # N_l proportional to sqrt(V_l / C_l)
+    variances = np.maximum(np.asarray(level_variances, dtype=float), 1e-12)
+    costs = np.asarray(level_costs, dtype=float)
+    scale = np.sum(np.sqrt(variances * costs)) / target_standard_error ** 2
+    return [max(int(np.ceil(scale * np.sqrt(v / c))), 2) for v, c in zip(variances, costs)]
@@ -0,0 +1,133 @@
+import numpy as np
+
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch, tile_scenarios
+from simulations.social_security import claiming_adjustment
+
+
+# Decisions the least-squares Monte Carlo solver can time, with the parameter each one sets
+timing_decisions = {
+    "Retirement Age": 'retirement_age',
+    "Social Security Claiming Age": 'withdrawal_start_age'
+}
+
+
+# Least-squares Monte Carlo (Longstaff-Schwartz) timing of path-dependent decisions
+#
+# Every candidate age runs in one batch: the scenario set is tiled once per candidate and the
+# decision parameter is set per row, so all candidates see the same market paths.  Paths that
+# decide at a later age share the history up to the earlier ages, so a path's balance at each
+# candidate age is the state the decision would be made on.
+#
+# The reward of deciding at an age is plan success minus cost_per_year for every year after
+# the earliest candidate (the value of retiring a year sooner, for example).  Working back
+# from the last age, the reward of deciding now and the value of waiting are regressed on the
+# balance of the paths still solvent at that age (the in-the-money paths - a depleted path
+# gains nothing from deciding).  A solvent path whose fitted reward of deciding is at least
+# the fitted value of waiting takes its realized reward at that age; every other path,
+# depleted ones included, keeps the realized outcome of waiting, so the regression is never
+# used outside the balances it was fitted on.  A path decides at the first age where the
+# fitted reward is at least the fitted value of waiting.  The rule is then checked on a
+# fresh scenario set against deciding every path at the same age.
+
+def least_squares_timing(params, decision="Retirement Age", candidate_ages=None, cost_per_year=None,
+                         simulations=None, withdrawal_strategy=None, seed=None, basis_degree=3):
+    rng = np.random.default_rng(seed)
+    if candidate_ages is None:
+        start = params[timing_decisions[decision]]
+        candidate_ages = range(int(start), int(start) + 6) if decision == "Retirement Age" else range(62, 71)
+    candidate_ages = np.asarray(candidate_ages, dtype=int)
+    if cost_per_year is None:
+        cost_per_year = 0.02 if decision == "Retirement Age" else 0.0
+    costs = cost_per_year * (candidate_ages - candidate_ages[0])
+
+    # Fit the exercise rules on one scenario set; every path still waiting decides at the last age
+    fit = _candidate_outcomes(params, decision, candidate_ages, simulations, withdrawal_strategy, rng)
+    rewards = fit['success'] - costs[:, None]
+    rules = [None] * len(candidate_ages)
+    value = rewards[-1]
+    for index in reversed(range(len(candidate_ages) - 1)):
+        state = fit['states'][index]
+        in_the_money = state > 0
+        if in_the_money.sum() <= basis_degree + 1:
+            continue
+        rules[index] = _fit_rule(state, [rewards[index], value], in_the_money, basis_degree)
+        fitted = _apply_rule(rules[index], state)
+        value = np.where(in_the_money, np.where(fitted[:, 0] >= fitted[:, 1], rewards[index], value), value)
+
+    # Apply them to an independent scenario set
+    check = _candidate_outcomes(params, decision, candidate_ages, simulations, withdrawal_strategy, rng)
+    decided = np.ones(check['states'].shape, dtype=bool)
+    for index, rule in enumerate(rules[:-1]):
+        state = check['states'][index]
+        fitted = _apply_rule(rule, state) if rule is not None else None
+        decided[index] = (state > 0) & (fitted[:, 0] >= fitted[:, 1]) if rule is not None else False
+    decision_index = decided.argmax(axis=0)
+    paths = np.arange(decided.shape[1])
+    policy_success = check['success'][decision_index, paths]
+    policy_values = policy_success - costs[decision_index]
+
+    # Compared on the same paths with the best single age for everyone
+    fixed_age_values = check['success'] - costs[:, None]
+    best_fixed = int(np.argmax(fixed_age_values.mean(axis=1)))
+    improvement = policy_values - fixed_age_values[best_fixed]
+    improvement_standard_error = improvement.std() / np.sqrt(len(improvement))
+    decision_balances = check['states'][decision_index, paths]
+
+    return {
+        'decision': decision,
+        'candidate_ages': candidate_ages,
+        'age_probabilities': np.bincount(decision_index, minlength=len(candidate_ages)) / decided.shape[1],
+        'median_decision_balances': np.array([np.median(decision_balances[decision_index == index]) if (decision_index == index).any() else np.nan
+                                              for index in range(len(candidate_ages))]),
+        'policy_success': float(policy_success.mean()),
+        'policy_value': float(policy_values.mean()),
+        'fixed_age_success': check['success'].mean(axis=1),
+        'fixed_age_values': fixed_age_values.mean(axis=1),
+        'best_fixed_age': int(candidate_ages[best_fixed]),
+        'improvement': float(improvement.mean()),
+        'improvement_standard_error': float(improvement_standard_error),
+        'beats_fixed_age': bool(improvement.mean() > 2 * improvement_standard_error),
+        'decision_ages': candidate_ages[decision_index]
+    }
+
+
+def _candidate_outcomes(params, decision, candidate_ages, simulations, withdrawal_strategy, rng):
+    # One batch with a copy of the scenario set per candidate age.
+    # Returns success (candidates, paths) and the balance at the start of each candidate age.
+    scenarios = draw_plan_scenarios(params, simulations, seed=rng)
+    paths = scenarios['stock_shocks'].shape[0]
+    tiled = tile_scenarios(scenarios, len(candidate_ages))
+
+    ages = np.repeat(candidate_ages, paths)
+    batch_params = dict(params)
+    batch_params[timing_decisions[decision]] = ages
+    if decision == "Social Security Claiming Age":
+        # The entered benefit is the full-retirement-age amount
+        batch_params['annual_social_security'] = params['annual_social_security'] * claiming_adjustment(ages)
+
+    result = simulate_batch(batch_params, tiled, withdrawal_strategy)
+    success = result['success'].reshape(len(candidate_ages), paths).astype(float)
+
+    # Balance entering the year the decision takes effect (clipped to the simulated years)
+    years = np.clip(candidate_ages - int(params['current_age']), 0, result['years_in_simulation'] - 1)
+    balances = result['beginning_balances'].reshape(len(candidate_ages), paths, -1)
+    states = balances[np.arange(len(candidate_ages)), :, years]
+
+    return {'success': success, 'states': states}
+
+
+def _fit_rule(state, targets, selected, basis_degree):
+    # Least-squares fit of each target on polynomials of the scaled balance of the selected
+    # paths.  The fit is only used within the 1st-99th percentiles of those balances, so the
+    # polynomial tails do not decide the outer paths.
+    low, high = np.quantile(state[selected], [0.01, 0.99])
+    center, scale = np.mean(state[selected]), max(np.std(state[selected]), 1.0)
+    basis = np.vander((np.clip(state, low, high) - center) / scale, basis_degree + 1)
+    coefficients = np.linalg.lstsq(basis[selected], np.column_stack(targets)[selected], rcond=None)[0]
+    return {'low': low, 'high': high, 'center': center, 'scale': scale, 'coefficients': coefficients}
+
+
+def _apply_rule(rule, state):
+    # Fitted targets of every path - one column per target
+    basis = np.vander((np.clip(state, rule['low'], rule['high']) - rule['center']) / rule['scale'], len(rule['coefficients']))
+    return basis @ rule['coefficients']
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+# Parameter uncertainty
+#
+# The return means and standard deviations of a plan are estimates from a limited history,
+# and treating them as known understates the risk.  In this mode every path first draws its
+# own stock and bond mean and volatility, and its yearly returns are then drawn from those.
+# The draws follow the posterior of a normal model under the Jeffreys prior after
+# observed_years years of data, centered on the plan's inputs:
+#   volatility = std * sqrt((n - 1) / chi-squared(n - 1))
+#   mean       = mean + volatility / sqrt(n) * z
+# With the inputs set to the historical average and standard deviation this is the posterior
+# fitted to the historical arrays.  The draws are kept in units of the plan's std, like the
+# standardized return shocks, so a parameter change keeps the same random numbers.
+
+def draw_return_parameters(paths, observed_years, seed=None):
+    # One volatility scale and one mean shift per path and asset class
+    rng = np.random.default_rng(seed)
+    draws = {}
+    for asset in ('stock', 'bond'):
+        volatility_scale = np.sqrt((observed_years - 1) / rng.chisquare(observed_years - 1, paths))
+        draws[f'{asset}_volatility_scale'] = volatility_scale
+        draws[f'{asset}_mean_shift'] = volatility_scale * rng.standard_normal(paths) / np.sqrt(observed_years)
+    return draws
+
+
+def path_return_parameters(scenarios, asset, mean, std):
+    # Return mean and std of each path as (rows, 1) columns - the plan's inputs when the
+    # scenario set has no parameter draws (the engine imports this module, so its helpers are
+    # imported here rather than at the top)
+    from simulations.simulation_batch import _column
+    mean, std = _column(mean), _column(std)
+    if f'{asset}_volatility_scale' not in scenarios:
+        return mean, std
+    return (mean + std * scenarios[f'{asset}_mean_shift'][:, None],
+            std * scenarios[f'{asset}_volatility_scale'][:, None])
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+# Path analytics
+#
+# Running reducers updated by the batched engine once per year, on (rows,) vectors only, so
+# the whole-path measures cost a few array operations a year and nothing is built per path:
+#   - first year the balance ran out (first depletion), and the number of years below zero
+#   - maximum drawdown from the running peak, starting from the initial balance; a depleted
+#     balance counts as a full loss
+#   - lowest balance in today's dollars, each year deflated by the path's own inflation since
+#     the first year, like its expenses
+# Years after a path's sampled horizon are not counted.  path_analytics turns the reducers
+# into per-path results, a survival curve by age and the CVaR of terminal wealth.
+
+def start_path_tracking(savings):
+    rows = len(savings)
+    return {
+        'price_level': np.ones(rows),
+        'peak': np.maximum(savings, 0.0),
+        'max_drawdown': np.zeros(rows),
+        'first_depletion': np.zeros(rows, dtype=int),
+        'depleted': np.zeros(rows, dtype=bool),
+        'shortfall_years': np.zeros(rows, dtype=int),
+        'min_real_balance': np.full(rows, np.inf)
+    }
+
+
+def track_year(tracking, year, ending_balance, in_plan, inflation_rate):
+    if year > 0:
+        tracking['price_level'] = tracking['price_level'] * (1 + inflation_rate)
+    balance = np.maximum(ending_balance, 0.0)
+    peak = np.maximum(tracking['peak'], balance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.where(peak > 0, 1 - balance / peak, 0.0)
+    tracking['peak'] = peak
+    tracking['max_drawdown'] = np.maximum(tracking['max_drawdown'], drawdown)
+
+    depleted = (ending_balance < 0) & in_plan
+    tracking['first_depletion'] = np.where(depleted & ~tracking['depleted'], year, tracking['first_depletion'])
+    tracking['depleted'] = tracking['depleted'] | depleted
+    tracking['shortfall_years'] = tracking['shortfall_years'] + depleted
+    tracking['min_real_balance'] = np.minimum(tracking['min_real_balance'],
+                                              np.where(in_plan, ending_balance / tracking['price_level'], np.inf))
+
+
+def path_analytics(tracking, final_savings, ages, cvar_level=0.05):
+    # Results for the first len(final_savings) rows; ages is (rows or 1, years)
+    paths = len(final_savings)
+    depleted = tracking['depleted'][:paths]
+    first_depletion = tracking['first_depletion'][:paths]
+    ages = np.broadcast_to(ages, (max(len(ages), paths), np.shape(ages)[-1]))[:paths]
+    depletion_age = np.where(depleted, ages[np.arange(paths), first_depletion], np.nan)
+
+    # Share of paths whose money has not run out by the end of each year
+    depletions = np.bincount(first_depletion[depleted], minlength=ages.shape[1])
+    survival_curve = 1 - np.cumsum(depletions) / paths
+
+    # Expected terminal wealth in the worst cvar_level tail
+    ordered = np.sort(final_savings)
+    tail = max(int(np.ceil(cvar_level * paths)), 1)
+
+    return {
+        'depletion_age': depletion_age,
+        'max_drawdown': tracking['max_drawdown'][:paths],
+        'shortfall_years': tracking['shortfall_years'][:paths],
+        'min_real_balance': tracking['min_real_balance'][:paths],
+        'survival_ages': ages[0],
+        'survival_curve': survival_curve,
+        'cvar_level': cvar_level,
+        'terminal_var': float(ordered[tail - 1]),
+        'terminal_cvar': float(ordered[:tail].mean()),
+        'depletion_probability': float(depleted.mean()),
+        'median_depletion_age': float(np.median(depletion_age[depleted])) if depleted.any() else None,
+        'median_max_drawdown': float(np.median(tracking['max_drawdown'][:paths])),
+        'mean_shortfall_years': float(tracking['shortfall_years'][:paths].mean())
+    }
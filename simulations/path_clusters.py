@@ -0,0 +1,110 @@
+import numpy as np
+
+
+# Representative scenarios
+#
+# The percentile tabs each show one path picked by its final balance, which can take an odd
+# route to get there.  Here all balance paths of a run are grouped by the shape of the whole
+# trajectory with k-means, and every group is shown by a representative - its member path
+# nearest the group's mean curve - with the share of paths it stands for.
+#   - Curves are the ending balances in today's dollars (deflated by the path's own inflation
+#     since the first year) relative to the starting savings, floored at zero so every depleted
+#     path looks alike from the year its money ran out.  The square root of the curves is
+#     clustered, so the few very large balances do not take most of the groups and paths
+#     near running out are told apart.
+#   - The centers are fitted by Lloyd iterations from a k-means++ start on a sample of at most
+#     sample_size paths; every path is then assigned to its nearest center in chunks, with the
+#     distances from one matrix product per chunk.
+# Groups are ordered from the lowest to the highest final balance of their mean curve.
+
+def scenario_clusters(result, clusters=5, sample_size=20000, iterations=50, seed=0, chunk_size=50000):
+    curves = _normalized_curves(result)
+    paths = len(curves)
+    clusters = int(min(clusters, paths))
+    rng = np.random.default_rng(seed)
+    sample = curves[rng.choice(paths, sample_size, replace=False)] if paths > sample_size else curves
+
+    centers = _kmeans_plus_plus(sample, clusters, rng)
+    for _ in range(iterations):
+        labels, _ = _nearest_centers(sample, centers, chunk_size)
+        counts = np.bincount(labels, minlength=clusters)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, sample)
+        # An emptied center stays where it was
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+
+    order = np.argsort(centers[:, -1], kind='stable')
+    centers = centers[order]
+    labels, distances = _nearest_centers(curves, centers, chunk_size)
+    counts = np.bincount(labels, minlength=clusters)
+
+    # Member of each group nearest its center; it minimizes the squared distance to the group
+    ranked = np.lexsort((distances, labels))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    final_savings = np.asarray(result['final_savings'])
+    success = np.asarray(result['success'])
+    depletion_age = result['path_analytics']['depletion_age'] if result.get('path_analytics') else None
+    within = distances.sum()
+    total = ((curves - curves.mean(axis=0)) ** 2).sum()
+
+    groups = []
+    for cluster in range(clusters):
+        if counts[cluster] == 0:
+            continue
+        members = labels == cluster
+        group_depletion = depletion_age[members & ~np.isnan(depletion_age)] if depletion_age is not None else np.array([])
+        groups.append({
+            'probability': float(counts[cluster] / paths),
+            'paths': int(counts[cluster]),
+            'representative_id': int(ranked[starts[cluster]]),
+            'success_probability': float(success[members].mean()),
+            'median_final_savings': float(np.median(final_savings[members])),
+            'median_depletion_age': float(np.median(group_depletion)) if len(group_depletion) else None
+        })
+
+    return {
+        'cluster_ids': labels,
+        'clusters': groups,
+        'explained_variance': float(1 - within / total) if total > 0 else 1.0
+    }
+
+
+def _normalized_curves(result):
+    ending_balances = np.asarray(result['ending_balances'])
+    paths = len(ending_balances)
+    inflation = np.broadcast_to(result['inflation_rates'], ending_balances.shape)
+    price_level = np.cumprod(1 + inflation, axis=1) / (1 + inflation[:, :1])
+    starting_savings = np.abs(np.asarray(result['beginning_balances'])[:, :1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        curves = np.where(starting_savings > 0, ending_balances / price_level / starting_savings, 0.0)
+    return np.sqrt(np.maximum(curves, 0.0)).reshape(paths, -1)
+
+
+def _kmeans_plus_plus(values, clusters, rng):
+    # Each next center drawn with probability proportional to the squared distance to the
+    # nearest center so far
+    centers = [values[rng.integers(len(values))]]
+    nearest = ((values - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, clusters):
+        total = nearest.sum()
+        index = rng.choice(len(values), p=nearest / total) if total > 0 else rng.integers(len(values))
+        centers.append(values[index])
+        nearest = np.minimum(nearest, ((values - values[index]) ** 2).sum(axis=1))
+    return np.array(centers)
+
+
+def _nearest_centers(values, centers, chunk_size):
+    # Index of and squared distance to the nearest center for every row:
+    #   |x - c|^2 = |x|^2 - 2 x.c + |c|^2
+    labels = np.empty(len(values), dtype=int)
+    distances = np.empty(len(values))
+    center_norms = (centers ** 2).sum(axis=1)
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        squared = (chunk ** 2).sum(axis=1)[:, None] - 2 * chunk @ centers.T + center_norms
+        labels[start:start + chunk_size] = np.argmin(squared, axis=1)
+        distances[start:start + chunk_size] = np.maximum(squared.min(axis=1), 0.0)
+    return labels, distances
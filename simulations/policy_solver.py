@@ -0,0 +1,135 @@
+import numpy as np
+
+from simulations.markov_chain import check_grid_supported, deterministic_flows, portfolio_return_distribution
+
+
+# Objectives of the policy solver
+policy_objectives = ["Success Probability", "Expected Utility"]
+
+
+# Dynamic-programming spending and allocation policy
+#
+# Backward induction over a wealth grid.  Each year and wealth level picks a spending
+# multiplier (times the planned inflation-adjusted living expense, never below the floor)
+# and a stock allocation that maximize
+#   - Success Probability: the chance of ending the plan with a non-negative balance
+#     (ties go to the planned spending), or
+#   - Expected Utility: the sum of CRRA utilities of the yearly spending multipliers,
+#     with failure_penalty subtracted when the plan ends below zero.
+# Spending is chosen from the retirement age on; before that the plan spends as planned.
+# The plan needs the same conditions as the wealth-grid engine, and cash flows follow
+# mean inflation.  The resulting tables drive forward simulations through policy_strategy
+# and policy_allocation with one grid lookup per path and year.
+
+def solve_policy(params, objective="Success Probability", spending_multipliers=None, stock_allocations=None,
+                 spending_floor=0.8, risk_aversion=3.0, failure_penalty=10.0, grid_points=400, return_nodes=32):
+    check_grid_supported(params)
+    if objective not in policy_objectives:
+        raise ValueError(f"Invalid objective. Choose one of {policy_objectives}.")
+
+    if spending_multipliers is None:
+        spending_multipliers = np.linspace(0.6, 1.5, 19)
+    if stock_allocations is None:
+        stock_allocations = np.linspace(0.0, 1.0, 11)
+    spending_multipliers = np.union1d(np.asarray(spending_multipliers, dtype=float), [1.0])
+    stock_allocations = np.asarray(stock_allocations, dtype=float)
+
+    # Net cash flow of every year for every spending multiplier
+    def multiplier_rule(year, balances, returns, spending, context):
+        return spending_multipliers * spending
+    flows = deterministic_flows(params, multiplier_rule, rows=len(spending_multipliers))
+    years_in_simulation = flows.shape[1]
+    retired = np.broadcast_to(_retired_years(params, years_in_simulation), (years_in_simulation,))
+
+    # Return distribution of each allocation
+    allocation_returns = [portfolio_return_distribution(dict(params, stock_percentage=share * 100, bond_percentage=(1 - share) * 100), return_nodes)
+                          for share in stock_allocations]
+
+    grid = _policy_grid(params, flows, allocation_returns, grid_points)
+
+    # Yearly reward of each multiplier, with disallowed choices ruled out
+    allowed = spending_multipliers >= spending_floor - 1e-12
+    if objective == "Expected Utility":
+        if risk_aversion == 1:
+            utility = np.log(spending_multipliers)
+        else:
+            utility = (spending_multipliers ** (1 - risk_aversion) - 1) / (1 - risk_aversion)
+        terminal_value = np.where(grid >= 0, 0.0, -failure_penalty)
+    else:
+        utility = -1e-9 * np.abs(spending_multipliers - 1)
+        terminal_value = (grid >= 0).astype(float)
+
+    spending_policy = np.empty((years_in_simulation, len(grid)))
+    allocation_policy = np.empty((years_in_simulation, len(grid)))
+    values = np.empty((years_in_simulation + 1, len(grid)))
+    values[-1] = terminal_value
+
+    for year in reversed(range(years_in_simulation)):
+        if retired[year]:
+            choices = np.flatnonzero(allowed)
+            reward = utility[choices]
+        else:
+            choices = np.flatnonzero(spending_multipliers == 1.0)
+            reward = np.zeros(1)
+
+        # Expected value of next year for each (multiplier, allocation, wealth)
+        action_values = np.empty((len(choices), len(stock_allocations), len(grid)))
+        for allocation, (returns, weights) in enumerate(allocation_returns):
+            next_wealth = grid[None, :, None] * (1 + returns) + flows[choices, year][:, None, None]
+            action_values[:, allocation] = np.interp(next_wealth, grid, values[year + 1]) @ weights
+        action_values += reward[:, None, None]
+
+        best = action_values.reshape(-1, len(grid)).argmax(axis=0)
+        best_multiplier, best_allocation = np.unravel_index(best, action_values.shape[:2])
+        spending_policy[year] = spending_multipliers[choices][best_multiplier]
+        allocation_policy[year] = stock_allocations[best_allocation]
+        values[year] = action_values.reshape(-1, len(grid))[best, np.arange(len(grid))]
+
+    return {
+        'objective': objective,
+        'wealth_grid': grid,
+        'spending_policy': spending_policy,
+        'allocation_policy': allocation_policy,
+        'values': values,
+        'initial_value': float(np.interp(params['initial_savings'], grid, values[0]))
+    }
+
+
+def policy_strategy(policy):
+    # Withdrawal strategy that spends the policy's multiplier of the planned expense
+    def rule(year, balances, returns, spending, context):
+        return spending * _lookup(policy, 'spending_policy', year, balances)
+    return rule
+
+
+def policy_allocation(policy):
+    # Allocation rule that sets the policy's stock share for each path's balance
+    def rule(year, balances, context):
+        return _lookup(policy, 'allocation_policy', year, balances)
+    return rule
+
+
+def _lookup(policy, table, year, balances):
+    # Nearest grid point of each balance - a single gather per path and year
+    grid = policy['wealth_grid']
+    table = policy[table]
+    midpoints = (grid[1:] + grid[:-1]) / 2
+    return table[min(year, len(table) - 1)][np.searchsorted(midpoints, balances)]
+
+
+def _retired_years(params, years_in_simulation):
+    # Years from the retirement age on, when the policy chooses the spending
+    return params['current_age'] + np.arange(years_in_simulation) >= params['retirement_age']
+
+
+def _policy_grid(params, flows, allocation_returns, grid_points):
+    # Grid dense around zero wealth, where the decisions matter most, and geometrically
+    # spaced towards the largest balance the plan can reach
+    scale = max(np.abs(flows).max(), 1.0)
+    best_growth = max(1 + np.max(returns) for returns, weights in allocation_returns)
+    mean_growth = max(1 + np.sum(returns * weights) for returns, weights in allocation_returns)
+    high = (max(params['initial_savings'], scale) * mean_growth ** flows.shape[1] * best_growth ** 2
+            + np.maximum(flows, 0.0).max(axis=0).sum())
+    low = -scale * 5
+    grid = scale * np.sinh(np.linspace(np.arcsinh(low / scale), np.arcsinh(high / scale), grid_points))
+    return np.unique(np.append(grid, 0.0))
@@ -0,0 +1,89 @@
+import numpy as np
+
+from simulations.simulation_batch import draw_plan_scenarios
+from simulations.sweeps import evaluate_variants
+
+
+# Inputs of the tornado analysis by display name: (parameter, how the step applies, step)
+#   relative - the value moves by step times itself, absolute - by step
+sensitivity_inputs = {
+    "Initial Savings": ('initial_savings', 'relative', 0.20),
+    "Annual Expense": ('annual_expense', 'relative', 0.10),
+    "Annual Earnings": ('annual_earnings', 'relative', 0.20),
+    "Partner Earnings": ('partner_earnings', 'relative', 0.20),
+    "Retirement Age": ('retirement_age', 'absolute', 2),
+    "Partner Retirement Age": ('partner_retirement_age', 'absolute', 2),
+    "Stock Percentage": ('stock_percentage', 'absolute', 10),
+    "Stock Return Mean": ('stock_return_mean', 'absolute', 0.01),
+    "Stock Return Std Dev": ('stock_return_std', 'absolute', 0.02),
+    "Bond Return Mean": ('bond_return_mean', 'absolute', 0.01),
+    "Bond Return Std Dev": ('bond_return_std', 'absolute', 0.01),
+    "Inflation Mean": ('inflation_mean', 'absolute', 0.01),
+    "Inflation Std Dev": ('inflation_std', 'absolute', 0.005),
+    "Tax Rate": ('tax_rate', 'absolute', 0.05),
+    "Social Security": ('annual_social_security', 'relative', 0.20),
+    "Partner Social Security": ('partner_social_security', 'relative', 0.20),
+    "Social Security Start Age": ('withdrawal_start_age', 'absolute', 2),
+    "COLA Rate": ('cola_rate', 'absolute', 0.01),
+    "Healthcare Cost": ('self_healthcare_cost', 'relative', 0.30),
+    "Partner Healthcare Cost": ('partner_healthcare_cost', 'relative', 0.30),
+    "Mortgage Payment": ('mortgage_payment', 'relative', 0.20),
+    "Annual Expense Decrease": ('annual_expense_decrease', 'absolute', 0.005)
+}
+
+# Bounds that keep a perturbed input meaningful
+_input_bounds = {
+    'stock_percentage': (0.0, 100.0),
+    'stock_return_std': (0.0, np.inf),
+    'bond_return_std': (0.0, np.inf),
+    'inflation_std': (0.0, np.inf),
+    'tax_rate': (0.0, 1.0)
+}
+
+
+# One-at-a-time sensitivity (tornado)
+#
+# Each input moves down and up by its step while the others stay at the plan's values.
+# The base plan and all the variants run as one batch on one shared scenario set, so the
+# swings measure the input alone and not sampling noise.
+
+def tornado_analysis(params, inputs=None, withdrawal_strategy=None, allocation_rule=None, simulations=None, seed=None,
+                     max_rows=200_000):
+    inputs = list(sensitivity_inputs) if inputs is None else inputs
+    variant_count = 1 + 2 * len(inputs)
+
+    # Row 0 is the base plan, rows 2k+1 and 2k+2 move input k down and up
+    variants = {}
+    low_values, high_values = [], []
+    for index, name in enumerate(inputs):
+        parameter, step_type, step = sensitivity_inputs[name]
+        value = float(params[parameter])
+        change = abs(value) * step if step_type == 'relative' else step
+        low, high = np.clip([value - change, value + change], *_input_bounds.get(parameter, (-np.inf, np.inf)))
+        values = variants.setdefault(parameter, np.full(variant_count, value))
+        values[2 * index + 1], values[2 * index + 2] = low, high
+        low_values.append(low)
+        high_values.append(high)
+
+    scenarios = draw_plan_scenarios(params, simulations, seed=seed)
+    success, median_final = evaluate_variants(params, variants, scenarios, withdrawal_strategy, allocation_rule, max_rows)
+
+    rows = []
+    for index, name in enumerate(inputs):
+        low_success, high_success = success[2 * index + 1], success[2 * index + 2]
+        rows.append({
+            'input': name,
+            'low_value': float(low_values[index]),
+            'high_value': float(high_values[index]),
+            'low_success': float(low_success),
+            'high_success': float(high_success),
+            'low_median_final_savings': float(median_final[2 * index + 1]),
+            'high_median_final_savings': float(median_final[2 * index + 2]),
+            'swing': float(abs(high_success - low_success))
+        })
+
+    return {
+        'base_success': float(success[0]),
+        'base_median_final_savings': float(median_final[0]),
+        'inputs': sorted(rows, key=lambda row: row['swing'], reverse=True)
+    }
@@ -0,0 +1,66 @@
+import numpy as np
+from scipy.sparse import csc_matrix
+
+
+# Random expense and income shocks, by display name
+#   kind          - 'expense' adds a cost in today's dollars (grown with mean inflation),
+#                   'earnings_loss' removes a fraction of the year's household earnings
+#   hazard        - chance the event starts in a year, growing by hazard_growth per year of
+#                   age above start_age (and zero before it)
+#   working_only  - the event only hits the years before the retirement age.  The engine
+#                   applies this with each row's own retirement age, so sweeps, goal seek
+#                   and decision timing that set the age per row keep their own windows.
+#   median, sigma - lognormal severity: the yearly amount, or the fraction of earnings lost
+#   mean_duration - years the event lasts, geometrically distributed
+shock_events = {
+    "Long-Term Care": {'kind': 'expense', 'hazard': 0.01, 'hazard_growth': 0.12, 'start_age': 70, 'working_only': False,
+                       'median': 90_000, 'sigma': 0.35, 'mean_duration': 2.5},
+    "Job Loss": {'kind': 'earnings_loss', 'hazard': 0.03, 'hazard_growth': 0.0, 'start_age': 0, 'working_only': True,
+                 'median': 0.5, 'sigma': 0.5, 'mean_duration': 1.2},
+    "Major Home Repair": {'kind': 'expense', 'hazard': 0.05, 'hazard_growth': 0.0, 'start_age': 0, 'working_only': False,
+                          'median': 20_000, 'sigma': 0.6, 'mean_duration': 1.0}
+}
+
+
+def draw_shock_events(params, paths, years_in_simulation, shocks, seed=None):
+    # Sample every shock of every path upfront as sparse (paths, years) event matrices.
+    # Only the event starts are drawn - a binomial count per year and the paths it hits - so
+    # the work grows with the number of events, not with paths times years.  Overlapping
+    # events add up.  Columns are stored contiguously (CSC) for the engine's yearly reads.
+    # Working-only events are drawn over the whole plan into their own matrix; the engine
+    # drops their years from each row's retirement age on.
+    rng = np.random.default_rng(seed)
+    ages = params['current_age'] + np.arange(years_in_simulation)
+    entries = {'expense': ([], [], []), 'earnings_loss': ([], [], []), 'working_earnings_loss': ([], [], [])}
+
+    for name in shocks:
+        spec = shock_events[name]
+        hazard = spec['hazard'] * (1 + spec['hazard_growth']) ** np.maximum(ages - spec['start_age'], 0) * (ages >= spec['start_age'])
+        counts = rng.binomial(paths, np.minimum(hazard, 1.0))
+
+        onset_paths = np.concatenate([rng.choice(paths, count, replace=False) for count in counts])
+        onset_years = np.repeat(np.arange(years_in_simulation), counts)
+        durations = rng.geometric(1 / spec['mean_duration'], len(onset_paths))
+        severities = spec['median'] * np.exp(spec['sigma'] * rng.standard_normal(len(onset_paths)))
+
+        # One entry per event year, dropping the years past the end of the plan
+        event = np.repeat(np.arange(len(onset_paths)), durations)
+        offset = np.arange(len(event)) - np.repeat(np.cumsum(durations) - durations, durations)
+        event_years = onset_years[event] + offset
+        keep = event_years < years_in_simulation
+        path_entries, year_entries, value_entries = entries[('working_' if spec['working_only'] else '') + spec['kind']]
+        path_entries.append(onset_paths[event][keep])
+        year_entries.append(event_years[keep])
+        value_entries.append(severities[event][keep])
+
+    def event_matrix(kind):
+        path_entries, year_entries, value_entries = entries[kind]
+        if not path_entries:
+            return csc_matrix((paths, years_in_simulation))
+        matrix = csc_matrix((np.concatenate(value_entries), (np.concatenate(path_entries), np.concatenate(year_entries))),
+                            shape=(paths, years_in_simulation))
+        matrix.sum_duplicates()
+        return matrix
+
+    return {'shock_expense': event_matrix('expense'), 'shock_earnings_loss': event_matrix('earnings_loss'),
+            'shock_working_earnings_loss': event_matrix('working_earnings_loss')}
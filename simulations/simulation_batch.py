@@ -0,0 +1,959 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.sparse import issparse, vstack
+from datetime import datetime
+
+from simulations.historical_returns import (historical_equity_returns, historical_bond_returns, historical_equity_gap_returns,
+                                            historical_inflation_rates, stress_sequences)
+from simulations.simulation_mc import create_cash_flow_entry
+from simulations.taxes import tax_tables, income_tax, progressive_portfolio_draw
+from simulations.accounts import TAXABLE, TAX_DEFERRED, withdrawal_orders, required_minimum_distribution, multi_account_draw
+from simulations.mortality import draw_lifespans, apply_lifespans
+from simulations.gradients import gradient_parameters, return_scores, gradient_summary
+from simulations.parameter_uncertainty import draw_return_parameters, path_return_parameters
+from simulations.path_analytics import start_path_tracking, track_year, path_analytics
+from simulations.shocks import draw_shock_events
+
+
+# Return models an ensemble run can combine
+ensemble_return_models = ["Normal Distribution", "Lognormal Distribution", "Students-T Distribution", "Empirical Distribution"]
+
+# Rows added for each stress sequence of a run (a success rate on 500 paths has a standard
+# error of about 2 points)
+stress_test_rows = 500
+
+
+# Batched Monte Carlo engine
+#
+# Same inputs and the same yearly cash flow rules as monte_carlo_simulation, but every
+# simulation path is a row of a numpy array and the year loop advances all paths at once.
+# Numeric parameters may be scalars or arrays with one value per row, which lets sweeps
+# and optimizers evaluate many parameter combinations in a single batch.
+
+def batch_monte_carlo_simulation(current_age, partner_current_age, life_expectancy, initial_savings,
+                            annual_earnings, partner_earnings, self_yearly_increase, partner_yearly_increase,
+                            annual_pension, partner_pension, self_pension_yearly_increase, partner_pension_yearly_increase,
+                            rental_start, rental_end, rental_amt, rental_yearly_increase,
+                            annual_expense, mortgage_payment,
+                            mortgage_years_remaining, retirement_age, partner_retirement_age,
+                            annual_social_security, withdrawal_start_age, partner_social_security,
+                            partner_withdrawal_start_age, self_healthcare_cost, self_healthcare_start_age,
+                            partner_healthcare_start_age, partner_healthcare_cost, stock_percentage,
+                            bond_percentage, stock_return_mean, bond_return_mean, stock_return_std,
+                            bond_return_std, simulations, tax_rate, cola_rate, inflation_mean,
+                            inflation_std, annual_expense_decrease, years_until_downsize, residual_amount,
+                            adjust_expense_years, adjust_expense_amounts,
+                            one_time_years, one_time_amounts,
+                            windfall_years, windfall_amounts, simulation_type,
+                            tax_method="Flat Rate", filing_status="Married Filing Jointly",
+                            account_balances=None, account_stock_percentages=None,
+                            withdrawal_order="Taxable, Tax-Deferred, Roth",
+                            stochastic_lifespan=False, self_sex="Male", partner_sex="Female",
+                            survivor_expense_ratio=0.7, life_table=None, time_step="Annual", shock_events=None,
+                            parameter_uncertainty=False, ensemble_models=None, ensemble_weights=None, t_degrees_of_freedom=5,
+                            withdrawal_strategy=None, allocation_rule=None, gradients=False, stress_tests=None, seed=None):
+
+    # Collect the inputs so they can be passed around as one parameter set
+    params = dict(locals())
+    params.pop('withdrawal_strategy')
+    params.pop('allocation_rule')
+    params.pop('gradients')
+    params.pop('stress_tests')
+    params.pop('seed')
+
+    scenarios = draw_plan_scenarios(params, seed=seed)
+    if stress_tests:
+        scenarios = add_stress_scenarios(scenarios, params, stress_tests)
+
+    return simulate_batch(params, scenarios, withdrawal_strategy=withdrawal_strategy, allocation_rule=allocation_rule,
+                          gradients=gradients)
+
+
+def draw_plan_scenarios(params, simulations=None, seed=None):
+    # Random draws for a parameter set - market shocks, plus sampled lifespans when enabled
+    rng = np.random.default_rng(seed)
+    simulations = params['simulations'] if simulations is None else simulations
+    years_in_simulation = int(params['life_expectancy'] - params['current_age'] + 1)
+
+    # An ensemble stacks one scenario set per return model
+    if params['simulation_type'] == "Ensemble":
+        return ensemble_scenarios(params, simulations, seed=seed)
+
+    # Historical sequences are fixed - one path per start year, on the fixed life expectancy
+    if params['simulation_type'] == "Historical Sequence":
+        if params.get('parameter_uncertainty', False):
+            raise ValueError("Parameter uncertainty needs a parametric return model, not historical sequences.")
+        scenarios = historical_sequence_scenarios(years_in_simulation)
+        if params.get('shock_events'):
+            scenarios.update(draw_shock_events(params, len(scenarios['start_years']), years_in_simulation, params['shock_events'], seed=rng))
+        return scenarios
+
+    # With stochastic lifespans the year array runs to the latest sampled death
+    lifespans = None
+    if params.get('stochastic_lifespan', False):
+        lifespans = draw_lifespans(params['current_age'], params['partner_current_age'], simulations,
+                                   params.get('self_sex', "Male"), params.get('partner_sex', "Female"),
+                                   seed=rng, life_table=params.get('life_table'))
+        years_in_simulation = int(lifespans['horizon'].max())
+
+    scenarios = draw_market_scenarios(params['simulation_type'], simulations, years_in_simulation, seed=rng,
+                                      t_degrees_of_freedom=params.get('t_degrees_of_freedom', 5))
+    if lifespans is not None:
+        scenarios.update(lifespans)
+
+    # Each path's own return means and volatilities, for the parametric return models
+    if params.get('parameter_uncertainty', False):
+        if params['simulation_type'] == "Empirical Distribution":
+            raise ValueError("Parameter uncertainty needs a parametric return model, not sampled history.")
+        scenarios.update(draw_return_parameters(simulations, len(historical_return_arrays()[0]), seed=rng))
+
+    # Random expense and income shocks as sparse event matrices
+    if params.get('shock_events'):
+        scenarios.update(draw_shock_events(params, simulations, years_in_simulation, params['shock_events'], seed=rng))
+
+    return scenarios
+
+
+def ensemble_scenarios(params, simulations, seed=None):
+    # Scenario sets of several return models stacked into one batch: rows of model k have
+    # model_index k.  The batch has simulations rows per model in all, split between the
+    # models in proportion to their weights, so the pooled paths are the weighted mixture; a
+    # model with zero weight is left out.  Every model draws from the same seed and keeps the first rows of the
+    # draw, so the models share the sampled lifespans and, where their shocks have the same
+    # form (Normal and Lognormal), the market draws; the shock events of the first model are
+    # used by all of them.  An integer seed is passed to every model as is, so a one-model
+    # ensemble repeats the plain run.  The engine runs the deterministic schedules once for
+    # the whole stack.
+    models = list(params.get('ensemble_models') or ensemble_return_models)
+    weights = params.get('ensemble_weights')
+    weights = np.ones(len(models)) if weights is None else np.asarray(weights, dtype=float)
+    if any(model not in ensemble_return_models for model in models):
+        raise ValueError(f"Invalid ensemble model. Choose from {ensemble_return_models}.")
+    if len(weights) != len(models) or np.any(weights < 0) or weights.sum() <= 0:
+        raise ValueError("Ensemble weights need one non-negative value per model and a positive total.")
+    models = [model for model, weight in zip(models, weights) if weight > 0]
+    weights = weights[weights > 0] / weights[weights > 0].sum()
+
+    # Rows of each model by largest remainder
+    total_rows = simulations * len(models)
+    counts = np.floor(weights * total_rows).astype(int)
+    counts[np.argsort(counts - weights * total_rows)[:total_rows - counts.sum()]] += 1
+    counts = np.maximum(counts, 1)
+
+    model_seed = seed if isinstance(seed, (int, np.integer)) else int(np.random.default_rng(seed).integers(2 ** 32))
+    blocks = []
+    for index, model in enumerate(models):
+        model_params = dict(params, simulation_type=model,
+                            parameter_uncertainty=params.get('parameter_uncertainty', False) and model != "Empirical Distribution")
+        if index > 0:
+            model_params['shock_events'] = None
+        blocks.append(draw_plan_scenarios(model_params, counts.max(), seed=model_seed))
+
+    # Models without per-path return parameters keep the plan's values
+    defaults = {'stock_volatility_scale': 1.0, 'bond_volatility_scale': 1.0, 'stock_mean_shift': 0.0, 'bond_mean_shift': 0.0}
+    scenarios = {}
+    for key in dict.fromkeys(key for block in blocks for key in block):
+        values = [block.get(key) for block in blocks]
+        if issparse(values[0]):
+            scenarios[key] = vstack([values[0][:count] for count in counts], format='csc')
+        elif isinstance(values[0], np.ndarray) or key in defaults:
+            scenarios[key] = np.concatenate([np.full(count, defaults[key]) if value is None else value[:count]
+                                             for value, count in zip(values, counts)])
+        else:
+            scenarios[key] = values[0]
+    scenarios.update({
+        'simulation_type': "Ensemble",
+        'ensemble_models': models,
+        'ensemble_weights': list(weights),
+        'model_index': np.repeat(np.arange(len(models)), counts)
+    })
+    return scenarios
+
+
+def draw_market_scenarios(simulation_type, simulations, years_in_simulation, seed=None, t_degrees_of_freedom=5):
+    # Draw the random part of the simulation upfront as standardized shocks so the same
+    # draws can be reused across parameter changes (common random numbers)
+    rng = np.random.default_rng(seed)
+    shape = (int(simulations), int(years_in_simulation))
+
+    if simulation_type in ("Normal Distribution", "Lognormal Distribution"):
+        stock_shocks = rng.standard_normal(shape)
+        bond_shocks = rng.standard_normal(shape)
+
+    elif simulation_type == "Students-T Distribution":
+        stock_shocks = rng.standard_t(t_degrees_of_freedom, shape)
+        bond_shocks = rng.standard_t(t_degrees_of_freedom, shape)
+
+    elif simulation_type == "Empirical Distribution":
+        # Sample historical years with replacement, keeping equity and bond returns of a year together
+        historical_years, equity_returns, bond_returns = historical_return_arrays()
+        selected_years = rng.integers(0, len(historical_years), size=shape)
+        stock_shocks = equity_returns[selected_years]
+        bond_shocks = bond_returns[selected_years]
+
+    else:
+        raise ValueError("Invalid simulation type. Choose 'Normal Distribution', 'Lognormal Distribution', 'Students-T Distribution' or 'Empirical Distribution'.")
+
+    inflation_shocks = rng.standard_normal(shape)
+
+    return {
+        'simulation_type': simulation_type,
+        'stock_shocks': stock_shocks,
+        'bond_shocks': bond_shocks,
+        'inflation_shocks': inflation_shocks,
+        't_degrees_of_freedom': t_degrees_of_freedom,
+        # Seed of the within-year monthly paths, generated a year at a time in monthly mode
+        'monthly_seed': int(rng.integers(2 ** 32))
+    }
+
+
+def tile_scenarios(scenarios, copies):
+    # Repeat a scenario set so each copy can run with its own parameter values in one batch.
+    # Row k of copy c is row c * paths + k; every copy sees the same draws.
+    tiled = {}
+    for key, value in scenarios.items():
+        if isinstance(value, np.ndarray):
+            tiled[key] = np.tile(value, (copies,) + (1,) * (value.ndim - 1))
+        elif issparse(value):
+            tiled[key] = vstack([value] * copies, format='csc')
+        else:
+            tiled[key] = value
+    return tiled
+
+
+def historical_sequence_scenarios(years_in_simulation):
+    # Every contiguous run of historical years as a path: row k starts in start_years[k].
+    # The rows are sliding-window views of the yearly arrays, so no data is copied.
+    historical_years, equity_returns, bond_returns, inflation_rates = historical_sequence_arrays()
+    if years_in_simulation > len(historical_years):
+        raise ValueError(f"The plan runs {years_in_simulation} years but the history covers only {len(historical_years)}.")
+    return {
+        'simulation_type': "Historical Sequence",
+        'stock_shocks': sliding_window_view(equity_returns, years_in_simulation),
+        'bond_shocks': sliding_window_view(bond_returns, years_in_simulation),
+        'inflation_shocks': sliding_window_view(inflation_rates, years_in_simulation),
+        'start_years': historical_years[:len(historical_years) - years_in_simulation + 1],
+        'monthly_seed': 0
+    }
+
+
+def add_stress_scenarios(scenarios, params, names, stress_paths=None):
+    # Append stress rows to a scenario set: for each named sequence, a copy of the first
+    # stress_paths paths with the sequence's historical returns and inflation replacing the
+    # draws from the retirement year on (the later years keep their random draws).
+    # simulate_batch reports these rows apart from the Monte Carlo paths.  By default each
+    # sequence gets stress_test_rows rows, so the overlay costs the same at any run size.
+    paths, years_in_simulation = scenarios['stock_shocks'].shape
+    stress_paths = stress_test_rows if stress_paths is None else stress_paths
+    stress_paths = min(stress_paths, paths)
+    start = int(np.clip(params['retirement_age'] - params['current_age'], 0, years_in_simulation - 1))
+
+    stressed = {}
+    for key, value in scenarios.items():
+        if isinstance(value, np.ndarray) and value.shape[:1] == (paths,):
+            stressed[key] = np.concatenate([value] + [value[:stress_paths]] * len(names))
+        elif issparse(value):
+            stressed[key] = vstack([value] + [value[:stress_paths]] * len(names), format='csc')
+        else:
+            stressed[key] = value
+    rows = paths + len(names) * stress_paths
+    stress_mask = np.zeros((rows, years_in_simulation), dtype=bool)
+    stress_rates = {key: np.zeros((rows, years_in_simulation)) for key in ('stress_stock_returns', 'stress_bond_returns', 'stress_inflation_rates')}
+
+    historical_years, equity_returns, bond_returns, inflation_rates = historical_sequence_arrays()
+    for index, name in enumerate(names):
+        first_year, last_year = stress_sequences[name]
+        selected = (historical_years >= first_year) & (historical_years <= last_year)
+        length = min(int(selected.sum()), years_in_simulation - start)
+        block = slice(paths + index * stress_paths, paths + (index + 1) * stress_paths)
+        stress_mask[block, start:start + length] = True
+        for key, values in zip(stress_rates, (equity_returns, bond_returns, inflation_rates)):
+            stress_rates[key][block, start:start + length] = values[selected][:length]
+
+    stressed.update(stress_rates)
+    stressed.update({'stress_mask': stress_mask, 'stress_names': list(names), 'stress_paths': stress_paths, 'stress_start_year': start})
+    return stressed
+
+
+def historical_sequence_arrays():
+    # Contiguous historical years with equity, bond and inflation rates, as decimal arrays
+    equity = {**historical_equity_returns, **historical_equity_gap_returns}
+    first_year = max(min(equity), min(historical_bond_returns), min(historical_inflation_rates))
+    last_year = min(max(equity), max(historical_bond_returns), max(historical_inflation_rates))
+    historical_years = np.arange(first_year, last_year + 1)
+    return (historical_years,
+            np.array([equity[year] for year in historical_years]) / 100.0,
+            np.array([historical_bond_returns[year] for year in historical_years]) / 100.0,
+            np.array([historical_inflation_rates[year] for year in historical_years]) / 100.0)
+
+
+def historical_return_arrays():
+    # Historical years with both equity and bond returns, as aligned arrays of decimal returns
+    historical_years = np.array(sorted(set(historical_equity_returns) & set(historical_bond_returns)))
+    equity_returns = np.array([historical_equity_returns[year] for year in historical_years]) / 100.0
+    bond_returns = np.array([historical_bond_returns[year] for year in historical_years]) / 100.0
+    return historical_years, equity_returns, bond_returns
+
+
+def scenario_returns(scenarios, stock_return_mean, stock_return_std, bond_return_mean, bond_return_std,
+                     inflation_mean, inflation_std):
+    # Turn standardized shocks into stock, bond and inflation rates for the given assumptions
+    simulation_type = scenarios['simulation_type']
+    stock_shocks = scenarios['stock_shocks']
+    bond_shocks = scenarios['bond_shocks']
+
+    # Per-path means and standard deviations when the scenario set samples them
+    stock_return_mean, stock_return_std = path_return_parameters(scenarios, 'stock', stock_return_mean, stock_return_std)
+    bond_return_mean, bond_return_std = path_return_parameters(scenarios, 'bond', bond_return_mean, bond_return_std)
+
+    if simulation_type == "Ensemble":
+        # Every row through its own model
+        stock_returns, bond_returns = np.empty(stock_shocks.shape), np.empty(bond_shocks.shape)
+        for index, model in enumerate(scenarios['ensemble_models']):
+            selected = scenarios['model_index'] == index
+            stock_returns[selected], bond_returns[selected] = _model_returns(
+                model, stock_shocks[selected], bond_shocks[selected],
+                _selected_rows(stock_return_mean, selected), _selected_rows(stock_return_std, selected),
+                _selected_rows(bond_return_mean, selected), _selected_rows(bond_return_std, selected))
+    else:
+        stock_returns, bond_returns = _model_returns(simulation_type, stock_shocks, bond_shocks, stock_return_mean, stock_return_std,
+                                                     bond_return_mean, bond_return_std)
+
+    if simulation_type == "Historical Sequence":
+        # Inflation as it happened
+        inflation_rates = scenarios['inflation_shocks']
+    else:
+        inflation_rates = _column(inflation_mean) + _column(inflation_std) * scenarios['inflation_shocks']
+
+    # Stress rows replay a historical sequence in place of the draws
+    if 'stress_mask' in scenarios:
+        stress_mask = scenarios['stress_mask']
+        stock_returns = np.where(stress_mask, scenarios['stress_stock_returns'], stock_returns)
+        bond_returns = np.where(stress_mask, scenarios['stress_bond_returns'], bond_returns)
+        inflation_rates = np.where(stress_mask, scenarios['stress_inflation_rates'], inflation_rates)
+
+    return stock_returns, bond_returns, inflation_rates
+
+
+def _model_returns(simulation_type, stock_shocks, bond_shocks, stock_return_mean, stock_return_std, bond_return_mean, bond_return_std):
+    # Stock and bond returns of one return model
+    if simulation_type == "Normal Distribution":
+        # Clip the values to the range of historical returns, as the per-path engine does
+        equity_return_min = min(historical_equity_returns.values()) / 100.0
+        equity_return_max = max(historical_equity_returns.values()) / 100.0
+        bond_return_min = min(historical_bond_returns.values()) / 100.0
+        bond_return_max = max(historical_bond_returns.values()) / 100.0
+        stock_returns = np.clip(stock_return_mean + stock_return_std * stock_shocks, equity_return_min, equity_return_max)
+        bond_returns = np.clip(bond_return_mean + bond_return_std * bond_shocks, bond_return_min, bond_return_max)
+
+    elif simulation_type == "Lognormal Distribution":
+        # Gross returns are lognormal with the requested mean and standard deviation
+        stock_returns = _lognormal_returns(stock_shocks, stock_return_mean, stock_return_std)
+        bond_returns = _lognormal_returns(bond_shocks, bond_return_mean, bond_return_std)
+
+    elif simulation_type == "Students-T Distribution":
+        stock_returns = stock_return_mean + stock_return_std * stock_shocks
+        bond_returns = bond_return_mean + bond_return_std * bond_shocks
+
+    else:
+        # Shocks already hold the sampled historical returns
+        stock_returns = stock_shocks
+        bond_returns = bond_shocks
+
+    return stock_returns, bond_returns
+
+
+def build_schedules(params, years_in_simulation):
+    # Deterministic yearly income and expense schedules, the array form of the calculate_* helpers.
+    # Each entry has years on the last axis and one row per parameter set when parameters are arrays.
+    current_year = datetime.now().year
+    year = np.arange(years_in_simulation)
+    calendar_year = current_year + year
+
+    current_age = _column(params['current_age']) + year
+    partner_current_age = _column(params['partner_current_age']) + year
+    retirement_age = _column(params['retirement_age'])
+    partner_retirement_age = _column(params['partner_retirement_age'])
+    inflation_mean = _column(params['inflation_mean'])
+
+    # Earnings stop at retirement
+    self_earnings = np.where(current_age < retirement_age,
+                             _column(params['annual_earnings']) * (1 + _column(params['self_yearly_increase'])) ** year, 0.0)
+    partner_earnings = np.where(partner_current_age < partner_retirement_age,
+                                _column(params['partner_earnings']) * (1 + _column(params['partner_yearly_increase'])) ** year, 0.0)
+
+    # Social security with COLA from the withdrawal start age
+    cola_rate = _column(params['cola_rate'])
+    withdrawal_start_age = _column(params['withdrawal_start_age'])
+    partner_withdrawal_start_age = _column(params['partner_withdrawal_start_age'])
+    self_ss = np.where(current_age >= withdrawal_start_age,
+                       _column(params['annual_social_security']) * (1 + cola_rate) ** (current_age - withdrawal_start_age), 0.0)
+    partner_ss = np.where(partner_current_age >= partner_withdrawal_start_age,
+                          _column(params['partner_social_security']) * (1 + cola_rate) ** (partner_current_age - partner_withdrawal_start_age), 0.0)
+
+    # Pensions start at retirement
+    self_pension = np.where(current_age >= retirement_age,
+                            _column(params['annual_pension']) * (1 + _column(params['self_pension_yearly_increase'])) ** (current_age - retirement_age), 0.0)
+    partner_pension = np.where(partner_current_age >= partner_retirement_age,
+                               _column(params['partner_pension']) * (1 + _column(params['partner_pension_yearly_increase'])) ** (partner_current_age - partner_retirement_age), 0.0)
+
+    # Rental income between the start and end years
+    rental_start = _column(params['rental_start'])
+    rental_income = np.where((rental_start <= calendar_year) & (calendar_year <= _column(params['rental_end'])),
+                             _column(params['rental_amt']) * (1 + _column(params['rental_yearly_increase'])) ** (calendar_year - rental_start), 0.0)
+
+    # Mortgage until paid off
+    mortgage = np.where(year < _column(params['mortgage_years_remaining']), _column(params['mortgage_payment']), 0.0)
+
+    # Bridge healthcare from the start age until Medicare at 65
+    self_healthcare_start_age = _column(params['self_healthcare_start_age'])
+    partner_healthcare_start_age = _column(params['partner_healthcare_start_age'])
+    self_health_expense = np.where((current_age >= self_healthcare_start_age) & (current_age < 65),
+                                   _column(params['self_healthcare_cost']) * (1 + inflation_mean) ** (current_age - self_healthcare_start_age), 0.0)
+    partner_health_expense = np.where((partner_current_age >= partner_healthcare_start_age) & (partner_current_age < 65),
+                                      _column(params['partner_healthcare_cost']) * (1 + inflation_mean) ** (partner_current_age - partner_healthcare_start_age), 0.0)
+
+    # Expense adjustments are carried forward - a later entry for the same year wins
+    yearly_expense_adjustment = np.zeros(years_in_simulation)
+    for adjust_year, adjust_amount in zip(params['adjust_expense_years'], params['adjust_expense_amounts']):
+        yearly_expense_adjustment = np.where(calendar_year == adjust_year, adjust_amount, yearly_expense_adjustment)
+
+    # One-time expenses and windfalls add up when they fall in the same year
+    one_time_expense = np.zeros(years_in_simulation)
+    for one_time_year, one_time_amount in zip(params['one_time_years'], params['one_time_amounts']):
+        one_time_expense = one_time_expense + np.where(calendar_year == one_time_year, one_time_amount, 0.0)
+
+    windfall_amount = np.zeros(years_in_simulation)
+    for windfall_year, windfall_amt in zip(params['windfall_years'], params['windfall_amounts']):
+        windfall_amount = windfall_amount + np.where(calendar_year == windfall_year, windfall_amt, 0.0)
+
+    downsize_proceeds = np.where(year == _column(params['years_until_downsize']), _column(params['residual_amount']), 0.0)
+
+    gross_income = self_earnings + partner_earnings + self_ss + partner_ss + self_pension + partner_pension + rental_income
+
+    return {
+        'calendar_year': calendar_year,
+        'self_age': current_age,
+        'partner_age': partner_current_age,
+        'self_earnings': self_earnings,
+        'partner_earnings': partner_earnings,
+        'self_ss': self_ss,
+        'partner_ss': partner_ss,
+        'self_pension': self_pension,
+        'partner_pension': partner_pension,
+        'rental_income': rental_income,
+        'gross_income': gross_income,
+        'mortgage': mortgage,
+        'self_health_expense': self_health_expense,
+        'partner_health_expense': partner_health_expense,
+        'healthcare_costs': self_health_expense + partner_health_expense,
+        'yearly_expense_adjustment': yearly_expense_adjustment,
+        'one_time_expense': one_time_expense,
+        'windfall_amount': windfall_amount,
+        'downsize_proceeds': downsize_proceeds,
+        'self_retired': current_age >= retirement_age,
+        'both_retired': (current_age >= retirement_age) & (partner_current_age >= partner_retirement_age)
+    }
+
+
+def simulate_batch(params, scenarios, withdrawal_strategy=None, allocation_rule=None, gradients=False):
+    # Run every row of the scenario set through the yearly cash flow rules at once.
+    # An allocation rule, allocation_rule(year, balances, context) -> stock share of each path,
+    # replaces the fixed stock percentage with a per-path allocation chosen every year.
+    # With gradients=True the derivatives of each path's balance with respect to the
+    # gradient_parameters are carried through the same year loop (see gradients.py).
+    rows, years_in_simulation = scenarios['stock_shocks'].shape
+    schedules = build_schedules(params, years_in_simulation)
+
+    # Sampled lifespans mask each path's schedules; after a path's horizon nothing changes
+    horizons = np.full(rows, years_in_simulation)
+    if 'self_death_age' in scenarios:
+        schedules = apply_lifespans(schedules, scenarios, _column(params.get('survivor_expense_ratio', 0.7)))
+        horizons = scenarios['horizon']
+    in_plan = _by_row(schedules.get('in_plan', np.ones(years_in_simulation, dtype=bool)), rows)
+    expense_factor = _by_row(schedules.get('expense_factor', np.ones(years_in_simulation)), rows)
+
+    stock_returns, bond_returns, inflation_rates = scenario_returns(
+        scenarios, params['stock_return_mean'], params['stock_return_std'],
+        params['bond_return_mean'], params['bond_return_std'],
+        params['inflation_mean'], params['inflation_std'])
+
+    stock_share = _column(params['stock_percentage']) / 100
+    bond_share = _column(params['bond_percentage']) / 100
+    # The year loop reads and writes one column at a time, so the per-year arrays are kept
+    # column-major (Fortran order) to make each column contiguous
+    portfolio_returns = np.array(np.broadcast_to(stock_share * stock_returns + bond_share * bond_returns, (rows, years_in_simulation)), order='F')
+    inflation_rates = np.asfortranarray(inflation_rates)
+
+    # Monthly mode spreads each year's flows over 12 months against a within-year return path
+    monthly = params.get('time_step', "Annual") == "Monthly"
+    monthly_seed = scenarios.get('monthly_seed', 0)
+    monthly_volatility = _flat(monthly_log_volatility(stock_share, bond_share, params))
+
+    tax_rate = _flat(params['tax_rate'])
+    inflation_mean = _flat(params['inflation_mean'])
+    annual_expense_decrease = _flat(params['annual_expense_decrease'])
+
+    # Progressive taxes treat social security separately from other income
+    tax_table = None
+    if params.get('tax_method', "Flat Rate") == "Progressive Brackets":
+        tax_table = tax_tables[params.get('filing_status', "Married Filing Jointly")]
+        social_security = _by_row(schedules['self_ss'] + schedules['partner_ss'], rows)
+        ordinary_income = _by_row(schedules['gross_income'] - schedules['self_ss'] - schedules['partner_ss'], rows)
+        seniors = _by_row((schedules['self_age'] >= 65).astype(int) + (schedules['partner_age'] >= 65), rows)
+
+    # Schedules broadcast to (rows, years) so a year is a column
+    gross_income = _by_row(schedules['gross_income'], rows)
+    shocks = 'shock_expense' in scenarios
+    if shocks:
+        earnings = _by_row(schedules['self_earnings'] + schedules['partner_earnings'], rows)
+    self_age = _by_row(schedules['self_age'], rows)
+    fixed_expense = _by_row(schedules['mortgage'] + schedules['healthcare_costs'] + schedules['one_time_expense'], rows)
+    yearly_expense_adjustment = _by_row(schedules['yearly_expense_adjustment'], rows)
+    additions = _by_row(schedules['downsize_proceeds'] + schedules['windfall_amount'], rows)
+    self_retired = _by_row(schedules['self_retired'], rows)
+    both_retired = _by_row(schedules['both_retired'], rows)
+
+    # Per-year results, one row per simulation path
+    beginning_balances = np.empty((rows, years_in_simulation), order='F')
+    ending_balances = np.empty((rows, years_in_simulation), order='F')
+    living_expenses = np.empty((rows, years_in_simulation), order='F')
+    total_expenses = np.empty((rows, years_in_simulation), order='F')
+    total_taxes = np.empty((rows, years_in_simulation), order='F')
+    portfolio_draws = np.empty((rows, years_in_simulation), order='F')
+    investment_returns = np.empty((rows, years_in_simulation), order='F')
+    gross_incomes = np.empty((rows, years_in_simulation), order='F')
+
+    # Multi-account mode keeps a (rows, accounts) balance array - taxable, tax-deferred and Roth -
+    # each with its own stock allocation, drained in the chosen withdrawal order.
+    # The account balances give the split of the initial savings, so an initial savings set
+    # per row (sweeps, goal seek) scales every account of the row.
+    balances = None
+    if params.get('account_balances') is not None:
+        account_split = np.asarray(params['account_balances'], dtype=float)
+        account_split = account_split / account_split.sum() if account_split.sum() > 0 else np.array([1.0, 0.0, 0.0])
+        balances = np.broadcast_to(_column(params['initial_savings']) * account_split, (rows, 3)).astype(float)
+        account_stock_percentages = params.get('account_stock_percentages')
+        if account_stock_percentages is None:
+            # Every account at the plan's stock percentage - (rows, 3) when it is set per row
+            account_stock_percentages = np.stack([_flat(params['stock_percentage'])] * 3, axis=-1)
+        account_stock_share = np.asarray(account_stock_percentages, dtype=float) / 100
+        account_monthly_volatility = monthly_log_volatility(account_stock_share, 1 - account_stock_share, params)
+        order = params.get('withdrawal_order', "Taxable, Tax-Deferred, Roth")
+        order = withdrawal_orders[order] if isinstance(order, str) else list(order)
+        account_balances = np.empty((rows, years_in_simulation, 3))
+        account_withdrawals = np.empty((rows, years_in_simulation, 3))
+        savings = balances.sum(axis=1)
+    else:
+        account_balances = account_withdrawals = None
+        savings = np.broadcast_to(_flat(params['initial_savings']), (rows,)).astype(float)
+    previous_annual_expense = np.broadcast_to(_flat(params['annual_expense']), (rows,)).astype(float)
+    previous_return = np.zeros(rows)
+
+    # Pathwise derivatives, for fixed spending from a single balance on annual steps with a flat tax
+    if gradients:
+        if (balances is not None or monthly or tax_table is not None
+                or withdrawal_strategy is not None or allocation_rule is not None):
+            raise ValueError("Gradients need fixed spending, a single balance, annual steps and the flat tax rate.")
+
+        # Returns and inflation moved by their means, through the same return model (clipping included)
+        step = 1e-6
+        stock_up, _, inflation_up = scenario_returns(scenarios, _flat(params['stock_return_mean']) + step, params['stock_return_std'],
+                                                     params['bond_return_mean'], params['bond_return_std'],
+                                                     _flat(params['inflation_mean']) + step, params['inflation_std'])
+        stock_down, _, inflation_down = scenario_returns(scenarios, _flat(params['stock_return_mean']) - step, params['stock_return_std'],
+                                                         params['bond_return_mean'], params['bond_return_std'],
+                                                         _flat(params['inflation_mean']) - step, params['inflation_std'])
+        inflation_derivative = np.broadcast_to((inflation_up - inflation_down) / (2 * step), (rows, years_in_simulation))
+        return_derivatives = {
+            'stock_return_mean': stock_share * (stock_up - stock_down) / (2 * step),
+            'stock_percentage': (stock_returns - bond_returns) / 100
+        }
+
+        # Healthcare costs are indexed to the inflation mean
+        healthcare_derivative = _by_row((schedules['self_health_expense'] * (schedules['self_age'] - _column(params['self_healthcare_start_age']))
+                                         + schedules['partner_health_expense'] * (schedules['partner_age'] - _column(params['partner_healthcare_start_age'])))
+                                        / (1 + _column(params['inflation_mean'])), rows)
+        fixed_expense_derivatives = {'inflation_mean': healthcare_derivative, 'inflation_schedule': healthcare_derivative}
+        expense_derivatives = {'annual_expense': np.ones(rows), 'inflation_mean': np.zeros(rows)}
+        savings_derivatives = {parameter: np.zeros(rows) for parameter in gradient_parameters + ['inflation_schedule']}
+
+    strategy_context = {
+        'initial_savings': savings.copy(),
+        'annual_expense': previous_annual_expense.copy(),
+        'years_in_simulation': years_in_simulation,
+        'inflation_mean': inflation_mean,
+        'state': {}
+    }
+    tracking = start_path_tracking(savings)
+    # Cost of the shock events of each path in today's dollars - extra expenses and lost earnings
+    shock_costs = np.zeros(rows) if shocks else None
+
+    for year in range(years_in_simulation):
+        # Inflate last year's expense, with the smile decrease once both are retired
+        previous_annual_expense = previous_annual_expense + yearly_expense_adjustment[:, year]
+        if year > 0:
+            expense_growth = 1 + inflation_rates[:, year] - annual_expense_decrease * both_retired[:, year]
+            if gradients:
+                expense_derivatives['annual_expense'] = expense_derivatives['annual_expense'] * expense_growth
+                expense_derivatives['inflation_mean'] = (expense_derivatives['inflation_mean'] * expense_growth 
+                                                         + previous_annual_expense * inflation_derivative[:, year])
+            previous_annual_expense = previous_annual_expense * expense_growth
+
+        # A withdrawal strategy replaces the inflation-adjusted living expense once retired
+        living_expense = previous_annual_expense
+        if withdrawal_strategy is not None:
+            strategy_context['year'] = year
+            # Years left on each path's own horizon, counting this one
+            strategy_context['years_remaining'] = np.maximum(horizons - year, 1)
+            strategy_context['inflation'] = inflation_rates[:, year]
+            strategy_context['retired'] = self_retired[:, year]
+            strategy_spending = withdrawal_strategy(year, savings, previous_return, previous_annual_expense, strategy_context)
+            living_expense = np.where(self_retired[:, year], strategy_spending, previous_annual_expense)
+
+        # A dynamic allocation sets this year's stock share of each path from its balance
+        if allocation_rule is not None:
+            strategy_context['year'] = year
+            year_stock_share = np.broadcast_to(np.clip(allocation_rule(year, savings, strategy_context), 0.0, 1.0), (rows,))
+            portfolio_returns[:, year] = year_stock_share * stock_returns[:, year] + (1 - year_stock_share) * bond_returns[:, year]
+            monthly_volatility = np.broadcast_to(monthly_log_volatility(year_stock_share[:, None], 1 - year_stock_share[:, None], params), (rows,))
+            if balances is not None:
+                account_stock_share = np.broadcast_to(year_stock_share[:, None], (rows, 3))
+                account_monthly_volatility = monthly_volatility[:, None]
+
+        total_expense = living_expense * expense_factor[:, year] + fixed_expense[:, year]
+
+        # Shock events of the year, read from the sparse event matrices
+        year_gross_income = gross_income[:, year]
+        if tax_table is not None:
+            year_ordinary_income = ordinary_income[:, year]
+        if shocks:
+            # Working-only losses stop at each row's own retirement age
+            earnings_loss = (_sparse_column(scenarios['shock_earnings_loss'], year, rows)
+                             + _sparse_column(scenarios['shock_working_earnings_loss'], year, rows) * ~self_retired[:, year])
+            lost_earnings = np.minimum(earnings_loss, 1.0) * earnings[:, year]
+            year_gross_income = year_gross_income - lost_earnings
+            if tax_table is not None:
+                year_ordinary_income = year_ordinary_income - lost_earnings
+            shock_expense = _sparse_column(scenarios['shock_expense'], year, rows) * (1 + inflation_mean) ** year * in_plan[:, year]
+            total_expense = total_expense + shock_expense
+            shock_costs = shock_costs + (shock_expense + lost_earnings) / (1 + inflation_mean) ** year
+        if balances is not None:
+            # Only tax-deferred withdrawals (RMDs first) are taxed as income
+            if tax_table is None:
+                def deferred_tax(deferred_withdrawal):
+                    return (year_gross_income + deferred_withdrawal) * tax_rate
+            else:
+                def deferred_tax(deferred_withdrawal):
+                    return income_tax(year_ordinary_income, social_security[:, year], deferred_withdrawal,
+                                      tax_table, (1 + inflation_mean) ** year, seniors[:, year])
+
+            rmd = required_minimum_distribution(balances[:, TAX_DEFERRED], self_age[:, year]) * in_plan[:, year]
+            withdrawals, deposits, total_tax = multi_account_draw(total_expense, year_gross_income, balances, rmd, order, deferred_tax)
+            portfolio_draw = withdrawals.sum(axis=1)
+
+            account_returns = account_stock_share * stock_returns[:, year, None] + (1 - account_stock_share) * bond_returns[:, year, None]
+            account_returns = account_returns * in_plan[:, year, None]
+            account_flows = deposits - withdrawals
+            if monthly:
+                noise = monthly_noise(monthly_seed, year, rows)[:, None, :]
+                growth, flow_growth = monthly_growth(account_returns, account_monthly_volatility, noise)
+                account_investment_returns = balances * (growth - 1) + account_flows * (flow_growth - 1)
+            else:
+                account_investment_returns = balances * account_returns
+            balances = balances + account_investment_returns + account_flows
+            investment_return = account_investment_returns.sum(axis=1)
+            ending_portfolio_value = balances.sum(axis=1)
+
+            account_balances[:, year] = balances
+            account_withdrawals[:, year] = withdrawals
+            balances[:, TAXABLE] += additions[:, year]
+        else:
+            if tax_table is None:
+                estimated_tax = year_gross_income * tax_rate
+                portfolio_draw, total_tax = calculate_portfolio_draw_batch(total_expense, year_gross_income, estimated_tax, tax_rate)
+            else:
+                # Brackets and deductions indexed to expected inflation
+                portfolio_draw, total_tax = progressive_portfolio_draw(total_expense, year_ordinary_income, social_security[:, year],
+                                                                       tax_table, (1 + inflation_mean) ** year, seniors[:, year])
+
+            net_flow = year_gross_income - total_expense - total_tax
+            if monthly:
+                noise = monthly_noise(monthly_seed, year, rows)
+                growth, flow_growth = monthly_growth(portfolio_returns[:, year] * in_plan[:, year], monthly_volatility, noise)
+                investment_return = savings * (growth - 1) + net_flow * (flow_growth - 1)
+            else:
+                investment_return = savings * portfolio_returns[:, year] * in_plan[:, year]
+            ending_portfolio_value = savings + investment_return + net_flow
+
+        beginning_balances[:, year] = savings
+        ending_balances[:, year] = ending_portfolio_value
+        living_expenses[:, year] = living_expense
+        total_expenses[:, year] = total_expense
+        total_taxes[:, year] = total_tax
+        portfolio_draws[:, year] = portfolio_draw
+        investment_returns[:, year] = investment_return
+        gross_incomes[:, year] = year_gross_income
+        track_year(tracking, year, ending_portfolio_value, in_plan[:, year], inflation_rates[:, year])
+
+        if gradients:
+            # Expenses drawn from the portfolio are grossed up by the tax rate
+            gross_up = 1 + tax_rate * (portfolio_draw > 0)
+            growth = 1 + portfolio_returns[:, year] * in_plan[:, year]
+            for parameter, derivative in savings_derivatives.items():
+                expense_derivative = expense_derivatives.get(parameter, 0.0) * expense_factor[:, year]
+                if parameter in fixed_expense_derivatives:
+                    expense_derivative = expense_derivative + fixed_expense_derivatives[parameter][:, year]
+                    if shocks:
+                        expense_derivative = expense_derivative + shock_expense * year / (1 + inflation_mean)
+                return_derivative = return_derivatives[parameter][:, year] * in_plan[:, year] if parameter in return_derivatives else 0.0
+                savings_derivatives[parameter] = derivative * growth + savings * return_derivative - expense_derivative * gross_up
+
+        # Next period's opening balance includes downsizing and windfalls
+        with np.errstate(divide='ignore', invalid='ignore'):
+            previous_return = np.where(savings != 0, investment_return / savings, portfolio_returns[:, year])
+        savings = ending_portfolio_value + additions[:, year]
+
+    success = savings >= 0
+
+    result = {
+        'success_count': int(success.sum()),
+        'failure_count': int((~success).sum()),
+        'success': success,
+        'final_savings': savings,
+        'years_in_simulation': years_in_simulation,
+        'horizons': horizons,
+        'inflation_mean': inflation_mean,
+        'schedules': schedules,
+        'beginning_balances': beginning_balances,
+        'ending_balances': ending_balances,
+        'living_expenses': living_expenses,
+        'total_expenses': total_expenses,
+        'total_taxes': total_taxes,
+        'portfolio_draws': portfolio_draws,
+        'investment_returns': investment_returns,
+        'gross_incomes': gross_incomes,
+        'account_balances': account_balances,
+        'account_withdrawals': account_withdrawals,
+        'portfolio_returns': portfolio_returns,
+        'stock_returns': stock_returns,
+        'bond_returns': bond_returns,
+        'inflation_rates': inflation_rates,
+        'start_years': scenarios.get('start_years'),
+        'shock_costs': shock_costs,
+        'stress_results': None,
+        'model_results': None,
+        'path_analytics': None,
+        'gradients': None
+    }
+
+    # Stress rows ride at the end of the batch and are reported on their own
+    paths = rows - len(scenarios.get('stress_names', [])) * scenarios.get('stress_paths', 0)
+    if paths < rows:
+        stress_results = _stress_results(result, scenarios, paths)
+        result = _monte_carlo_rows(result, rows, paths)
+        result['stress_results'] = stress_results
+
+    if 'model_index' in scenarios:
+        result['model_results'] = _model_results(result, scenarios, paths)
+
+    result['path_analytics'] = path_analytics(tracking, result['final_savings'], result['schedules']['self_age'])
+
+    if gradients:
+        scores = {parameter: score[:paths] for parameter, score in return_scores(scenarios, params).items()}
+        result['gradients'] = gradient_summary(result['final_savings'], {parameter: derivative[:paths] for parameter, derivative in savings_derivatives.items()},
+                                               scores)
+
+    return result
+
+
+def _stress_results(result, scenarios, paths):
+    # Outcome of each stress sequence, next to the same paths without the stress
+    stress_paths = scenarios['stress_paths']
+    baseline = slice(0, stress_paths)
+    stress_results = []
+    for index, name in enumerate(scenarios['stress_names']):
+        block = slice(paths + index * stress_paths, paths + (index + 1) * stress_paths)
+        success = result['success'][block].mean()
+        stress_results.append({
+            'name': name,
+            'start_year': scenarios['stress_start_year'],
+            'paths': stress_paths,
+            'success': float(success),
+            'success_standard_error': float(np.sqrt(success * (1 - success) / stress_paths)),
+            'baseline_success': float(result['success'][baseline].mean()),
+            'median_final_savings': float(np.median(result['final_savings'][block])),
+            'baseline_median_final_savings': float(np.median(result['final_savings'][baseline])),
+            'median_balances': np.median(result['ending_balances'][block], axis=0),
+            'baseline_median_balances': np.median(result['ending_balances'][baseline], axis=0)
+        })
+    return stress_results
+
+
+def _model_results(result, scenarios, paths):
+    # Outcome of each return model of an ensemble, and of their weighted mixture
+    model_index = scenarios['model_index'][:paths]
+    success, final_savings = result['success'], result['final_savings']
+    weights = np.asarray(scenarios['ensemble_weights'])
+    row_weights = weights[model_index] / np.bincount(model_index, minlength=len(weights))[model_index]
+
+    def summary(name, weight, selected, row_weight):
+        return {
+            'model': name,
+            'weight': float(weight),
+            'paths': int(selected.sum()),
+            'success_probability': float(row_weight[selected] @ success[selected] / row_weight[selected].sum()),
+            'final_savings_percentiles': {percentile: float(value) for percentile, value in
+                                          zip((10, 50, 90), _weighted_percentiles(final_savings[selected], row_weight[selected], (10, 50, 90)))}
+        }
+
+    models = [summary(model, weights[index], model_index == index, np.ones(paths))
+              for index, model in enumerate(scenarios['ensemble_models'])]
+    return {'models': models, 'mixture': summary("Weighted Mixture", 1.0, np.ones(paths, dtype=bool), row_weights)}
+
+
+def _weighted_percentiles(values, weights, percentiles):
+    # Percentiles of weighted samples (lower value at each cumulative weight)
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    positions = np.searchsorted(cumulative, np.asarray(percentiles) / 100 * cumulative[-1])
+    return values[order][np.minimum(positions, len(values) - 1)]
+
+
+def _monte_carlo_rows(result, rows, paths):
+    # Result with only the first paths rows; per-row schedules are (rows, years)
+    def rows_of(value, per_row_ndim=1):
+        if isinstance(value, np.ndarray) and value.ndim >= per_row_ndim and value.shape[0] == rows:
+            return value[:paths]
+        return value
+    trimmed = {key: rows_of(value) for key, value in result.items()}
+    trimmed['schedules'] = {key: rows_of(value, 2) for key, value in result['schedules'].items()}
+    trimmed['success_count'] = int(trimmed['success'].sum())
+    trimmed['failure_count'] = int((~trimmed['success']).sum())
+    return trimmed
+
+
+def _sparse_column(matrix, year, rows):
+    # One year of a (rows, years) CSC event matrix as a dense vector
+    column = np.zeros(rows)
+    start, end = matrix.indptr[year], matrix.indptr[year + 1]
+    column[matrix.indices[start:end]] = matrix.data[start:end]
+    return column
+
+
+def monthly_log_volatility(stock_share, bond_share, params):
+    # Monthly volatility of log returns for a mix of stocks and bonds
+    annual_volatility = np.sqrt((stock_share * _column(params['stock_return_std'])) ** 2 + (bond_share * _column(params['bond_return_std'])) ** 2)
+    annual_mean = stock_share * _column(params['stock_return_mean']) + bond_share * _column(params['bond_return_mean'])
+    return np.squeeze(annual_volatility / (1 + annual_mean)) / np.sqrt(12)
+
+
+def monthly_noise(monthly_seed, year, rows):
+    # Standard normal noise for the 12 months of a year, reproducible from the scenario seed
+    return np.random.default_rng([monthly_seed, year]).standard_normal((rows, 12))
+
+
+def monthly_growth(annual_returns, monthly_volatility, noise):
+    # Split annual returns into 12 monthly returns with a Brownian bridge - monthly log returns
+    # move with the given volatility but always compound back to the annual return, so the
+    # monthly model keeps the annual return distribution.
+    # Returns the growth of a starting balance over the year and the average growth of a flow
+    # spread evenly over the months (each month's flow earns the returns of the months after it).
+    annual_log_return = np.log(np.maximum(1 + annual_returns, 1e-6))
+    centered_noise = noise - noise.mean(axis=-1, keepdims=True)
+    monthly_log_returns = annual_log_return[..., None] / 12 + np.asarray(monthly_volatility)[..., None] * centered_noise
+    cumulative = np.cumsum(monthly_log_returns, axis=-1)
+    growth_after_month = np.exp(cumulative[..., -1:] - cumulative)
+    return np.exp(cumulative[..., -1]), growth_after_month.mean(axis=-1)
+
+
+def calculate_portfolio_draw_batch(total_expense, gross_income, estimated_tax, tax_rate):
+    # Array form of calculate_portfolio_draw - the shortfall after taxed income is grossed up by the tax rate
+    shortfall = np.maximum(total_expense - (gross_income - estimated_tax), 0.0)
+    portfolio_tax = shortfall * tax_rate
+    return shortfall + portfolio_tax, estimated_tax + portfolio_tax
+
+
+def percentile_simulation_ids(result, percentiles):
+    # Simulation IDs at the given percentiles of the final year's ending portfolio value
+    order = np.argsort(result['ending_balances'][:, -1], kind='stable')
+    n = len(order)
+    return [int(order[max(int(percentile / 100 * n) - 1, 0)]) for percentile in percentiles]
+
+
+def build_cash_flows(result, sim_id):
+    # Yearly cash flow entries for one simulation path, in the same format as monte_carlo_simulation
+    schedules = result['schedules']
+    rows = result['ending_balances'].shape[0]
+
+    def path(values):
+        return _by_row(values, rows)[sim_id]
+
+    beginning = result['beginning_balances'][sim_id]
+    ending = result['ending_balances'][sim_id]
+    draws = result['portfolio_draws'][sim_id]
+    investment_returns = result['investment_returns'][sim_id]
+    self_age, partner_age = path(schedules['self_age']), path(schedules['partner_age'])
+    self_ss, partner_ss = path(schedules['self_ss']), path(schedules['partner_ss'])
+    self_pension, partner_pension = path(schedules['self_pension']), path(schedules['partner_pension'])
+    self_earnings, partner_earnings = path(schedules['self_earnings']), path(schedules['partner_earnings'])
+    # Income as realized on the path - earnings shocks cut both earners' pay by the same fraction
+    gross_income = result['gross_incomes'][sim_id]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        earnings_kept = np.where(self_earnings + partner_earnings > 0,
+                                 1 - (path(schedules['gross_income']) - gross_income) / (self_earnings + partner_earnings), 1.0)
+    self_earnings, partner_earnings = self_earnings * earnings_kept, partner_earnings * earnings_kept
+    self_health, partner_health = path(schedules['self_health_expense']), path(schedules['partner_health_expense'])
+    rental_income, mortgage = path(schedules['rental_income']), path(schedules['mortgage'])
+    healthcare_costs = path(schedules['healthcare_costs'])
+    downsize_proceeds = path(schedules['downsize_proceeds'])
+    yearly_expense_adjustment = path(schedules['yearly_expense_adjustment'])
+    one_time_expense, windfall_amount = path(schedules['one_time_expense']), path(schedules['windfall_amount'])
+    current_year = int(schedules['calendar_year'][0])
+
+    cash_flows = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for year in range(int(result['horizons'][sim_id])):
+            end_value_at_current_currency = ending[year] / ((1 + result['inflation_mean']) ** (year + 1))
+            cash_flow_entry = create_cash_flow_entry(
+                current_year, year, int(self_age[year]), int(partner_age[year]),
+                beginning[year], ending[year], end_value_at_current_currency,
+                gross_income[year], self_pension[year], partner_pension[year], rental_income[year],
+                result['total_expenses'][sim_id, year], result['total_taxes'][sim_id, year],
+                draws[year], draws[year] / ending[year],
+                investment_returns[year], investment_returns[year] / beginning[year],
+                self_ss[year], partner_ss[year], downsize_proceeds[year], mortgage[year], healthcare_costs[year],
+                self_earnings[year], partner_earnings[year], self_health[year], partner_health[year],
+                yearly_expense_adjustment[year], one_time_expense[year], windfall_amount[year]
+            )
+            cash_flow_entry['Simulation ID'] = sim_id
+            cash_flows.append(cash_flow_entry)
+
+    return cash_flows
+
+
+def _column(value):
+    # Scalars broadcast as-is, per-row parameter arrays become columns against the year axis
+    value = np.asarray(value, dtype=float)
+    return value[:, None] if value.ndim == 1 else value
+
+
+def _flat(value):
+    # Scalars stay scalars, per-row parameter arrays stay one value per row
+    return np.asarray(value, dtype=float)
+
+
+def _selected_rows(value, selected):
+    # The selected rows of a per-row (rows, 1) column; scalars apply to every row
+    value = np.asarray(value, dtype=float)
+    return value[selected] if value.ndim == 2 and value.shape[0] == len(selected) else value
+
+
+def _by_row(values, rows):
+    return np.broadcast_to(values, (rows, np.shape(values)[-1]))
+
+
+def _lognormal_returns(shocks, mean, std):
+    sigma_squared = np.log(1 + (std / (1 + mean)) ** 2)
+    mu = np.log(1 + mean) - sigma_squared / 2
+    return np.exp(mu + np.sqrt(sigma_squared) * shocks) - 1
@@ -0,0 +1,71 @@
+import numpy as np
+
+from simulations.simulation_batch import draw_plan_scenarios
+from simulations.sweeps import evaluate_variants
+
+
+# Social security claiming rules (born 1960 or later)
+full_retirement_age = 67
+earliest_claiming_age = 62
+latest_claiming_age = 70
+
+
+def claiming_adjustment(claim_age, full_retirement_age=full_retirement_age):
+    # Benefit as a fraction of the full-retirement-age benefit when claimed at claim_age
+    #   - early: 5/9% less per month for the first 36 months, 5/12% per month beyond
+    #   - delayed: 8% more per year up to age 70
+    claim_age = np.clip(np.asarray(claim_age, dtype=float), earliest_claiming_age, latest_claiming_age)
+    months_early = np.maximum(full_retirement_age - claim_age, 0.0) * 12
+    months_late = np.maximum(claim_age - full_retirement_age, 0.0) * 12
+    reduction = np.minimum(months_early, 36) * 5 / 900 + np.maximum(months_early - 36, 0.0) * 5 / 1200
+    return 1 - reduction + months_late * 2 / 300
+
+
+# Claiming-age search
+#
+# Every pair of claiming ages from 62 to 70 (those not already past) runs as one batch on one
+# shared scenario set, with each person's benefit scaled for early or delayed claiming by
+# with_parameter_values.  The entered benefits are the full-retirement-age amounts.
+
+def claiming_age_search(params, withdrawal_strategy=None, allocation_rule=None, simulations=None, seed=None,
+                        max_rows=200_000):
+    self_ages = _claiming_ages(params['current_age'])
+    partner_ages = _claiming_ages(params['partner_current_age'])
+    self_grid, partner_grid = np.meshgrid(self_ages, partner_ages)
+
+    variants = {
+        'withdrawal_start_age': self_grid.ravel(),
+        'partner_withdrawal_start_age': partner_grid.ravel()
+    }
+    scenarios = draw_plan_scenarios(params, simulations, seed=seed)
+    success, median_final = evaluate_variants(params, variants, scenarios, withdrawal_strategy, allocation_rule, max_rows)
+    success = success.reshape(self_grid.shape)
+    median_final = median_final.reshape(self_grid.shape)
+
+    # Ties on success go to the larger median balance
+    best_success = np.lexsort((median_final.ravel(), success.ravel()))[-1]
+    best_wealth = int(np.argmax(median_final))
+
+    def choice(index):
+        partner_index, self_index = np.unravel_index(index, self_grid.shape)
+        return {
+            'self_age': int(self_ages[self_index]),
+            'partner_age': int(partner_ages[partner_index]),
+            'success': float(success[partner_index, self_index]),
+            'median_final_savings': float(median_final[partner_index, self_index])
+        }
+
+    return {
+        'self_ages': self_ages,
+        'partner_ages': partner_ages,
+        'success': success,
+        'median_final_savings': median_final,
+        'best_success': choice(best_success),
+        'best_wealth': choice(best_wealth)
+    }
+
+
+def _claiming_ages(current_age):
+    # Claiming ages still open at the current age
+    first = min(max(int(np.ceil(current_age)), earliest_claiming_age), latest_claiming_age)
+    return np.arange(first, latest_claiming_age + 1)
@@ -0,0 +1,97 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch, tile_scenarios
+
+
+# Inputs that can be swept, by display name
+sweep_inputs = {
+    "Retirement Age": 'retirement_age',
+    "Stock Percentage": 'stock_percentage',
+    "Annual Expense": 'annual_expense',
+    "Initial Savings": 'initial_savings',
+    "Social Security Start Age": 'withdrawal_start_age',
+    "Stock Return Mean": 'stock_return_mean',
+    "Inflation Mean": 'inflation_mean'
+}
+
+
+def with_parameter_values(params, values):
+    # Parameter set with some inputs replaced (scalars or one value per row),
+    # keeping the stock and bond shares summing to 100.  A claiming age set here pays the
+    # entered (full-retirement-age) benefit adjusted for early or delayed claiming, as in the
+    # claiming-age search.
+    # (social_security imports this module, so its helper is imported here rather than at the top)
+    from simulations.social_security import claiming_adjustment
+    updated = dict(params)
+    updated.update(values)
+    if 'stock_percentage' in values:
+        updated['bond_percentage'] = 100 - np.asarray(values['stock_percentage'], dtype=float)
+    for age_parameter, benefit_parameter in (('withdrawal_start_age', 'annual_social_security'),
+                                             ('partner_withdrawal_start_age', 'partner_social_security')):
+        if age_parameter in values and benefit_parameter not in values:
+            updated[benefit_parameter] = params[benefit_parameter] * claiming_adjustment(values[age_parameter])
+    return updated
+
+
+def evaluate_variants(params, variants, scenarios, withdrawal_strategy=None, allocation_rule=None,
+                      max_rows=200_000, workers=1):
+    # Success rate and median final balance of each parameter variant on the same scenarios.
+    #   variants - {parameter: values} with one value per variant for each swept parameter
+    # Variants run as copies of the scenario set in one batch, split into chunks of at most
+    # max_rows rows to bound memory; with workers > 1 the chunks run on parallel threads
+    # (numpy releases the GIL in the array operations that dominate a batch).
+    variants = {parameter: np.asarray(values, dtype=float) for parameter, values in variants.items()}
+    variant_count = len(next(iter(variants.values())))
+    paths = scenarios['stock_shocks'].shape[0]
+    chunk_size = max(max_rows // paths, 1)
+    chunks = [np.arange(start, min(start + chunk_size, variant_count)) for start in range(0, variant_count, chunk_size)]
+
+    def run_chunk(chunk):
+        chunk_values = {parameter: np.repeat(values[chunk], paths) for parameter, values in variants.items()}
+        result = simulate_batch(with_parameter_values(params, chunk_values), tile_scenarios(scenarios, len(chunk)),
+                                withdrawal_strategy, allocation_rule)
+        return (result['success'].reshape(len(chunk), paths).mean(axis=1),
+                np.median(result['final_savings'].reshape(len(chunk), paths), axis=1))
+
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(run_chunk, chunks))
+    else:
+        outcomes = [run_chunk(chunk) for chunk in chunks]
+
+    return np.concatenate([success for success, median in outcomes]), np.concatenate([median for success, median in outcomes])
+
+
+def grid_sweep(params, x_parameter, x_values, y_parameter, y_values, withdrawal_strategy=None, allocation_rule=None,
+               simulations=None, seed=None, max_rows=200_000, workers=1):
+    # Success rate over every combination of two inputs, all sharing one scenario set.
+    # Tables are indexed [y, x].
+    x_values = np.asarray(x_values, dtype=float)
+    y_values = np.asarray(y_values, dtype=float)
+    x_grid, y_grid = np.meshgrid(x_values, y_values)
+
+    scenarios = draw_plan_scenarios(params, simulations, seed=seed)
+    success, median_final = evaluate_variants(params, {x_parameter: x_grid.ravel(), y_parameter: y_grid.ravel()}, scenarios,
+                                              withdrawal_strategy, allocation_rule, max_rows, workers)
+
+    return {
+        'x_parameter': x_parameter,
+        'y_parameter': y_parameter,
+        'x_values': x_values,
+        'y_values': y_values,
+        'success': success.reshape(x_grid.shape),
+        'median_final_savings': median_final.reshape(x_grid.shape)
+    }
+
+
+def default_sweep_range(params, parameter):
+    # Starting range for a sweep axis around the current value of the input
+    value = params[parameter]
+    if parameter in ('retirement_age', 'withdrawal_start_age'):
+        return max(value - 5, params['current_age']), value + 4
+    if parameter == 'stock_percentage':
+        return 10.0, 100.0
+    if parameter in ('stock_return_mean', 'inflation_mean'):
+        return value - 0.02, value + 0.025
+    return value * 0.55, value * 1.45
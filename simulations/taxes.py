@@ -0,0 +1,72 @@
+import numpy as np
+
+
+# Federal income tax tables (2024) - bracket lower bounds, marginal rates and standard deduction
+tax_tables = {
+    "Married Filing Jointly": {
+        'thresholds': np.array([0, 23200, 94300, 201050, 383900, 487450, 731200], dtype=float),
+        'rates': np.array([0.10, 0.12, 0.22, 0.24, 0.32, 0.35, 0.37]),
+        'standard_deduction': 29200,
+        'senior_deduction': 1550,       # additional deduction per person 65 or older
+        'ss_base_amounts': (32000, 44000)
+    },
+    "Single": {
+        'thresholds': np.array([0, 11600, 47150, 100525, 191950, 243725, 609350], dtype=float),
+        'rates': np.array([0.10, 0.12, 0.22, 0.24, 0.32, 0.35, 0.37]),
+        'standard_deduction': 14600,
+        'senior_deduction': 1950,
+        'ss_base_amounts': (25000, 34000)
+    }
+}
+
+
+def bracket_tax(taxable_income, thresholds, rates):
+    # Tax on each taxable income from the bracket table - one searchsorted over all paths
+    bracket_tax_at_thresholds = np.concatenate(([0.0], np.cumsum(np.diff(thresholds) * rates[:-1])))
+    taxable_income = np.maximum(taxable_income, 0.0)
+    bracket = np.searchsorted(thresholds, taxable_income, side='right') - 1
+    return bracket_tax_at_thresholds[bracket] + (taxable_income - thresholds[bracket]) * rates[bracket]
+
+
+def taxable_social_security(social_security, other_income, ss_base_amounts):
+    # Up to 85% of benefits are taxable depending on provisional income (not indexed to inflation)
+    first_base, second_base = ss_base_amounts
+    provisional_income = other_income + 0.5 * social_security
+    first_tier = np.minimum(0.5 * np.maximum(provisional_income - first_base, 0.0), 0.5 * social_security)
+    second_tier = np.minimum(0.85 * np.maximum(provisional_income - second_base, 0.0) + np.minimum(first_tier, 0.5 * (second_base - first_base)),
+                             0.85 * social_security)
+    return np.where(provisional_income > second_base, second_tier, first_tier)
+
+
+def income_tax(ordinary_income, social_security, withdrawal, tax_table, index_factor=1.0, seniors=0):
+    # Total tax for the year - earnings, pensions, rental income and portfolio withdrawals are
+    # ordinary income, social security is taxed through the provisional income rules.
+    # Brackets and deductions grow with index_factor; taxing income / index_factor against the
+    # base table and scaling back gives the same result as indexing every threshold.
+    other_income = ordinary_income + withdrawal
+    agi = other_income + taxable_social_security(social_security, other_income, tax_table['ss_base_amounts'])
+    deduction = (tax_table['standard_deduction'] + seniors * tax_table['senior_deduction']) * index_factor
+    taxable_income = np.maximum(agi - deduction, 0.0)
+    return bracket_tax(taxable_income / index_factor, tax_table['thresholds'], tax_table['rates']) * index_factor
+
+
+def progressive_portfolio_draw(total_expense, ordinary_income, social_security, tax_table, index_factor=1.0, seniors=0,
+                               tolerance=0.01, max_iterations=50):
+    # Gross withdrawal that covers expenses after tax, for all paths at once.
+    # Solves draw = expense - income + tax(draw) by fixed-point iteration; the marginal
+    # rate on a withdrawal stays below 100%, so the iteration contracts.
+    gross_income = ordinary_income + social_security
+    base_tax = income_tax(ordinary_income, social_security, 0.0, tax_table, index_factor, seniors)
+    portfolio_draw = np.maximum(total_expense - gross_income + base_tax, 0.0)
+    total_tax = base_tax
+
+    for _ in range(max_iterations):
+        total_tax = income_tax(ordinary_income, social_security, portfolio_draw, tax_table, index_factor, seniors)
+        next_draw = np.where(portfolio_draw > 0, np.maximum(total_expense - gross_income + total_tax, 0.0), 0.0)
+        converged = np.max(np.abs(next_draw - portfolio_draw), initial=0.0) < tolerance
+        portfolio_draw = next_draw
+        if converged:
+            break
+
+    total_tax = income_tax(ordinary_income, social_security, portfolio_draw, tax_table, index_factor, seniors)
+    return portfolio_draw, total_tax
@@ -0,0 +1,95 @@
+import numpy as np
+
+
+# Withdrawal strategies for the batched engine
+#
+# Each strategy builder returns a rule called once per simulated year with arrays covering
+# every path:  rule(year, balances, returns, spending, context) -> spending
+#   balances - beginning-of-year portfolio balance of each path
+#   returns  - last year's portfolio return rate of each path (0 in the first year)
+#   spending - the inflation-adjusted living expense the fixed plan would spend
+#   context  - initial values, this year's inflation, years remaining and which paths
+#              are retired, plus a 'state' dict where a rule keeps its own per-path
+#              arrays between years
+# The engine applies the rule from the retirement age onward; mortgage, healthcare and
+# one-time expenses are added on top of the spending it returns.
+
+def fixed_spending():
+    # Spend the inflation-adjusted expense regardless of the portfolio (the default plan)
+    def rule(year, balances, returns, spending, context):
+        return spending
+    return rule
+
+
+def constant_percentage(withdrawal_rate=0.04):
+    # Spend a fixed percentage of the current portfolio balance
+    def rule(year, balances, returns, spending, context):
+        return withdrawal_rate * np.maximum(balances, 0.0)
+    return rule
+
+
+def guyton_klinger(upper_guardrail=0.20, lower_guardrail=0.20, adjustment=0.10, preservation_cutoff_years=15):
+    # Guyton-Klinger decision rules
+    #   - inflation raise is skipped after a losing year when the withdrawal rate is above the initial rate
+    #   - capital preservation: cut spending when the rate rises above the upper guardrail,
+    #     except in the last preservation_cutoff_years years of the plan
+    #   - prosperity: raise spending when the rate falls below the lower guardrail
+    def rule(year, balances, returns, spending, context):
+        state = context['state']
+        if 'previous_spending' not in state:
+            state['previous_spending'] = np.full(len(balances), np.nan)
+            state['initial_rate'] = np.full(len(balances), np.nan)
+
+        positive_balance = balances > 0
+        safe_balances = np.where(positive_balance, balances, 1.0)
+        previous_spending = state['previous_spending']
+
+        # The first retirement year of a path sets its initial withdrawal rate
+        starting = context['retired'] & np.isnan(previous_spending)
+        initial_rate = np.where(starting, np.where(positive_balance, spending / safe_balances, np.inf), state['initial_rate'])
+
+        previous_rate = np.where(positive_balance, previous_spending / safe_balances, np.inf)
+        skip_inflation = (returns < 0) & (previous_rate > initial_rate)
+        new_spending = np.where(skip_inflation, previous_spending, previous_spending * (1 + context['inflation']))
+
+        current_rate = np.where(positive_balance, new_spending / safe_balances, np.inf)
+        preserve = (current_rate > initial_rate * (1 + upper_guardrail)) & (context['years_remaining'] > preservation_cutoff_years)
+        prosper = current_rate < initial_rate * (1 - lower_guardrail)
+        new_spending = np.where(preserve, new_spending * (1 - adjustment), new_spending)
+        new_spending = np.where(prosper, new_spending * (1 + adjustment), new_spending)
+        new_spending = np.where(starting, spending, new_spending)
+
+        state['initial_rate'] = initial_rate
+        state['previous_spending'] = np.where(context['retired'], new_spending, np.nan)
+        return np.where(context['retired'], new_spending, spending)
+    return rule
+
+
+def variable_percentage(expected_real_return=0.03):
+    # Variable percentage withdrawal - the amortization payment that would spend the
+    # balance down evenly over the remaining years at the expected real return
+    def rule(year, balances, returns, spending, context):
+        years_remaining = context['years_remaining']
+        if expected_real_return == 0:
+            rate = 1.0 / years_remaining
+        else:
+            rate = expected_real_return / (1 - (1 + expected_real_return) ** -years_remaining)
+        return rate * np.maximum(balances, 0.0)
+    return rule
+
+
+def floor_ceiling(withdrawal_rate=0.04, floor=0.85, ceiling=1.25):
+    # Percentage of the portfolio, kept between a floor and a ceiling of the inflation-adjusted expense
+    def rule(year, balances, returns, spending, context):
+        return np.clip(withdrawal_rate * np.maximum(balances, 0.0), floor * spending, ceiling * spending)
+    return rule
+
+
+# Strategy builders by display name
+withdrawal_strategies = {
+    "Fixed (Inflation Adjusted)": fixed_spending,
+    "Constant Percentage": constant_percentage,
+    "Guyton-Klinger Guardrails": guyton_klinger,
+    "Variable Percentage (VPW)": variable_percentage,
+    "Floor and Ceiling": floor_ceiling
+}
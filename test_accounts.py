@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from simulations.accounts import (TAXABLE, TAX_DEFERRED, ROTH, withdrawal_orders, rmd_start_age, uniform_lifetime_table,
+                                  required_minimum_distribution, drain_accounts, multi_account_draw)
+
+
+def test_required_minimum_distributions_start_at_73():
+    balances = np.full(4, 1000000.0)
+    rmd = required_minimum_distribution(balances, [72, 73, 80, 100])
+    assert rmd_start_age == 73
+    assert rmd[0] == 0.0
+    assert rmd[1:] == pytest.approx(1000000.0 / np.array([26.5, 20.2, 6.4]))
+
+
+def test_uniform_lifetime_table_shrinks_with_age():
+    divisors = [uniform_lifetime_table[age] for age in sorted(uniform_lifetime_table)]
+    assert np.all(np.diff(divisors) < 0)
+    assert required_minimum_distribution(np.array([-50000.0]), [80])[0] == 0.0
+
+
+def test_accounts_drain_in_order():
+    balances = np.array([[30000.0, 100000.0, 50000.0], [30000.0, 100000.0, 50000.0]])
+    withdrawals = drain_accounts(balances, np.array([20000.0, 60000.0]), withdrawal_orders["Taxable, Tax-Deferred, Roth"])
+    assert withdrawals[0].tolist() == [20000.0, 0.0, 0.0]
+    assert withdrawals[1].tolist() == [30000.0, 30000.0, 0.0]
+    withdrawals = drain_accounts(balances, np.array([20000.0, 60000.0]), withdrawal_orders["Taxable, Roth, Tax-Deferred"])
+    assert withdrawals[1].tolist() == [30000.0, 0.0, 30000.0]
+
+
+def test_multi_account_draw_pays_tax_on_deferred_withdrawals():
+    balances = np.array([[0.0, 500000.0, 100000.0], [200000.0, 500000.0, 100000.0]])
+    rmd = np.array([20000.0, 20000.0])
+    tax_rate = 0.2
+    withdrawals, deposits, total_tax = multi_account_draw(np.full(2, 100000.0), np.full(2, 30000.0), balances, rmd,
+                                                          withdrawal_orders["Taxable, Tax-Deferred, Roth"],
+                                                          lambda deferred: tax_rate * deferred)
+    assert total_tax == pytest.approx(tax_rate * withdrawals[:, TAX_DEFERRED])
+    # Expenses and tax are covered, with nothing left over
+    assert 30000.0 + withdrawals.sum(axis=1) - total_tax == pytest.approx(np.full(2, 100000.0), abs=0.1)
+    # Without a taxable balance the tax-deferred account is grossed up for its own tax
+    assert withdrawals[0, TAX_DEFERRED] == pytest.approx(20000.0 + (100000.0 - 30000.0 + tax_rate * 20000.0 - 20000.0) / (1 - tax_rate), rel=1e-4)
+    assert withdrawals[1, TAXABLE] > 0 and withdrawals[1, ROTH] == 0
+    assert np.allclose(deposits, 0.0, atol=0.1)
@@ -0,0 +1,40 @@
+import os
+import numpy as np
+import pytest
+
+from simulations.calibration import calibrate_return_models, calibrated_presets
+from simulations.simulation_batch import historical_sequence_arrays
+
+
+def test_calibration_is_cached_by_data_hash(tmp_path):
+    calibration = calibrate_return_models(cache_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == [f"{calibration['data_hash']}.json"]
+    assert calibrate_return_models(cache_dir=str(tmp_path)) == calibration
+
+
+def test_normal_fit_matches_the_historical_moments(tmp_path):
+    calibration = calibrate_return_models(cache_dir=str(tmp_path))
+    historical_years, equity_returns, bond_returns, inflation_rates = historical_sequence_arrays()
+    assert calibration['observations'] == len(historical_years)
+    assert calibration['first_year'] == historical_years[0] and calibration['last_year'] == historical_years[-1]
+    for series, name in ((equity_returns, 'stock'), (bond_returns, 'bond'), (inflation_rates, 'inflation')):
+        assert calibration['normal'][name]['mean'] == pytest.approx(np.mean(series))
+        assert calibration['normal'][name]['std'] == pytest.approx(np.std(series))
+
+
+def test_students_t_and_regime_fits(tmp_path):
+    calibration = calibrate_return_models(cache_dir=str(tmp_path))
+    students_t = calibration['students_t']
+    # The Students-T fit nests the normal as its degrees of freedom grow
+    assert students_t['stock']['own_log_likelihood'] >= calibration['normal']['stock']['log_likelihood'] - 0.05
+    regimes = calibration['regime']
+    assert np.allclose(np.sum(regimes['transition'], axis=1), 1.0)
+    assert sum(regime['long_run_share'] for regime in regimes['regimes']) == pytest.approx(1.0)
+
+
+def test_presets_are_engine_inputs(tmp_path):
+    presets = calibrated_presets(calibrate_return_models(cache_dir=str(tmp_path)))
+    assert set(presets) == {"Normal Distribution", "Students-T Distribution", "Lognormal Distribution"}
+    assert presets["Students-T Distribution"]['t_degrees_of_freedom'] > 2
+    for preset in presets.values():
+        assert preset['stock_return_std'] > 0 and preset['inflation_std'] > 0
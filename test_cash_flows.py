@@ -0,0 +1,20 @@
+import numpy as np
+
+from simulations.simulation_batch import batch_monte_carlo_simulation, build_cash_flows
+
+
+def test_gross_earnings_show_the_earnings_lost_to_shocks(plan):
+    result = batch_monte_carlo_simulation(**dict(plan, simulations=2000), shock_events=["Job Loss"], seed=5)
+    lost = result['schedules']['gross_income'] - result['gross_incomes']
+    sim_id, year = np.argwhere(lost > 1.0)[0]
+
+    entry = build_cash_flows(result, sim_id)[year]
+    assert entry['Gross Earnings'] == result['gross_incomes'][sim_id, year]
+    assert np.isclose(entry['Self Gross Earning'] + entry['Partner Gross Earning'],
+                      result['schedules']['self_earnings'][year] + result['schedules']['partner_earnings'][year] - lost[sim_id, year])
+
+
+def test_gross_earnings_without_shocks_follow_the_schedule(plan):
+    result = batch_monte_carlo_simulation(**plan, seed=5)
+    cash_flows = build_cash_flows(result, 0)
+    assert [entry['Gross Earnings'] for entry in cash_flows] == list(result['schedules']['gross_income'][:len(cash_flows)])
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from simulations.simulation_batch import batch_monte_carlo_simulation, draw_plan_scenarios
+
+
+models = ["Normal Distribution", "Students-T Distribution", "Empirical Distribution"]
+
+
+def test_rows_follow_the_weights(plan):
+    scenarios = draw_plan_scenarios(dict(plan, simulation_type="Ensemble", ensemble_models=models, ensemble_weights=[2, 1, 1]), 400)
+    assert np.bincount(scenarios['model_index']).tolist() == [600, 300, 300]
+    assert scenarios['ensemble_weights'] == pytest.approx([0.5, 0.25, 0.25])
+    assert scenarios['stock_shocks'].shape[0] == 1200
+
+    # A model with zero weight is left out
+    scenarios = draw_plan_scenarios(dict(plan, simulation_type="Ensemble", ensemble_models=models, ensemble_weights=[1, 0, 3]), 400)
+    assert scenarios['ensemble_models'] == ["Normal Distribution", "Empirical Distribution"]
+    assert np.bincount(scenarios['model_index']).tolist() == [200, 600]
+
+
+def test_pooled_success_is_the_weighted_mixture(plan):
+    result = batch_monte_carlo_simulation(**dict(plan, simulation_type="Ensemble", simulations=1000), ensemble_models=models,
+                                          ensemble_weights=[3, 1, 1], seed=5)
+    model_results = result['model_results']
+    mixture = sum(model['weight'] * model['success_probability'] for model in model_results['models'])
+    assert model_results['mixture']['success_probability'] == pytest.approx(mixture)
+    assert result['success'].mean() == pytest.approx(mixture)
+    assert [model['paths'] for model in model_results['models']] == [1800, 600, 600]
+
+
+def test_single_model_ensemble_is_a_plain_run(plan):
+    ensemble = batch_monte_carlo_simulation(**dict(plan, simulation_type="Ensemble"), ensemble_models=["Lognormal Distribution"], seed=7)
+    plain = batch_monte_carlo_simulation(**dict(plan, simulation_type="Lognormal Distribution"), seed=7)
+    assert np.array_equal(ensemble['final_savings'], plain['final_savings'])
+    assert ensemble['model_results']['models'][0]['success_probability'] == plain['success'].mean()
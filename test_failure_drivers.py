@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from simulations.failure_drivers import failure_drivers
+from simulations.simulation_batch import batch_monte_carlo_simulation
+
+
+def planted_result(paths=5000, years=30, seed=0):
+    # Failure decided by the returns of years 10-12 alone
+    rng = np.random.default_rng(seed)
+    portfolio_returns = 0.05 + 0.1 * rng.standard_normal((paths, years))
+    bad_window = portfolio_returns[:, 10:13].sum(axis=1) + 0.05 * rng.standard_normal(paths)
+    return {
+        'success': bad_window > np.quantile(bad_window, 0.3),
+        'portfolio_returns': portfolio_returns,
+        'inflation_rates': 0.025 + 0.01 * rng.standard_normal((paths, years)),
+        'horizons': np.full(paths, years),
+        'schedules': {'self_age': 60 + np.arange(years)[None, :]}
+    }
+
+
+def test_planted_window_is_the_top_driver():
+    drivers = failure_drivers(planted_result(), window=3)
+    assert set(np.argsort(drivers['return_contribution'])[-3:]) == {10, 11, 12}
+    assert np.all(drivers['return_sensitivity'][10:13] > 0)
+    # The window starting at 70 has the widest gap between its worst and best return groups
+    gaps = drivers['return_bin_failure_rates'][:, 0] - drivers['return_bin_failure_rates'][:, -1]
+    assert drivers['window_start_ages'][np.argmax(gaps)] == 70
+    assert drivers['failure_rate'] == pytest.approx(0.3, abs=0.001)
+
+
+def test_contributions_add_up_to_the_fitted_r_squared(plan):
+    result = batch_monte_carlo_simulation(**dict(plan, simulations=3000), seed=2)
+    drivers = failure_drivers(result)
+    contributions = np.concatenate([drivers['return_contribution'], drivers['inflation_contribution']])
+    assert contributions.sum() == pytest.approx(drivers['r_squared'])
+
+    # R squared of the same linear probability model fitted directly
+    failed = ~result['success']
+    design = np.concatenate([-result['portfolio_returns'], result['inflation_rates']], axis=1)
+    design = (design - design.mean(axis=0)) / design.std(axis=0)
+    coefficients = np.concatenate([drivers['return_sensitivity'], drivers['inflation_sensitivity']])
+    residual = failed - failed.mean() - design @ coefficients
+    assert drivers['r_squared'] == pytest.approx(1 - residual.var() / failed.var(), abs=0.01)
+    assert 0 < drivers['r_squared'] < 1
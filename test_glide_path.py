@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from simulations.glide_path import optimize_glide_path, glide_path_rule
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch
+
+
+def objective_score(plan, objective, final_savings):
+    # Score of one set of paths as optimize_glide_path computes it (risk aversion 3, penalty 10)
+    if objective == "Success Probability":
+        return (final_savings >= 0).mean()
+    wealth = 1 + np.maximum(final_savings, 0) / plan['annual_expense']
+    return ((wealth ** -2 - 1) / -2 - 10.0 * (final_savings < 0)).mean()
+
+
+@pytest.mark.parametrize("objective", ["Success Probability", "Terminal Wealth Utility"])
+def test_glide_path_beats_every_constant_allocation(plan, objective):
+    plan = dict(plan, simulations=500)
+    result = optimize_glide_path(plan, objective, seed=8)
+
+    # The fitting scenarios are the first draw from the seeded generator
+    scenarios = draw_plan_scenarios(plan, seed=np.random.default_rng(8))
+    optimized = simulate_batch(plan, scenarios, allocation_rule=result['allocation_rule'])['final_savings']
+    assert result['score'] == pytest.approx(objective_score(plan, objective, optimized))
+    for share in np.linspace(0.0, 1.0, 11):
+        constant = simulate_batch(plan, scenarios, allocation_rule=glide_path_rule(share, share, 1.0))['final_savings']
+        assert result['score'] >= objective_score(plan, objective, constant)
+
+
+def test_glide_path_allocations_stay_in_range(plan):
+    result = optimize_glide_path(dict(plan, simulations=200), seed=2)
+    assert 0.0 <= result['start_stock_share'] <= 1.0 and 0.0 <= result['end_stock_share'] <= 1.0
+    context = {'years_in_simulation': 38}
+    shares = np.array([result['allocation_rule'](year, np.zeros(3), context) for year in range(38)])
+    assert np.all((shares >= 0.0) & (shares <= 1.0))
+    assert shares[0] == pytest.approx(result['start_stock_share'])
+    assert shares[-1] == pytest.approx(result['end_stock_share'])
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from simulations.gradients import gradient_parameters
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch
+
+# Finite-difference steps; stock_percentage moves money out of bonds, as the engine's derivative does
+steps = {'stock_return_mean': 1e-4, 'annual_expense': 10.0, 'stock_percentage': 0.1, 'inflation_mean': 1e-4}
+
+
+def shifted(params, parameter, step):
+    shifted_params = dict(params, **{parameter: params[parameter] + step})
+    if parameter == 'stock_percentage':
+        shifted_params['bond_percentage'] = params['bond_percentage'] - step
+    return shifted_params
+
+
+def central_difference(params, scenarios, parameter, step, key):
+    # Common random numbers: both runs see the same draws
+    up = simulate_batch(shifted(params, parameter, step), scenarios)[key].astype(float)
+    down = simulate_batch(shifted(params, parameter, -step), scenarios)[key].astype(float)
+    return (up - down) / (2 * step)
+
+
+@pytest.mark.parametrize("simulation_type", ["Normal Distribution", "Students-T Distribution", "Lognormal Distribution"])
+def test_gradients_match_finite_differences(plan, simulation_type):
+    params = dict(plan, simulation_type=simulation_type)
+    scenarios = draw_plan_scenarios(params, 20000, seed=1)
+    gradients = simulate_batch(params, scenarios, gradients=True)['gradients']
+
+    for parameter in gradient_parameters:
+        wealth = central_difference(params, scenarios, parameter, steps[parameter], 'final_savings').mean()
+        # Pathwise derivatives of terminal wealth are exact on the same draws
+        assert gradients['pathwise'][parameter]['terminal_wealth'] == pytest.approx(wealth, rel=1e-3)
+
+    for parameter, estimate in gradients['likelihood_ratio'].items():
+        wealth = central_difference(params, scenarios, parameter, steps[parameter], 'final_savings').mean()
+        assert abs(estimate['terminal_wealth'] - wealth) < 4 * estimate['terminal_wealth_se']
+
+        # Success needs a wider step for the indicator to move on enough paths
+        success = central_difference(params, scenarios, parameter, 0.003, 'success')
+        standard_error = np.hypot(estimate['success_se'], success.std() / np.sqrt(len(success)))
+        assert abs(estimate['success'] - success.mean()) < 4 * standard_error
+        # The smoothed pathwise estimate carries a small kernel bias
+        assert gradients['pathwise'][parameter]['success'] == pytest.approx(success.mean(), rel=0.08)
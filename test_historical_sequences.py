@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from simulations.simulation_batch import (historical_sequence_arrays, historical_sequence_scenarios, draw_plan_scenarios,
+                                          batch_monte_carlo_simulation)
+
+
+def test_every_start_year_that_fits_is_a_path():
+    historical_years, equity_returns, bond_returns, inflation_rates = historical_sequence_arrays()
+    scenarios = historical_sequence_scenarios(30)
+    assert scenarios['start_years'].tolist() == list(range(historical_years[0], historical_years[-1] - 28))
+    assert scenarios['stock_shocks'].shape == (len(historical_years) - 29, 30)
+    for row, start_year in enumerate(scenarios['start_years']):
+        first = int(start_year - historical_years[0])
+        assert np.array_equal(scenarios['stock_shocks'][row], equity_returns[first:first + 30])
+        assert np.array_equal(scenarios['bond_shocks'][row], bond_returns[first:first + 30])
+        assert np.array_equal(scenarios['inflation_shocks'][row], inflation_rates[first:first + 30])
+
+
+def test_backtest_reports_each_start_year(plan):
+    result = batch_monte_carlo_simulation(**dict(plan, simulation_type="Historical Sequence"))
+    historical_years = historical_sequence_arrays()[0]
+    years_in_simulation = plan['life_expectancy'] - plan['current_age'] + 1
+    assert result['start_years'].tolist() == list(historical_years[:len(historical_years) - years_in_simulation + 1])
+    assert result['success_count'] + result['failure_count'] == len(result['start_years'])
+
+
+def test_plan_longer_than_the_record_is_rejected(plan):
+    record = len(historical_sequence_arrays()[0])
+    long_plan = dict(plan, current_age=20, partner_current_age=20, life_expectancy=20 + record, simulation_type="Historical Sequence")
+    with pytest.raises(ValueError, match=f"history covers only {record}"):
+        draw_plan_scenarios(long_plan)
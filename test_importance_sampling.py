@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from simulations.importance_sampling import rare_event_failure
+from simulations.simulation_batch import batch_monte_carlo_simulation
+
+
+def test_rare_failures_agree_with_plain_monte_carlo(plan):
+    # A well-funded plan that fails on about 2% of the paths
+    funded = dict(plan, initial_savings=4500000)
+    result = rare_event_failure(funded, simulations=5000, seed=1)
+    plain = batch_monte_carlo_simulation(**dict(funded, simulations=100000), seed=2)
+    failure = plain['failure_count'] / 100000
+    standard_error = np.hypot(result['standard_error'], np.sqrt(failure * (1 - failure) / 100000))
+    assert result['tilted']
+    assert abs(result['failure_probability'] - failure) < 4 * standard_error
+    assert result['success_probability'] == pytest.approx(1 - result['failure_probability'])
+    assert result['variance_reduction'] > 3
+
+
+def test_historical_sequences_are_rejected(plan):
+    with pytest.raises(ValueError, match="random return model"):
+        rare_event_failure(dict(plan, simulation_type="Historical Sequence"))
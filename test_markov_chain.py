@@ -0,0 +1,33 @@
+import time
+import numpy as np
+import pytest
+
+from simulations.markov_chain import markov_chain_success, check_monte_carlo, portfolio_return_distribution
+
+
+@pytest.mark.parametrize("simulation_type", ["Normal Distribution", "Lognormal Distribution", "Students-T Distribution",
+                                             "Empirical Distribution"])
+def test_grid_agrees_with_monte_carlo(plan, simulation_type):
+    check = check_monte_carlo(dict(plan, simulation_type=simulation_type), simulations=20000, seed=1)
+    assert abs(check['z_score']) < 4
+    for percentile in (75, 90):
+        assert check['markov_chain_percentiles'][percentile] == pytest.approx(check['monte_carlo_percentiles'][percentile], rel=0.05)
+
+
+def test_grid_runs_in_milliseconds(plan):
+    markov_chain_success(plan)
+    start = time.perf_counter()
+    markov_chain_success(plan)
+    assert time.perf_counter() - start < 0.25
+
+
+def test_return_distribution_keeps_the_expected_return(plan):
+    returns, weights = portfolio_return_distribution(dict(plan, simulation_type="Students-T Distribution"))
+    assert weights.sum() == pytest.approx(1.0)
+    assert np.all(np.diff(returns) > 0)
+    assert returns @ weights == pytest.approx(0.6 * plan['stock_return_mean'] + 0.4 * plan['bond_return_mean'], abs=1e-6)
+
+
+def test_grid_needs_fixed_cash_flows(plan):
+    with pytest.raises(ValueError, match="life expectancy"):
+        markov_chain_success(dict(plan, stochastic_lifespan=True))
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from simulations.simulation_batch import monthly_growth, batch_monte_carlo_simulation
+
+
+def test_months_compound_to_the_annual_return():
+    rng = np.random.default_rng(0)
+    annual_returns = rng.normal(0.06, 0.15, 1000)
+    growth, _ = monthly_growth(annual_returns, 0.05, rng.standard_normal((1000, 12)))
+    assert growth == pytest.approx(1 + annual_returns)
+
+
+def test_flows_are_spread_over_the_months():
+    rng = np.random.default_rng(1)
+    annual_returns = np.array([0.12, -0.2, 0.03])
+    noise = rng.standard_normal((3, 12))
+    growth, flow_growth = monthly_growth(annual_returns, 0.04, noise)
+
+    # Month by month: a twelfth of the year's flow arrives at the end of each month
+    monthly_log_returns = np.log1p(annual_returns)[:, None] / 12 + 0.04 * (noise - noise.mean(axis=1, keepdims=True))
+    balance, flow = np.full(3, 1000.0), -120.0
+    for month in range(12):
+        balance = balance * np.exp(monthly_log_returns[:, month]) + flow / 12
+    assert balance == pytest.approx(1000.0 * growth + flow * flow_growth)
+
+
+def test_zero_volatility_flows_earn_the_rest_of_the_year():
+    annual_return = 0.08
+    growth, flow_growth = monthly_growth(np.array([annual_return]), 0.0, np.zeros((1, 12)))
+    assert growth[0] == pytest.approx(1 + annual_return)
+    assert flow_growth[0] == pytest.approx(np.mean((1 + annual_return) ** (np.arange(11, -1, -1) / 12)))
+
+
+def test_monthly_engine_without_volatility(plan):
+    plan = dict(plan, simulations=5, stock_return_std=0.0, bond_return_std=0.0, inflation_std=0.0)
+    annual = batch_monte_carlo_simulation(**plan, seed=1)
+    monthly = batch_monte_carlo_simulation(**plan, time_step="Monthly", seed=1)
+    # Same yearly returns, compounded month by month with each year's flow spread over the months
+    returns = monthly['portfolio_returns'][0]
+    assert np.allclose(returns, annual['portfolio_returns'][0])
+    beginning, ending, investment = monthly['beginning_balances'][0], monthly['ending_balances'][0], monthly['investment_returns'][0]
+    net_flow = ending - beginning - investment
+    growth, flow_growth = monthly_growth(returns, 0.0, np.zeros((len(returns), 12)))
+    assert ending == pytest.approx(beginning * growth + net_flow * flow_growth)
+    # Withdrawals leave the portfolio during the year, so they cost less growth than at the start of it
+    retired = net_flow < 0
+    assert np.all(investment[retired] > (beginning[retired] + net_flow[retired]) * returns[retired])
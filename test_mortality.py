@@ -0,0 +1,61 @@
+import io
+import numpy as np
+import pytest
+
+from simulations.mortality import period_life_table, load_life_table, sample_death_ages, draw_lifespans
+from simulations.simulation_batch import batch_monte_carlo_simulation
+from simulations.withdrawal_strategies import variable_percentage
+
+
+def life_table_csv(first_age, last_age=110):
+    ages = np.arange(first_age, last_age + 1)
+    rates = np.minimum(0.01 * 1.09 ** (ages - first_age), 1.0)
+    lines = ["age,male,female"] + [f"{age},{rate},{rate * 0.8}" for age, rate in zip(ages, rates)]
+    return io.StringIO("\n".join(lines))
+
+
+def test_death_ages_follow_the_life_table():
+    rng = np.random.default_rng(0)
+    death_ages = sample_death_ages(65, "Male", 200000, rng)
+    # Share of 65-year-olds dying within a year matches q(65)
+    assert np.isclose((death_ages == 65).mean(), period_life_table["Male"][65], atol=0.002)
+    assert death_ages.min() >= 65 and death_ages.max() <= max(period_life_table["Male"])
+
+
+def test_lifespans_run_to_the_last_death():
+    lifespans = draw_lifespans(60, 55, 1000, seed=1)
+    assert np.array_equal(lifespans['horizon'],
+                          np.maximum(lifespans['self_death_age'] - 60, lifespans['partner_death_age'] - 55) + 1)
+
+
+def test_custom_life_table_is_loaded():
+    life_table = load_life_table(life_table_csv(40))
+    assert life_table["Male"][40] == pytest.approx(0.01)
+    assert life_table["Female"][40] == pytest.approx(0.008)
+    death_ages = sample_death_ages(50, "Female", 1000, np.random.default_rng(0), life_table)
+    assert death_ages.max() <= 110
+
+
+def test_life_table_must_cover_the_current_age():
+    life_table = load_life_table(life_table_csv(60))
+    with pytest.raises(ValueError, match="no rate for age 50"):
+        sample_death_ages(50, "Male", 100, np.random.default_rng(0), life_table)
+
+
+def test_life_table_needs_its_columns():
+    with pytest.raises(ValueError, match="female"):
+        load_life_table(io.StringIO("age,male\n60,0.01"))
+
+
+def test_variable_percentage_uses_each_paths_horizon(plan):
+    # Paths that die early spend down faster than paths that run to the end of the year array
+    strategy = variable_percentage(expected_real_return=0.0)
+    seen = []
+
+    def rule(year, balances, returns, spending, context):
+        seen.append(np.array(context['years_remaining']))
+        return strategy(year, balances, returns, spending, context)
+
+    result = batch_monte_carlo_simulation(**dict(plan, simulations=300), stochastic_lifespan=True, withdrawal_strategy=rule, seed=4)
+    assert np.array_equal(seen[0], np.maximum(result['horizons'], 1))
+    assert len(np.unique(seen[0])) > 1
@@ -0,0 +1,24 @@
+import numpy as np
+
+from simulations.multilevel import multilevel_success_probability, optimal_simulation_counts
+
+
+def test_optimal_counts_meet_the_target_standard_error():
+    variances, costs = (0.2, 0.02), (1e-5, 1e-3)
+    counts = optimal_simulation_counts(variances, costs, 0.005)
+    assert np.sqrt(sum(v / n for v, n in zip(variances, counts))) <= 0.005 * 1.001
+    # Paths per level proportional to sqrt(V / C)
+    assert np.isclose(counts[0] / counts[1], np.sqrt(variances[0] / costs[0]) / np.sqrt(variances[1] / costs[1]), rtol=0.01)
+
+
+def test_levels_sized_from_a_pilot_run(plan):
+    result = multilevel_success_probability(dict(plan, time_step="Monthly"), seed=1, target_standard_error=0.01)
+    coarse, fine = result['simulation_counts']
+    assert coarse > fine >= 200
+    assert len(result['coarse_result']['success']) == coarse
+    assert result['standard_error'] < 0.015
+
+
+def test_explicit_path_counts_skip_the_pilot(plan):
+    result = multilevel_success_probability(dict(plan, time_step="Monthly"), 1000, 100, seed=1)
+    assert result['simulation_counts'] == (1000, 100)
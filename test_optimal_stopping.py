@@ -0,0 +1,29 @@
+import numpy as np
+
+from simulations.optimal_stopping import least_squares_timing
+
+
+def test_retirement_timing_beats_the_best_fixed_age(plan):
+    result = least_squares_timing(dict(plan, simulations=2000), "Retirement Age", cost_per_year=0.04, seed=1)
+    assert result['beats_fixed_age']
+    assert result['policy_value'] > result['fixed_age_values'].max()
+    # The rule spreads the decision over the candidate ages rather than collapsing onto one
+    assert (result['age_probabilities'] > 0.02).sum() >= 3
+    assert np.isclose(result['age_probabilities'].sum(), 1.0)
+
+
+def test_rule_is_reported_against_the_fixed_age_policy(plan):
+    result = least_squares_timing(dict(plan, simulations=1000), "Social Security Claiming Age", seed=2)
+    assert list(result['candidate_ages']) == list(range(62, 71))
+    assert result['best_fixed_age'] == result['candidate_ages'][np.argmax(result['fixed_age_values'])]
+    assert np.isclose(result['improvement'], result['policy_value'] - result['fixed_age_values'].max())
+    assert result['beats_fixed_age'] == (result['improvement'] > 2 * result['improvement_standard_error'])
+
+
+def test_underfunded_plan_matches_the_fixed_age_comparison(plan):
+    # Most paths are depleted by the candidate ages; the rule must still pick the best fixed age
+    result = least_squares_timing(dict(plan, initial_savings=600000, simulations=2000), "Retirement Age", cost_per_year=0.02, seed=3)
+    assert result['fixed_age_success'][0] < 0.2
+    assert result['candidate_ages'][np.argmax(result['age_probabilities'])] == result['best_fixed_age']
+    assert result['age_probabilities'][result['candidate_ages'] == result['best_fixed_age']][0] > 0.8
+    assert result['policy_value'] > result['fixed_age_values'].max() - 2 * result['improvement_standard_error'] - 0.01
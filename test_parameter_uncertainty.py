@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from simulations.parameter_uncertainty import draw_return_parameters, path_return_parameters
+from simulations.simulation_batch import batch_monte_carlo_simulation, draw_plan_scenarios, historical_return_arrays, simulate_batch
+
+
+def test_path_parameters_follow_the_posterior():
+    years, paths = 97, 400000
+    draws = draw_return_parameters(paths, years, seed=1)
+    mean, std = path_return_parameters(draws, 'stock', 0.07, 0.16)
+    # volatility = std * sqrt((n - 1) / chi-squared(n - 1)) and mean = input + volatility / sqrt(n) * z
+    variance_scale = (years - 1) / (years - 3)
+    assert np.mean(draws['stock_volatility_scale'] ** 2) == pytest.approx(variance_scale, rel=0.01)
+    assert np.mean(std ** 2) == pytest.approx(0.16 ** 2 * variance_scale, rel=0.01)
+    assert np.mean(mean) == pytest.approx(0.07, abs=4 * 0.16 / np.sqrt(years * paths))
+    assert np.std(mean) == pytest.approx(0.16 * np.sqrt(variance_scale / years), rel=0.01)
+    # The mean shift and the volatility are drawn together: wider paths move further
+    assert np.corrcoef(np.abs(draws['stock_mean_shift']), draws['stock_volatility_scale'])[0, 1] > 0
+    assert mean.shape == (paths, 1) and std.shape == (paths, 1)
+
+
+def test_plan_draws_use_the_length_of_the_history(plan):
+    scenarios = draw_plan_scenarios(dict(plan, simulations=200000, parameter_uncertainty=True), seed=2)
+    years = len(historical_return_arrays()[0])
+    assert np.std(scenarios['bond_mean_shift']) == pytest.approx(np.sqrt((years - 1) / (years - 3) / years), rel=0.01)
+
+
+def test_mode_off_reproduces_the_fixed_parameter_run(plan):
+    fixed = batch_monte_carlo_simulation(**plan, seed=4)
+    off = batch_monte_carlo_simulation(**plan, parameter_uncertainty=False, seed=4)
+    on = batch_monte_carlo_simulation(**plan, parameter_uncertainty=True, seed=4)
+    assert np.array_equal(off['final_savings'], fixed['final_savings'])
+    assert np.array_equal(off['stock_returns'], fixed['stock_returns'])
+    # With the mode on the same shocks are spread by each path's own parameters
+    assert not np.array_equal(on['stock_returns'], fixed['stock_returns'])
+    assert np.std(on['stock_returns'].mean(axis=1)) > np.std(fixed['stock_returns'].mean(axis=1))
+
+    # The parameter draws come after the market draws, so dropping them gives the fixed run back
+    scenarios = draw_plan_scenarios(dict(plan, parameter_uncertainty=True), seed=4)
+    market = {key: value for key, value in scenarios.items() if not key.endswith(('_volatility_scale', '_mean_shift'))}
+    assert np.array_equal(simulate_batch(plan, market)['final_savings'], fixed['final_savings'])
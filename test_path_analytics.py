@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from simulations.path_analytics import start_path_tracking, track_year, path_analytics
+from simulations.simulation_batch import batch_monte_carlo_simulation
+
+
+def test_reducers_on_hand_made_paths():
+    balances = np.array([[100.0, 120.0, 90.0, 150.0, 200.0],
+                         [100.0, 50.0, -10.0, -30.0, -40.0],
+                         [100.0, -5.0, -10.0, -20.0, -30.0],
+                         [100.0, 100.0, 80.0, 60.0, -1.0]])
+    tracking = start_path_tracking(np.full(4, 100.0))
+    for year in range(5):
+        track_year(tracking, year, balances[:, year], np.ones(4, dtype=bool), np.zeros(4))
+    analytics = path_analytics(tracking, balances[:, -1], np.arange(60, 65)[None, :], cvar_level=0.5)
+
+    assert np.array_equal(analytics['depletion_age'], [np.nan, 62, 61, 64], equal_nan=True)
+    assert analytics['shortfall_years'].tolist() == [0, 3, 4, 1]
+    assert analytics['max_drawdown'].tolist() == pytest.approx([0.25, 1.0, 1.0, 1.0])
+    assert analytics['min_real_balance'].tolist() == [90.0, -40.0, -30.0, -1.0]
+    assert analytics['survival_ages'].tolist() == [60, 61, 62, 63, 64]
+    assert analytics['survival_curve'].tolist() == pytest.approx([1.0, 0.75, 0.5, 0.5, 0.25])
+    # Worst half of the terminal balances: -40 and -30
+    assert analytics['terminal_var'] == -30.0
+    assert analytics['terminal_cvar'] == -35.0
+    assert analytics['depletion_probability'] == 0.75
+    assert analytics['median_depletion_age'] == 62.0
+
+
+def test_depleted_years_after_the_horizon_are_not_counted():
+    tracking = start_path_tracking(np.full(2, 100.0))
+    for year, in_plan in enumerate(([True, True], [True, False], [True, False])):
+        track_year(tracking, year, np.array([50.0, -10.0]) if year else np.array([80.0, 20.0]), np.array(in_plan), np.full(2, 0.1))
+    analytics = path_analytics(tracking, np.array([50.0, -10.0]), np.arange(70, 73)[None, :])
+    assert np.isnan(analytics['depletion_age']).all()
+    # Real balances are deflated from the first year
+    assert analytics['min_real_balance'][0] == pytest.approx(50.0 / 1.1 ** 2)
+
+
+def test_engine_reports_the_age_balances_run_out(plan):
+    # With no volatility every path is the same and runs out at the same age
+    result = batch_monte_carlo_simulation(**dict(plan, simulations=20, initial_savings=500000, stock_return_std=0.0, bond_return_std=0.0,
+                                                 inflation_std=0.0), seed=1)
+    analytics = result['path_analytics']
+    first_year = int(np.argmax(result['ending_balances'][0] < 0))
+    assert result['ending_balances'][0, first_year] < 0
+    assert np.all(analytics['depletion_age'] == plan['current_age'] + first_year)
+    assert analytics['survival_curve'][first_year - 1] == 1.0 and analytics['survival_curve'][first_year] == 0.0
+    assert analytics['terminal_cvar'] == pytest.approx(result['final_savings'][0])
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from simulations.path_clusters import scenario_clusters
+from simulations.simulation_batch import batch_monte_carlo_simulation
+
+
+def test_clusters_cover_every_path(plan):
+    result = batch_monte_carlo_simulation(**dict(plan, simulations=3000), seed=3)
+    clusters = scenario_clusters(result, clusters=5)
+    groups = clusters['clusters']
+    assert sum(group['probability'] for group in groups) == pytest.approx(1.0)
+    assert sum(group['paths'] for group in groups) == 3000
+    assert np.bincount(clusters['cluster_ids']).tolist() == [group['paths'] for group in groups]
+    assert 0 < clusters['explained_variance'] <= 1
+    # Groups run from the lowest to the highest balances
+    medians = [group['median_final_savings'] for group in groups]
+    assert medians[0] < medians[-1]
+
+
+def test_representatives_belong_to_their_groups(plan):
+    result = batch_monte_carlo_simulation(**dict(plan, simulations=3000), seed=4)
+    clusters = scenario_clusters(result, clusters=6, sample_size=1000)
+    for index, group in enumerate(clusters['clusters']):
+        assert clusters['cluster_ids'][group['representative_id']] == index
+        members = clusters['cluster_ids'] == index
+        assert group['success_probability'] == pytest.approx(result['success'][members].mean())
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from simulations.policy_solver import solve_policy, policy_strategy, policy_allocation
+from simulations.markov_chain import markov_chain_success
+from simulations.simulation_batch import batch_monte_carlo_simulation
+
+
+def test_policy_beats_the_fixed_plan(plan):
+    policy = solve_policy(plan)
+    fixed_plan = markov_chain_success(plan)['success_probability']
+    assert 0.0 <= policy['initial_value'] <= 1.0
+    assert policy['initial_value'] >= fixed_plan
+    # Spending never drops below the floor and the plan spends as planned before retirement
+    assert policy['spending_policy'].min() >= 0.8
+    assert np.all(policy['spending_policy'][:plan['retirement_age'] - plan['current_age']] == 1.0)
+
+
+def test_policy_runs_forward_in_the_engine(plan):
+    policy = solve_policy(plan)
+    fixed_plan = batch_monte_carlo_simulation(**dict(plan, simulations=4000), seed=1)
+    with_policy = batch_monte_carlo_simulation(**dict(plan, simulations=4000), withdrawal_strategy=policy_strategy(policy),
+                                               allocation_rule=policy_allocation(policy), seed=1)
+    assert with_policy['success_count'] > fixed_plan['success_count'] + 200
+
+
+def test_expected_utility_objective(plan):
+    policy = solve_policy(plan, objective="Expected Utility")
+    assert policy['objective'] == "Expected Utility"
+    assert np.all(np.isin(policy['allocation_policy'], np.linspace(0.0, 1.0, 11)))
+    with pytest.raises(ValueError, match="Invalid objective"):
+        solve_policy(plan, objective="Median Wealth")
@@ -0,0 +1,27 @@
+import pytest
+
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch
+from simulations.sensitivity import tornado_analysis
+from simulations.sweeps import with_parameter_values
+
+
+def test_tornado_runs_in_account_mode(plan):
+    # Each account follows the stock percentage of its own row
+    plan = dict(plan, simulations=200, account_balances=[800000, 1000000, 200000])
+    result = tornado_analysis(plan, inputs=["Stock Percentage", "Retirement Age"], seed=3)
+
+    scenarios = draw_plan_scenarios(plan, seed=3)
+    for row in result['inputs']:
+        parameter = {"Stock Percentage": 'stock_percentage', "Retirement Age": 'retirement_age'}[row['input']]
+        for value, success in ((row['low_value'], row['low_success']), (row['high_value'], row['high_success'])):
+            single = simulate_batch(with_parameter_values(plan, {parameter: value}), scenarios)
+            assert success == pytest.approx(single['success'].mean())
+    assert result['base_success'] == pytest.approx(simulate_batch(plan, scenarios)['success'].mean())
+
+
+
+def test_tornado_moves_initial_savings_in_account_mode(plan):
+    plan = dict(plan, simulations=200, account_balances=[800000, 1000000, 200000])
+    row = tornado_analysis(plan, inputs=["Initial Savings"], seed=5)['inputs'][0]
+    assert row['low_success'] < row['high_success']
+    assert row['low_median_final_savings'] < row['high_median_final_savings']
@@ -0,0 +1,35 @@
+import numpy as np
+
+from simulations.shocks import shock_events, draw_shock_events
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch, tile_scenarios
+
+
+def test_events_start_at_the_hazard_rate(plan):
+    paths, years = 20000, 30
+    events = draw_shock_events(plan, paths, years, ["Major Home Repair", "Long-Term Care"], seed=1)
+    # One-year repairs: before long-term care can start at 70, the share of paths hit each year is the hazard
+    repair = events['shock_expense'][:, :70 - plan['current_age']]
+    hit_share = np.asarray((repair > 0).mean(axis=0)).ravel()
+    hazard = shock_events["Major Home Repair"]['hazard']
+    assert abs(hit_share.mean() - hazard) < 4 * np.sqrt(hazard * (1 - hazard) / (paths * repair.shape[1]))
+    assert np.all(np.abs(hit_share - hazard) < 5 * np.sqrt(hazard * (1 - hazard) / paths))
+    assert events['shock_earnings_loss'].nnz == 0 and events['shock_working_earnings_loss'].nnz == 0
+
+
+def test_job_loss_stops_at_each_rows_retirement(plan):
+    plan = dict(plan, simulations=2000, shock_events=["Job Loss"])
+    scenarios = draw_plan_scenarios(plan, seed=3)
+    retirement_ages = np.repeat([58.0, 64.0], 2000)
+    params = dict(plan, retirement_age=retirement_ages)
+    shocked = simulate_batch(params, tile_scenarios(scenarios, 2))
+    unshocked = simulate_batch(params, tile_scenarios({key: value for key, value in scenarios.items() if not key.startswith('shock_')}, 2))
+    lost = unshocked['gross_incomes'] - shocked['gross_incomes']
+    ages = plan['current_age'] + np.arange(lost.shape[1])
+
+    assert np.all(lost >= -1e-6)
+    assert np.allclose(lost[ages[None, :] >= retirement_ages[:, None]], 0.0)
+    # The later retirement keeps its own window: job losses between 58 and 64 cost earnings
+    late_rows = lost[2000:]
+    assert late_rows[:, (ages >= 58) & (ages < 64)].sum() > 0
+    # The same draws apply before 58 in both copies
+    assert np.allclose(lost[:2000, ages < 58], late_rows[:, ages < 58])
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from simulations.social_security import claiming_adjustment, claiming_age_search
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch
+
+
+def test_claiming_adjustment_factors():
+    assert claiming_adjustment(62) == pytest.approx(0.70)
+    assert claiming_adjustment(64) == pytest.approx(1 - 36 * 5 / 900)
+    assert claiming_adjustment(67) == pytest.approx(1.0)
+    assert claiming_adjustment(70) == pytest.approx(1.24)
+    # Ages outside 62-70 are held at the limits
+    assert claiming_adjustment([60, 72]).tolist() == pytest.approx([0.70, 1.24])
+
+
+def test_best_claiming_pair_beats_early_and_entered_ages(plan):
+    plan = dict(plan, simulations=1000)
+    result = claiming_age_search(plan, seed=6)
+    best = result['best_success']
+    assert best['success'] == result['success'].max()
+
+    # The search grid and a single run on the same scenarios agree for the entered and earliest pairs
+    scenarios = draw_plan_scenarios(plan, seed=6)
+    for self_age, partner_age in ((plan['withdrawal_start_age'], plan['partner_withdrawal_start_age']), (62, 62)):
+        single = simulate_batch(dict(plan, withdrawal_start_age=self_age, partner_withdrawal_start_age=partner_age,
+                                     annual_social_security=plan['annual_social_security'] * claiming_adjustment(self_age),
+                                     partner_social_security=plan['partner_social_security'] * claiming_adjustment(partner_age)), scenarios)
+        grid_success = result['success'][list(result['partner_ages']).index(partner_age), list(result['self_ages']).index(self_age)]
+        assert grid_success == pytest.approx(single['success'].mean())
+        assert best['success'] >= single['success'].mean()
+    assert best['success'] > result['success'][0, 0]
+
+
+def test_sweeps_and_tornado_adjust_the_claimed_benefit(plan):
+    from simulations.sweeps import grid_sweep
+    from simulations.sensitivity import tornado_analysis
+    plan = dict(plan, simulations=500)
+    scenarios = draw_plan_scenarios(plan, seed=3)
+
+    def claimed_at(age):
+        return simulate_batch(dict(plan, withdrawal_start_age=age, annual_social_security=plan['annual_social_security'] * claiming_adjustment(age)),
+                              scenarios)['success'].mean()
+
+    # Claiming at 62 pays 70% of the entered benefit and at 70 pays 124%, as in the claiming search
+    result = grid_sweep(plan, 'withdrawal_start_age', [62, 70], 'retirement_age', [plan['retirement_age']], seed=3)
+    assert result['success'][0].tolist() == pytest.approx([claimed_at(62), claimed_at(70)])
+    assert claimed_at(62) != simulate_batch(dict(plan, withdrawal_start_age=62), scenarios)['success'].mean()
+
+    tornado = tornado_analysis(plan, inputs=["Social Security Start Age"], seed=3)
+    assert tornado['inputs'][0]['low_success'] == pytest.approx(claimed_at(plan['withdrawal_start_age'] - 2))
+    assert tornado['inputs'][0]['high_success'] == pytest.approx(claimed_at(plan['withdrawal_start_age'] + 2))
@@ -0,0 +1,42 @@
+import numpy as np
+
+from simulations.historical_returns import stress_sequences
+from simulations.simulation_batch import (add_stress_scenarios, batch_monte_carlo_simulation, draw_plan_scenarios,
+                                          historical_sequence_arrays, stress_test_rows)
+
+
+def test_stress_rows_are_kept_out_of_the_main_result(plan):
+    names = list(stress_sequences)
+    plain = batch_monte_carlo_simulation(**dict(plan, simulations=800), seed=1)
+    stressed = batch_monte_carlo_simulation(**dict(plan, simulations=800), stress_tests=names, seed=1)
+    assert np.array_equal(stressed['final_savings'], plain['final_savings'])
+    assert stressed['ending_balances'].shape == plain['ending_balances'].shape
+    assert [stress['name'] for stress in stressed['stress_results']] == names
+    # Every sequence gets its own rows, capped at the run size
+    assert all(stress['paths'] == min(stress_test_rows, 800) for stress in stressed['stress_results'])
+
+    # Before retirement the stressed paths are the baseline paths
+    start = plan['retirement_age'] - plan['current_age']
+    for stress in stressed['stress_results']:
+        assert np.array_equal(stress['median_balances'][:start], stress['baseline_median_balances'][:start])
+
+
+def test_overlay_starts_at_retirement(plan):
+    names = ["Great Depression (1929-1932)"]
+    scenarios = draw_plan_scenarios(dict(plan, simulations=50), seed=2)
+    stressed = add_stress_scenarios(scenarios, plan, names)
+    start = plan['retirement_age'] - plan['current_age']
+    assert stressed['stress_start_year'] == start
+    assert stressed['stress_paths'] == 50
+
+    # The copies keep their own draws before retirement and take the historical years from then on
+    rows = slice(50, 100)
+    first_year, last_year = stress_sequences[names[0]]
+    historical_years, equity_returns, _, _ = historical_sequence_arrays()
+    length = last_year - first_year + 1
+    assert not stressed['stress_mask'][:50].any()
+    assert not stressed['stress_mask'][rows, :start].any()
+    assert stressed['stress_mask'][rows, start:start + length].all()
+    assert np.array_equal(stressed['stock_shocks'][rows], scenarios['stock_shocks'])
+    expected = equity_returns[(historical_years >= first_year) & (historical_years <= last_year)]
+    assert np.allclose(stressed['stress_stock_returns'][rows, start:start + length], expected)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from simulations.simulation_batch import draw_plan_scenarios, simulate_batch
+from simulations.sweeps import grid_sweep, with_parameter_values
+from simulations.goal_seek import goal_seek
+
+
+def test_initial_savings_scales_the_accounts(plan):
+    # The accounts split the initial savings, so an initial savings set per row scales each account
+    plan = dict(plan, simulations=100, account_balances=[800000, 1000000, 200000])
+    scenarios = draw_plan_scenarios(plan, seed=5)
+    swept = simulate_batch(with_parameter_values(plan, {'initial_savings': np.full(100, 4000000.0)}), scenarios)
+    entered = simulate_batch(dict(plan, initial_savings=4000000, account_balances=[1600000, 2000000, 400000]), scenarios)
+    assert np.allclose(swept['account_balances'], entered['account_balances'])
+
+
+def test_grid_sweep_in_account_mode(plan):
+    plan = dict(plan, simulations=100, account_balances=[800000, 1000000, 200000])
+    result = grid_sweep(plan, 'retirement_age', [58, 62], 'stock_percentage', [30, 90], seed=2)
+    scenarios = draw_plan_scenarios(plan, seed=2)
+    for j, stock_percentage in enumerate(result['y_values']):
+        for i, retirement_age in enumerate(result['x_values']):
+            single = simulate_batch(with_parameter_values(plan, {'retirement_age': retirement_age, 'stock_percentage': stock_percentage}), scenarios)
+            assert result['success'][j, i] == pytest.approx(single['success'].mean())
+
+
+def test_minimum_initial_savings_in_account_mode(plan):
+    plan = dict(plan, simulations=200, account_balances=[800000, 1000000, 200000])
+    result = goal_seek(plan, "Minimum Initial Savings", 0.9, seed=4)
+    assert result['achievable']
+    assert result['success_probability'] >= 0.9
+    # A little less money misses the target on the same scenarios
+    scenarios = draw_plan_scenarios(plan, seed=4)
+    short = simulate_batch(with_parameter_values(plan, {'initial_savings': result['value'] * 0.9}), scenarios)
+    assert short['success'].mean() < 0.9
+
+
+def test_stock_percentage_goals_on_each_side_of_the_peak(plan):
+    plan = dict(plan, simulations=1000)
+    scenarios = draw_plan_scenarios(plan, seed=1)
+
+    def success(stock_percentage):
+        return simulate_batch(with_parameter_values(plan, {'stock_percentage': stock_percentage}), scenarios)['success'].mean()
+
+    lowest = goal_seek(plan, "Minimum Stock Percentage", 0.6, seed=1)
+    highest = goal_seek(plan, "Maximum Stock Percentage", 0.64, seed=1)
+    peak = max(lowest['evaluations'], key=lambda evaluation: evaluation[1])[0]
+    assert lowest['achievable'] and highest['achievable']
+    assert lowest['value'] < peak < highest['value'] < 100
+    assert success(lowest['value']) >= 0.6 > success(lowest['value'] - 1)
+    assert success(highest['value']) >= 0.64 > success(highest['value'] + 1)
+
+    # Above the peak no mix reaches the target
+    unreachable = goal_seek(plan, "Maximum Stock Percentage", 0.9, seed=1)
+    assert not unreachable['achievable']
+    assert unreachable['closest_value'] == peak
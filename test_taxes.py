@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from simulations.taxes import tax_tables, bracket_tax, taxable_social_security, income_tax, progressive_portfolio_draw
+
+married = tax_tables["Married Filing Jointly"]
+single = tax_tables["Single"]
+
+
+def test_2024_bracket_tax():
+    # 10% and 12% brackets in full, the rest at 22%
+    assert bracket_tax(np.array([100000.0]), married['thresholds'], married['rates'])[0] == pytest.approx(
+        0.10 * 23200 + 0.12 * (94300 - 23200) + 0.22 * (100000 - 94300))
+    assert bracket_tax(np.array([50000.0]), single['thresholds'], single['rates'])[0] == pytest.approx(
+        0.10 * 11600 + 0.12 * (47150 - 11600) + 0.22 * (50000 - 47150))
+    assert bracket_tax(np.array([-5000.0, 0.0]), married['thresholds'], married['rates']).tolist() == [0.0, 0.0]
+
+
+def test_top_bracket():
+    income = np.array([1000000.0])
+    below_top = bracket_tax(np.array([731200.0]), married['thresholds'], married['rates'])
+    assert bracket_tax(income, married['thresholds'], married['rates']) == pytest.approx(below_top + 0.37 * (1000000 - 731200))
+
+
+def test_taxable_social_security_tiers():
+    benefits = np.full(3, 40000.0)
+    other_income = np.array([0.0, 20000.0, 100000.0])
+    taxable = taxable_social_security(benefits, other_income, married['ss_base_amounts'])
+    # Below the first base nothing is taxed; half the excess up to the second base; at most 85% of benefits
+    assert taxable[0] == 0.0
+    assert taxable[1] == pytest.approx(0.5 * (20000 + 20000 - 32000))
+    assert taxable[2] == pytest.approx(0.85 * 40000)
+
+
+def test_income_tax_deductions_and_indexing():
+    ordinary = np.array([129200.0])
+    assert income_tax(ordinary, 0.0, 0.0, married)[0] == pytest.approx(bracket_tax(np.array([100000.0]), married['thresholds'], married['rates'])[0])
+    # Two seniors get the additional deductions
+    assert income_tax(ordinary, 0.0, 0.0, married, seniors=2)[0] == pytest.approx(
+        bracket_tax(np.array([100000.0 - 2 * 1550]), married['thresholds'], married['rates'])[0])
+    # Indexing brackets and deductions with prices scales the tax with them
+    assert income_tax(2 * ordinary, 0.0, 0.0, married, index_factor=2.0)[0] == pytest.approx(2 * income_tax(ordinary, 0.0, 0.0, married)[0])
+
+
+def test_portfolio_draw_covers_expenses_after_tax():
+    expense = np.array([80000.0, 150000.0, 20000.0])
+    ordinary = np.array([10000.0, 0.0, 60000.0])
+    social_security = np.array([30000.0, 45000.0, 0.0])
+    draw, tax = progressive_portfolio_draw(expense, ordinary, social_security, married, index_factor=1.1, seniors=2)
+    assert np.allclose(tax, income_tax(ordinary, social_security, draw, married, 1.1, 2))
+    covered = ordinary + social_security + draw - tax
+    assert np.allclose(covered[:2], expense[:2], atol=0.05)
+    # Income above expenses needs no draw
+    assert draw[2] == 0.0
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from simulations.withdrawal_strategies import (withdrawal_strategies, fixed_spending, constant_percentage, guyton_klinger,
+                                               variable_percentage, floor_ceiling)
+from simulations.simulation_batch import batch_monte_carlo_simulation
+
+
+def context(rows, years_remaining=30, inflation=0.03):
+    return {'state': {}, 'retired': np.ones(rows, dtype=bool), 'inflation': inflation,
+            'years_remaining': np.full(rows, years_remaining)}
+
+
+def test_fixed_and_percentage_rules():
+    balances = np.array([1000000.0, -20000.0])
+    spending = np.full(2, 50000.0)
+    assert fixed_spending()(0, balances, np.zeros(2), spending, context(2)) is spending
+    assert constant_percentage(0.05)(0, balances, np.zeros(2), spending, context(2)).tolist() == [50000.0, 0.0]
+
+
+def test_guyton_klinger_guardrails():
+    late, early = context(1, years_remaining=10), context(1, years_remaining=25)
+    for ctx in (late, early):
+        rule = guyton_klinger()
+        assert rule(0, np.array([1000000.0]), np.zeros(1), np.array([40000.0]), ctx)[0] == 40000.0
+        ctx['spending'] = rule(1, np.array([700000.0]), np.array([-0.3]), np.array([41200.0]), ctx)[0]
+    # After a loss the raise is skipped; with more than 15 years left the guardrail cuts spending by 10%
+    assert late['spending'] == pytest.approx(40000.0)
+    assert early['spending'] == pytest.approx(36000.0)
+
+    # A strong year below the lower guardrail raises spending after inflation
+    rule = guyton_klinger()
+    ctx = context(1)
+    rule(0, np.array([1000000.0]), np.zeros(1), np.array([40000.0]), ctx)
+    assert rule(1, np.array([1600000.0]), np.array([0.6]), np.array([41200.0]), ctx)[0] == pytest.approx(40000.0 * 1.03 * 1.1)
+
+
+def test_variable_percentage_amortizes_the_balance():
+    balances = np.full(3, 1000000.0)
+    ctx = context(3)
+    ctx['years_remaining'] = np.array([1, 10, 30])
+    spending = variable_percentage(0.03)(0, balances, np.zeros(3), np.zeros(3), ctx)
+    assert spending == pytest.approx(1000000.0 * 0.03 / (1 - 1.03 ** -ctx['years_remaining']))
+    assert spending[0] == pytest.approx(1030000.0)
+    assert variable_percentage(0.0)(0, balances, np.zeros(3), np.zeros(3), ctx) == pytest.approx(1000000.0 / ctx['years_remaining'])
+
+
+def test_floor_and_ceiling_bound_spending():
+    balances = np.array([500000.0, 1000000.0, 2000000.0])
+    spending = floor_ceiling(0.04, floor=0.85, ceiling=1.25)(0, balances, np.zeros(3), np.full(3, 40000.0), context(3))
+    assert spending.tolist() == pytest.approx([34000.0, 40000.0, 50000.0])
+
+
+@pytest.mark.parametrize("name", list(withdrawal_strategies))
+def test_strategies_run_in_the_engine(plan, name):
+    result = batch_monte_carlo_simulation(**dict(plan, simulations=200), withdrawal_strategy=withdrawal_strategies[name](), seed=3)
+    assert result['success_count'] + result['failure_count'] == 200
+    assert np.all(np.isfinite(result['final_savings']))